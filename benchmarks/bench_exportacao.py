@@ -0,0 +1,91 @@
+"""Mede tempo e pico de memória da exportação para 1 mil, 100 mil e 1 milhão de linhas.
+
+Uso: python benchmarks/bench_exportacao.py [--linhas 1000 100000] [--formatos xlsx csv] [--legado]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from io import BytesIO
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from exportacao import exportar_tabela, gerar_excel
+
+
+def _legado(idades, montantes):
+    """Exportação anterior: DataFrame + `iterrows` com um `write` por célula em memória."""
+    import pandas as pd
+
+    df_chart = pd.DataFrame({"Idade": idades, "Montante": montantes})
+    output = BytesIO()
+    with pd.ExcelWriter(output, engine="xlsxwriter") as writer:
+        ws1 = writer.book.add_worksheet("Simulação")
+        money = writer.book.add_format({"num_format": "R$ #,##0"})
+        for i, row in df_chart.iterrows():
+            ws1.write(i + 6, 0, int(row["Idade"]))
+            ws1.write(i + 6, 1, row["Montante"], money)
+    return output
+
+
+def medir(funcao):
+    """Tempo de uma execução limpa e pico de memória (tracemalloc) de uma segunda execução."""
+    inicio = time.perf_counter()
+    funcao()
+    duracao = time.perf_counter() - inicio
+    tracemalloc.start()
+    funcao()
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return duracao, pico / 2**20
+
+
+def casos(linhas: int, formatos, legado: bool, diretorio: str):
+    idades = np.arange(linhas) // 12 + 30
+    montantes = np.random.default_rng(0).uniform(0, 5e6, linhas)
+    parametros = {"Idade atual": 30, "Objetivo": "manter"}
+
+    yield "gerar_excel (BytesIO)", lambda: gerar_excel(idades, montantes, 3500, 4e6, 35, 40, "regressivo", 0.1, parametros)
+    yield "gerar_excel (arquivo)", lambda: gerar_excel(
+        idades, montantes, 3500, 4e6, 35, 40, "regressivo", 0.1, parametros,
+        destino=os.path.join(diretorio, "simulacao.xlsx")
+    )
+    for formato in formatos:
+        yield f"exportar_tabela ({formato}, arquivo)", lambda formato=formato: exportar_tabela(
+            {"Idade": idades, "Montante": montantes}, os.path.join(diretorio, f"tabela.{formato}"), formato
+        )
+    if legado:
+        yield "legado (iterrows)", lambda: _legado(idades, montantes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--linhas", type=int, nargs="+", default=[1_000, 100_000, 1_000_000])
+    parser.add_argument("--formatos", nargs="+", default=["xlsx", "csv", "parquet"])
+    parser.add_argument("--legado", action="store_true", help="inclui a exportação antiga (lenta) para comparação")
+    args = parser.parse_args()
+
+    print(f"{'linhas':>10}  {'caso':<34} {'tempo (s)':>10} {'pico (MiB)':>11}")
+    with tempfile.TemporaryDirectory() as diretorio:
+        # Aquecimento: importações tardias (pandas, pyarrow) não entram na medição.
+        for _, funcao in casos(10, args.formatos, args.legado, diretorio):
+            try:
+                funcao()
+            except ImportError:
+                pass
+        for linhas in args.linhas:
+            for nome, funcao in casos(linhas, args.formatos, args.legado, diretorio):
+                try:
+                    duracao, pico = medir(funcao)
+                except ImportError as erro:
+                    print(f"{linhas:>10}  {nome:<34} indisponível: {erro}")
+                    continue
+                print(f"{linhas:>10}  {nome:<34} {duracao:>10.3f} {pico:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
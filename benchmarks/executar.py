@@ -0,0 +1,284 @@
+"""Benchmarks dos caminhos críticos: simulação, solução do aporte, lote e exportação.
+
+Uso:
+    python benchmarks/executar.py                      # executa e imprime a tabela
+    python benchmarks/executar.py --salvar             # grava benchmarks/baseline.json
+    python benchmarks/executar.py --comparar           # compara com a baseline gravada
+    python benchmarks/executar.py --filtro solucao     # só os casos cujo nome contém "solucao"
+
+Cada caso reporta o menor tempo por chamada, o pico de memória alocada
+(tracemalloc) e quantas vezes `core.simular_aposentadoria` foi chamada por execução.
+Com `--comparar`, casos mais lentos que a baseline além da tolerância, ou que passaram
+a simular mais, são marcados como regressão e o processo termina com código 1.
+Tempos dependem da máquina: grave e compare a baseline no mesmo ambiente.
+
+O caso `inicializacao_app` mede, com `python -X importtime`, os imports de nível de
+módulo de `streamlit_app.py` (o que roda antes da primeira tela) e sempre falha se
+algum deles carregar um módulo pesado (pandas, altair, xlsxwriter, requests...).
+"""
+import argparse
+import ast
+import json
+import os
+import platform
+import subprocess
+import sys
+import timeit
+import tracemalloc
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Tuple
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(RAIZ)
+
+import core
+
+BASELINE_PADRAO = os.path.join(RAIZ, "benchmarks", "baseline.json")
+CASOS: List[Tuple[str, Callable[[], object], int]] = []
+
+
+def caso(nome: str, repeticoes: int = 5):
+    """Registra uma função sem argumentos como caso de benchmark."""
+    def registrar(funcao):
+        CASOS.append((nome, funcao, repeticoes))
+        return funcao
+    return registrar
+
+# ==== CONTAGEM DE SIMULAÇÕES ====
+
+@contextmanager
+def contar_simulacoes():
+    """Conta as chamadas a `core.simular_aposentadoria` feitas dentro do bloco."""
+    original = core.simular_aposentadoria
+    contador = {"chamadas": 0}
+
+    def contada(*args, **kwargs):
+        contador["chamadas"] += 1
+        return original(*args, **kwargs)
+
+    core.simular_aposentadoria = contada
+    try:
+        yield contador
+    finally:
+        core.simular_aposentadoria = original
+
+# ==== CASOS ====
+
+for _anos in (10, 30, 60, 90):
+    @caso(f"simulacao_{_anos}_anos")
+    def _simulacao(anos=_anos):
+        return core.simular_aposentadoria(
+            30, 30 + anos * 2 // 3, 30 + anos, 50_000, 2_000, 15_000, 0.045, core.IR_REGRESSIVO,
+            modo_historico="nenhum"
+        )
+
+    @caso(f"simulacao_{_anos}_anos_historico_completo")
+    def _simulacao_historico(anos=_anos):
+        return core.simular_aposentadoria(
+            30, 30 + anos * 2 // 3, 30 + anos, 50_000, 2_000, 15_000, 0.045, core.IR_REGRESSIVO,
+            modo_historico="completo"
+        )
+
+for _periodo in ("trimestral", "anual"):
+    @caso(f"simulacao_90_anos_periodo_{_periodo}")
+    def _simulacao_periodo(periodo=_periodo):
+        return core.simular_aposentadoria(
+            30, 90, 120, 50_000, 2_000, 15_000, 0.045, core.IR_REGRESSIVO,
+            modo_historico="nenhum", periodo=periodo
+        )
+
+    @caso(f"solucao_manter_periodo_{_periodo}")
+    def _solucao_periodo(periodo=_periodo):
+        return core.calcular_aporte(30, 65, 90, 50_000, 15_000, 0.045, modo="manter", periodo=periodo)
+
+for _modo in ("zerar", "manter", "atingir"):
+    @caso(f"solucao_{_modo}")
+    def _solucao(modo=_modo):
+        return core.calcular_aporte(
+            30, 65, 90, 50_000, 15_000, 0.045, modo=modo, valor_final_desejado=1_000_000
+        )
+
+
+@caso("solucao_bissecao_manter", repeticoes=3)
+def _solucao_bissecao():
+    return core.calcular_aporte_com_ir(
+        30, 65, 90, 50_000, 15_000, 0.045, "manter", core.IR_REGRESSIVO, metodo="bissecao"
+    )
+
+
+@caso("lote_calcular_aporte_200_perfis", repeticoes=3)
+def _lote_escalar():
+    return [
+        core.calcular_aporte(20 + i % 30, 60 + i % 10, 85 + i % 15, 10_000 * (i % 7), 5_000 + 100 * i, 0.02 + 0.0002 * i)
+        for i in range(200)
+    ]
+
+
+@caso("comparacao_36_cenarios", repeticoes=3)
+def _comparacao():
+    return core.comparar_cenarios([
+        {"idade_atual": 30, "idade_aposentadoria": idade, "expectativa_vida": 90, "poupanca_inicial": 50_000,
+         "renda_mensal": 15_000, "rentabilidade_anual": taxa, "modo": modo, "valor_final_desejado": 1_000_000}
+        for idade in (55, 60, 65, 70) for taxa in (0.03, 0.045, 0.06) for modo in ("zerar", "manter", "atingir")
+    ])
+
+
+@caso("lote_vetorizado_1000_cenarios", repeticoes=3)
+def _lote_vetorizado():
+    import numpy as np
+    from lote import simular_aposentadoria_lote
+
+    i = np.arange(1000)
+    return simular_aposentadoria_lote(
+        20 + i % 30, 60 + i % 10, 85 + i % 15, 10_000 * (i % 7), 2_000, 5_000 + 10 * i, 0.02 + 0.00002 * i,
+        regime=np.where(i % 2 == 0, "progressivo", "regressivo"), modo_historico="nenhum"
+    )
+
+
+@caso("resultados_serie_mensal_90_anos")
+def _resultados():
+    from resultados import serie_patrimonio
+
+    _, _, historico, _ = core.simular_aposentadoria(
+        30, 90, 120, 50_000, 2_000, 15_000, 0.045, core.IR_REGRESSIVO, modo_historico="completo"
+    )
+    return serie_patrimonio(historico, 30, passo_historico=1, resolucao="mensal", max_pontos=500)
+
+
+@caso("exportacao_excel_10k_linhas", repeticoes=3)
+def _exportacao():
+    from exportacao import gerar_excel
+
+    idades = [30 + i // 12 for i in range(10_000)]
+    montantes = [1_000.0 * i for i in range(10_000)]
+    return gerar_excel(idades, montantes, 3_000, 4e6, 35, 30, "regressivo", 0.1, {"Idade atual": 30})
+
+# ==== INICIALIZAÇÃO DO APP ====
+
+CASO_INICIALIZACAO = "inicializacao_app"
+APP = os.path.join(RAIZ, "streamlit_app.py")
+MODULOS_PESADOS = ("pandas", "altair", "xlsxwriter", "requests", "numpy", "pyarrow")
+
+
+def importacoes_de_topo(caminho: str) -> str:
+    """Código com os imports de nível de módulo do script, na ordem em que aparecem."""
+    with open(caminho, encoding="utf-8") as arquivo:
+        fonte = arquivo.read()
+    return "\n".join(
+        ast.get_source_segment(fonte, no)
+        for no in ast.parse(fonte).body
+        if isinstance(no, (ast.Import, ast.ImportFrom))
+    )
+
+
+def medir_importacao(codigo: str, repeticoes: int = 3) -> Tuple[float, List[str]]:
+    """Menor tempo total de importação (`-X importtime`) e módulos pesados carregados.
+
+    Cada amostra roda num interpretador novo, então nada vem do cache de `sys.modules`.
+    """
+    melhor, carregados = float("inf"), set()
+    for _ in range(repeticoes):
+        processo = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", codigo],
+            cwd=RAIZ, capture_output=True, text=True, check=True
+        )
+        total = 0
+        for linha in processo.stderr.splitlines():
+            if not linha.startswith("import time:") or "cumulative" in linha:
+                continue
+            _, cumulativo, nome = linha[len("import time:"):].split("|")
+            # Imports de topo têm um único espaço antes do nome; os aninhados, mais.
+            if not nome[1:].startswith(" "):
+                total += int(cumulativo)
+            carregados.add(nome.strip().split(".")[0])
+        melhor = min(melhor, total / 1e6)
+    return melhor, sorted(carregados.intersection(MODULOS_PESADOS))
+
+# ==== EXECUÇÃO ====
+
+def medir(funcao: Callable[[], object], repeticoes: int) -> Dict[str, float]:
+    """Menor tempo por chamada entre as amostras; cada amostra agrupa chamadas até somar ~0,2 s.
+
+    O mínimo é menos sensível a ruído da máquina do que a média ou a mediana.
+    """
+    cronometro = timeit.Timer(funcao)
+    chamadas, _ = cronometro.autorange()  # também serve de aquecimento
+    tempos = [total / chamadas for total in cronometro.repeat(repeat=repeticoes, number=chamadas)]
+
+    with contar_simulacoes() as contador:
+        tracemalloc.start()
+        funcao()
+        _, pico = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    return {
+        "tempo_s": min(tempos),
+        "pico_kib": pico / 1024,
+        "simulacoes": contador["chamadas"],
+    }
+
+
+def comparar(atual: Dict[str, dict], baseline: Dict[str, dict], tolerancia: float) -> List[str]:
+    """Lista as regressões de tempo (além da tolerância) e de número de simulações."""
+    regressoes = []
+    for nome, medida in atual.items():
+        referencia = baseline.get(nome)
+        if referencia is None:
+            continue
+        if medida["tempo_s"] > referencia["tempo_s"] * (1 + tolerancia):
+            regressoes.append(
+                f"{nome}: tempo {medida['tempo_s'] * 1e3:.2f} ms contra {referencia['tempo_s'] * 1e3:.2f} ms na baseline"
+            )
+        if medida["simulacoes"] > referencia["simulacoes"]:
+            regressoes.append(
+                f"{nome}: {medida['simulacoes']} simulações contra {referencia['simulacoes']} na baseline"
+            )
+    return regressoes
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmarks dos caminhos críticos.")
+    parser.add_argument("--filtro", default="", help="executa só casos cujo nome contém o texto")
+    parser.add_argument("--baseline", default=BASELINE_PADRAO)
+    parser.add_argument("--salvar", action="store_true", help="grava os resultados como baseline")
+    parser.add_argument("--comparar", action="store_true", help="compara com a baseline e falha em regressão")
+    parser.add_argument("--tolerancia", type=float, default=0.25, help="folga de tempo aceita (0.25 = 25%%)")
+    args = parser.parse_args(argv)
+
+    resultados = {}
+    print(f"{'caso':<42} {'tempo (ms)':>11} {'pico (KiB)':>11} {'simulações':>11}")
+    for nome, funcao, repeticoes in CASOS:
+        if args.filtro not in nome:
+            continue
+        medida = medir(funcao, repeticoes)
+        resultados[nome] = medida
+        print(f"{nome:<42} {medida['tempo_s'] * 1e3:>11.3f} {medida['pico_kib']:>11.1f} {medida['simulacoes']:>11}")
+
+    pesados = []
+    if args.filtro in CASO_INICIALIZACAO:
+        tempo, pesados = medir_importacao(importacoes_de_topo(APP))
+        resultados[CASO_INICIALIZACAO] = {"tempo_s": tempo, "pico_kib": 0.0, "simulacoes": 0}
+        print(f"{CASO_INICIALIZACAO:<42} {tempo * 1e3:>11.3f} {'-':>11} {'-':>11}")
+        if pesados:
+            print(f"REGRESSÃO {CASO_INICIALIZACAO}: a inicialização importa {', '.join(pesados)}")
+
+    if args.salvar:
+        with open(args.baseline, "w", encoding="utf-8") as arquivo:
+            json.dump({"python": platform.python_version(), "maquina": platform.machine(), "casos": resultados},
+                      arquivo, indent=2)
+        print(f"Baseline gravada em {args.baseline}.")
+
+    if args.comparar:
+        with open(args.baseline, encoding="utf-8") as arquivo:
+            baseline = json.load(arquivo)["casos"]
+        regressoes = comparar(resultados, baseline, args.tolerancia)
+        for regressao in regressoes:
+            print(f"REGRESSÃO {regressao}")
+        if regressoes:
+            return 1
+        print("Sem regressões em relação à baseline.")
+    return 1 if pesados else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
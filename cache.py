@@ -0,0 +1,187 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import replace
+from typing import Any, Callable, Hashable, Optional, Tuple
+
+from core import calcular_aporte, simular_aposentadoria
+from instrumentacao import contar
+
+# ==== CACHE LRU ====
+
+class CacheLRU:
+    """Cache LRU limitado em número de itens, com validade opcional e seguro entre threads."""
+
+    def __init__(self, max_itens: int = 256, ttl: Optional[float] = None, relogio: Callable[[], float] = time.monotonic):
+        if max_itens < 1:
+            raise ValueError("O cache precisa comportar ao menos um item.")
+        self.max_itens = max_itens
+        self.ttl = ttl
+        self.relogio = relogio
+        self.acertos = 0
+        self.falhas = 0
+        self._itens: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._trava = threading.Lock()
+
+    def obter(self, chave: Hashable) -> Tuple[bool, Any]:
+        """Retorna (True, valor) se a chave está no cache e válida, senão (False, None)."""
+        with self._trava:
+            item = self._itens.get(chave)
+            if item is not None:
+                criado_em, valor = item
+                if self.ttl is None or self.relogio() - criado_em <= self.ttl:
+                    self._itens.move_to_end(chave)
+                    self.acertos += 1
+                    contar("cache_acertos")
+                    return True, valor
+                del self._itens[chave]
+            self.falhas += 1
+            contar("cache_falhas")
+            return False, None
+
+    def guardar(self, chave: Hashable, valor: Any) -> None:
+        """Guarda o valor, descartando o item usado há mais tempo se o limite for excedido."""
+        with self._trava:
+            self._itens[chave] = (self.relogio(), valor)
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.max_itens:
+                self._itens.popitem(last=False)
+
+    def limpar(self) -> None:
+        """Esvazia o cache e zera os contadores."""
+        with self._trava:
+            self._itens.clear()
+            self.acertos = 0
+            self.falhas = 0
+
+    def estatisticas(self) -> dict:
+        """Contadores de acertos e falhas, ocupação e taxa de acerto."""
+        with self._trava:
+            consultas = self.acertos + self.falhas
+            return {
+                "acertos": self.acertos,
+                "falhas": self.falhas,
+                "itens": len(self._itens),
+                "max_itens": self.max_itens,
+                "taxa_acerto": self.acertos / consultas if consultas else 0.0,
+            }
+
+    def __len__(self) -> int:
+        return len(self._itens)
+
+# ==== CACHE DO PROCESSO ====
+
+_cache_processo = CacheLRU()
+
+
+def cache_processo() -> CacheLRU:
+    """Cache compartilhado por todo o processo (por exemplo, entre sessões do Streamlit)."""
+    return _cache_processo
+
+
+def configurar_cache(max_itens: int = 256, ttl: Optional[float] = None) -> CacheLRU:
+    """Recria o cache do processo com novo tamanho e validade."""
+    global _cache_processo
+    _cache_processo = CacheLRU(max_itens, ttl)
+    return _cache_processo
+
+# ==== NORMALIZAÇÃO ====
+
+def _centavos(valor: Optional[float]) -> Optional[float]:
+    """Arredonda valores monetários ao centavo para que entradas equivalentes compartilhem a chave."""
+    return None if valor is None else round(float(valor), 2)
+
+
+def _congelar_historico(historico):
+    return None if historico is None else tuple(historico)
+
+
+def _congelar_resultado(resultado: dict) -> dict:
+    congelado = dict(resultado)
+    if "historico" in congelado:
+        congelado["historico"] = _congelar_historico(congelado["historico"])
+    if "comparacao" in congelado:
+        congelado["comparacao"] = {
+            regime: None if r is None else replace(r, historico=_congelar_historico(r.historico))
+            for regime, r in congelado["comparacao"].items()
+        }
+    return congelado
+
+# ==== FUNÇÕES CACHEADAS ====
+
+def simular_aposentadoria_cacheado(
+    idade_atual: int,
+    idade_aposentadoria: int,
+    expectativa_vida: int,
+    poupanca_inicial: float,
+    aporte_mensal: float,
+    renda_mensal: float,
+    rentabilidade_anual: float,
+    funcao_imposto: Callable[[float, int, int], float],
+    modo_historico: str = "completo",
+    cache: Optional[CacheLRU] = None
+) -> Tuple[float, float, Optional[tuple], float]:
+    """`simular_aposentadoria` com cache; valores monetários são normalizados ao centavo.
+
+    A função de imposto entra na chave pela identidade, então use funções nomeadas
+    (como as de `core.FUNCOES_IMPOSTO`) em vez de lambdas recriadas a cada chamada.
+    O histórico é devolvido como tupla.
+    """
+    if cache is None:
+        cache = cache_processo()
+    argumentos = (
+        int(idade_atual), int(idade_aposentadoria), int(expectativa_vida),
+        _centavos(poupanca_inicial), _centavos(aporte_mensal), _centavos(renda_mensal),
+        float(rentabilidade_anual),
+    )
+    chave = ("simular_aposentadoria", *argumentos, funcao_imposto, modo_historico)
+    encontrado, valor = cache.obter(chave)
+    if encontrado:
+        return valor
+
+    saldo, patrimonio, historico, total_ir = simular_aposentadoria(
+        *argumentos, funcao_imposto, modo_historico=modo_historico
+    )
+    valor = (saldo, patrimonio, _congelar_historico(historico), total_ir)
+    cache.guardar(chave, valor)
+    return valor
+
+
+def calcular_aporte_cacheado(
+    idade_atual: int,
+    idade_aposentadoria: int,
+    expectativa_vida: int,
+    poupanca_inicial: float,
+    renda_mensal: float,
+    rentabilidade_anual: float,
+    modo: str = "manter",
+    valor_final_desejado: Optional[float] = None,
+    max_aporte: float = 100_000,
+    modo_historico: str = "nenhum",
+    cache: Optional[CacheLRU] = None
+) -> dict:
+    """`calcular_aporte` com cache; valores monetários são normalizados ao centavo.
+
+    Cada chamada recebe uma cópia rasa do resultado guardado, com históricos em tuplas,
+    para que alterações do chamador não contaminem o cache.
+    """
+    if cache is None:
+        cache = cache_processo()
+    argumentos = (
+        int(idade_atual), int(idade_aposentadoria), int(expectativa_vida),
+        _centavos(poupanca_inicial), _centavos(renda_mensal), float(rentabilidade_anual),
+    )
+    opcoes = dict(
+        modo=modo, valor_final_desejado=_centavos(valor_final_desejado),
+        max_aporte=_centavos(max_aporte), modo_historico=modo_historico,
+    )
+    chave = ("calcular_aporte", *argumentos, *opcoes.values())
+    encontrado, valor = cache.obter(chave)
+    if not encontrado:
+        valor = _congelar_resultado(calcular_aporte(*argumentos, **opcoes))
+        cache.guardar(chave, valor)
+
+    resultado = dict(valor)
+    if "comparacao" in resultado:
+        resultado["comparacao"] = dict(resultado["comparacao"])
+    return resultado
@@ -1,4 +1,11 @@
-from typing import Callable, Optional, Tuple, List
+import math
+from abc import ABC, abstractmethod
+from array import array
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+from instrumentacao import contar, cronometrado
 
 # ==== UTILITÁRIOS ====
 
@@ -36,8 +43,117 @@ def ir_regressivo(valor: float, mes: int, anos_aporte: int = 35) -> float:
     aliquota = max(min(aliquota, 0.35), 0.10)
     return valor * aliquota
 
+def ir_progressivo_saque(valor: float, mes: int = 0, anos_aporte: int = 35) -> float:
+    """IR progressivo com a assinatura usada na simulação; mês e anos de aporte não influenciam."""
+    return ir_progressivo(valor)
+
+# ==== REGIMES DE TRIBUTAÇÃO ====
+
+class RegimeIR(ABC):
+    """Regime de IR que pré-calcula o imposto dos meses de saque; também chamável como função de imposto."""
+    nome = ""
+
+    @abstractmethod
+    def __call__(self, valor: float, mes: int, anos_aporte: int = 35) -> float:
+        ...
+
+    @abstractmethod
+    def tabela(self, valor: float, meses_saque: int, anos_aporte: int) -> Union[float, Tuple[float, ...]]:
+        """IR de cada mês de saque para um saque bruto constante, ou um único valor se não variar."""
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}()"
+
+class RegimeProgressivo(RegimeIR):
+    """Tabela progressiva: o saque bruto é constante, então o IR também é."""
+    nome = "progressivo"
+
+    def __call__(self, valor: float, mes: int = 0, anos_aporte: int = 35) -> float:
+        return ir_progressivo(valor)
+
+    def tabela(self, valor: float, meses_saque: int, anos_aporte: int) -> float:
+        return ir_progressivo(valor)
+
+class RegimeRegressivo(RegimeIR):
+    """Tabela regressiva: a alíquota depende do mês de saque e dos anos de aporte."""
+    nome = "regressivo"
+
+    def __call__(self, valor: float, mes: int, anos_aporte: int = 35) -> float:
+        return ir_regressivo(valor, mes, anos_aporte)
+
+    def tabela(self, valor: float, meses_saque: int, anos_aporte: int) -> Tuple[float, ...]:
+        return _tabela_regressiva(valor, meses_saque, anos_aporte)
+
+@lru_cache(maxsize=256)
+def _tabela_regressiva(valor: float, meses_saque: int, anos_aporte: int) -> Tuple[float, ...]:
+    """Memorizada: simulações que só diferem no aporte ou na rentabilidade reaproveitam a tabela."""
+    return tuple(ir_regressivo(valor, mes, anos_aporte) for mes in range(max(meses_saque, 0)))
+
+IR_PROGRESSIVO = RegimeProgressivo()
+IR_REGRESSIVO = RegimeRegressivo()
+
+FUNCOES_IMPOSTO = {"progressivo": IR_PROGRESSIVO, "regressivo": IR_REGRESSIVO}
+
 # ==== SIMULAÇÃO DE PATRIMÔNIO ====
 
+# Intervalo, em meses, entre os pontos gravados no histórico (0 = não grava).
+MODOS_HISTORICO = {"nenhum": 0, "anual": 12, "completo": 1}
+MOTORES = ("analitico", "iterativo")
+# Meses por passo da simulação. Como as idades são inteiras, as fases sempre
+# começam e terminam em fronteiras de período.
+PERIODOS = {"mensal": 1, "trimestral": 3, "anual": 12}
+
+
+def _saldo_composto(saldo: float, fluxo: float, taxa: float, log_fator: float, meses: int) -> float:
+    """Saldo após `meses` passos de `saldo = saldo * (1 + taxa) + fluxo`, em forma fechada."""
+    if meses <= 0:
+        return saldo
+    if taxa == 0:
+        return saldo + fluxo * meses
+    # g^n − 1 via expm1(n·log1p(taxa)), sem perder precisão para taxas pequenas.
+    crescimento = math.expm1(meses * log_fator)
+    return saldo + saldo * crescimento + fluxo * crescimento / taxa
+
+
+def _saques_por_periodo(
+    ir_do_mes: Callable[[int], float],
+    saque_liquido: float,
+    meses_saque: int,
+    meses_periodo: int,
+    rentab_mensal: float
+) -> Tuple[Tuple[float, ...], Tuple[float, ...], Tuple[float, ...]]:
+    """Para cada período de saque: saques brutos do período levados ao seu fim pela
+    taxa mensal, IR do período e saque bruto do primeiro mês (para o histórico)."""
+    fatores = [(1 + rentab_mensal) ** (meses_periodo - 1 - j) for j in range(meses_periodo)]
+    valores, impostos, primeiros = [], [], []
+    for inicio in range(0, max(meses_saque, 0), meses_periodo):
+        irs = [ir_do_mes(mes) for mes in range(inicio, min(inicio + meses_periodo, meses_saque))]
+        deslocamento = meses_periodo - len(irs)
+        valores.append(sum((saque_liquido + ir) * fatores[deslocamento + j] for j, ir in enumerate(irs)))
+        impostos.append(sum(irs))
+        primeiros.append(saque_liquido + irs[0])
+    return tuple(valores), tuple(impostos), tuple(primeiros)
+
+
+@lru_cache(maxsize=256)
+def _saques_por_periodo_regime(
+    regime: RegimeIR,
+    saque_liquido: float,
+    meses_saque: int,
+    anos_aporte: int,
+    meses_periodo: int,
+    rentab_mensal: float
+) -> Tuple[Tuple[float, ...], Tuple[float, ...], Tuple[float, ...]]:
+    """Memorizada: as simulações de uma solução só diferem no aporte."""
+    tabela = regime.tabela(saque_liquido / 0.85, meses_saque, anos_aporte)
+    if isinstance(tabela, tuple):
+        ir_do_mes = tabela.__getitem__
+    else:
+        def ir_do_mes(mes: int) -> float:
+            return tabela
+    return _saques_por_periodo(ir_do_mes, saque_liquido, meses_saque, meses_periodo, rentab_mensal)
+
+
 def simular_aposentadoria(
     idade_atual: int,
     idade_aposentadoria: int,
@@ -46,9 +162,27 @@ def simular_aposentadoria(
     aporte_mensal: float,
     renda_mensal: float,
     rentabilidade_anual: float,
-    funcao_imposto: Callable[[float, int, int], float]
-) -> Tuple[float, float, List[float], float]:
-    """Simula a evolução do patrimônio mês a mês até o fim da vida."""
+    funcao_imposto: Callable[[float, int, int], float],
+    modo_historico: str = "completo",
+    motor: str = "analitico",
+    parar_se_negativo: bool = False,
+    periodo: str = "mensal"
+) -> Tuple[float, float, Optional[array], float]:
+    """Simula a evolução do patrimônio até o fim da vida, com histórico amostrado por `modo_historico`.
+
+    `motor` e `periodo` só mudam o custo (ver `equivalencia.py`); `parar_se_negativo` testa o sinal do resíduo.
+    """
+    if modo_historico not in MODOS_HISTORICO:
+        raise ValueError("Modo de histórico inválido. Use 'nenhum', 'anual' ou 'completo'.")
+    if motor not in MOTORES:
+        raise ValueError("Motor inválido. Use 'analitico' ou 'iterativo'.")
+    if periodo not in PERIODOS:
+        raise ValueError("Período inválido. Use 'mensal', 'trimestral' ou 'anual'.")
+    meses_periodo = PERIODOS[periodo]
+    if meses_periodo > 1 and modo_historico == "completo":
+        raise ValueError("O histórico completo exige o período 'mensal'.")
+    contar("simulacoes")
+
     meses_total = (expectativa_vida - idade_atual) * 12
     meses_aporte = (idade_aposentadoria - idade_atual) * 12
     anos_aporte = idade_aposentadoria - idade_atual
@@ -56,23 +190,111 @@ def simular_aposentadoria(
     saldo = poupanca_inicial
     rentab_mensal = taxa_mensal(rentabilidade_anual)
     patrimonio_no_aposentadoria = None
-    historico = []
     total_ir_pago = 0
 
-    for mes in range(meses_total):
+    passo_historico = MODOS_HISTORICO[modo_historico]
+    historico = None
+    if passo_historico:
+        pontos = max(-(-meses_total // passo_historico), 0)
+        historico = array("d", bytes(8 * pontos))
+
+    saque_liquido = renda_mensal
+    saque_bruto_estimado = saque_liquido / 0.85
+    tabela_ir = None
+    if isinstance(funcao_imposto, RegimeIR):
+        tabela_ir = funcao_imposto.tabela(saque_bruto_estimado, meses_total - meses_aporte, anos_aporte)
+    ir_constante = not isinstance(tabela_ir, tuple)
+    # Com saques não negativos e taxa acima de −100%, um saldo negativo nos saques não
+    # volta a ficar positivo: basta o sinal do resíduo, então o laço pode parar ali (o
+    # saldo devolvido é o desse mês; histórico e IR total ficam incompletos).
+    parar = parar_se_negativo and rentab_mensal > -1 and saque_liquido >= 0
+
+    inicio = 0
+    # Motor analítico: forma fechada da série geométrica, avaliada só nos pontos do
+    # histórico pedidos; difere do laço mensal apenas no arredondamento.
+    if motor == "analitico" and passo_historico != 1 and rentab_mensal > -1:
+        # Aportes: saldo_n = S0·g^n + aporte·(g^n − 1)/r, avaliado só onde é preciso.
+        log_fator = math.log1p(rentab_mensal)
+        meses_acumulacao = max(0, min(meses_aporte, meses_total))
+        if passo_historico:
+            for mes in range(0, meses_acumulacao, passo_historico):
+                historico[mes // passo_historico] = _saldo_composto(
+                    poupanca_inicial, aporte_mensal, rentab_mensal, log_fator, mes + 1
+                )
+        saldo = _saldo_composto(poupanca_inicial, aporte_mensal, rentab_mensal, log_fator, meses_acumulacao)
+        if 0 < meses_aporte <= meses_total:
+            patrimonio_no_aposentadoria = saldo
+        inicio = meses_acumulacao
+
+        if tabela_ir is not None and ir_constante and inicio < meses_total:
+            # Saques com IR constante: mesma série, com fluxo −(renda + IR).
+            meses_saque = meses_total - inicio
+            saque_bruto = saque_liquido + tabela_ir
+            if passo_historico:
+                primeiro = -(-inicio // passo_historico) * passo_historico
+                for mes in range(primeiro, meses_total, passo_historico):
+                    historico[mes // passo_historico] = _saldo_composto(
+                        saldo, -saque_bruto, rentab_mensal, log_fator, mes + 1 - inicio
+                    )
+            saldo = _saldo_composto(saldo, -saque_bruto, rentab_mensal, log_fator, meses_saque)
+            return saldo, patrimonio_no_aposentadoria, historico, tabela_ir * meses_saque
+
+    if meses_periodo > 1 and rentab_mensal > -1:
+        # Um passo por período, a partir de `inicio` (sempre um ano inteiro): o saldo
+        # capitaliza pela taxa do período (via `expm1`, sem cancelamento para taxas
+        # pequenas) e recebe os aportes e saques do período levados ao seu fim pela taxa
+        # mensal. Só difere do passo mensal no arredondamento (~1e-12 da escala).
+        taxa = math.expm1(meses_periodo * math.log1p(rentab_mensal))
+        crescimento = 1 + taxa
+        aporte_periodo = aporte_mensal * (taxa / rentab_mensal if rentab_mensal else meses_periodo)
+        if isinstance(funcao_imposto, RegimeIR):
+            saques, impostos, primeiros = _saques_por_periodo_regime(
+                funcao_imposto, saque_liquido, meses_total - meses_aporte, anos_aporte, meses_periodo, rentab_mensal
+            )
+        else:
+            saques, impostos, primeiros = _saques_por_periodo(
+                lambda mes: funcao_imposto(saque_bruto_estimado, mes, anos_aporte),
+                saque_liquido, meses_total - meses_aporte, meses_periodo, rentab_mensal
+            )
+        for mes in range(inicio, meses_total, meses_periodo):
+            acumulando = mes < meses_aporte
+            if passo_historico and mes % passo_historico == 0:
+                # Ponto do histórico: saldo ao fim do primeiro mês do período.
+                fluxo = aporte_mensal if acumulando else -primeiros[(mes - meses_aporte) // meses_periodo]
+                historico[mes // passo_historico] = saldo * (1 + rentab_mensal) + fluxo
+
+            if acumulando:
+                saldo = saldo * crescimento + aporte_periodo
+                if mes + meses_periodo == meses_aporte:
+                    patrimonio_no_aposentadoria = saldo
+            else:
+                indice = (mes - meses_aporte) // meses_periodo
+                saldo = saldo * crescimento - saques[indice]
+                total_ir_pago += impostos[indice]
+                if parar and saldo < 0:
+                    break
+        return saldo, patrimonio_no_aposentadoria, historico, total_ir_pago
+
+    for mes in range(inicio, meses_total):
         saldo *= (1 + rentab_mensal)
 
         if mes < meses_aporte:
             saldo += aporte_mensal
         else:
-            saque_liquido = renda_mensal
-            saque_bruto_estimado = saque_liquido / 0.85
-            ir = funcao_imposto(saque_bruto_estimado, mes - meses_aporte, anos_aporte)
+            if tabela_ir is None:
+                ir = funcao_imposto(saque_bruto_estimado, mes - meses_aporte, anos_aporte)
+            elif ir_constante:
+                ir = tabela_ir
+            else:
+                ir = tabela_ir[mes - meses_aporte]
             saque_bruto = saque_liquido + ir
             saldo -= saque_bruto
             total_ir_pago += ir
+            if parar and saldo < 0:
+                break
 
-        historico.append(saldo)
+        if passo_historico and mes % passo_historico == 0:
+            historico[mes // passo_historico] = saldo
 
         if mes == meses_aporte - 1:
             patrimonio_no_aposentadoria = saldo
@@ -96,9 +318,93 @@ def determinar_alvo(
     else:
         raise ValueError("Modo inválido. Use 'zerar', 'manter' ou 'atingir'.")
 
+# ==== RESULTADO DO APORTE ====
+
+# Diagnóstico do aporte: encontrado; dispensável, porque a poupança já atinge o
+# objetivo; impossível, porque não há meses de aporte antes da aposentadoria; ou
+# inatingível com até `max_aporte`.
+MOTIVOS = ("resolvido", "ja_financiado", "sem_fase_de_aportes", "inviavel")
+
+
+@dataclass(frozen=True)
+class ResultadoAporte:
+    """Aporte de um regime de IR e as saídas da simulação final; sem aporte viável, ver `motivo` e `deficit`."""
+    aporte_mensal: Optional[float]
+    saldo_final: Optional[float]
+    patrimonio_aposentadoria: Optional[float]
+    total_ir: Optional[float]
+    historico: Optional[array] = None
+    motivo: str = "resolvido"
+    deficit: Optional[float] = None
+
+    @property
+    def viavel(self) -> bool:
+        return self.aporte_mensal is not None
+
+
+def _sem_aporte(motivo: str, deficit: Optional[float]) -> ResultadoAporte:
+    deficit = None if deficit is None else max(float(deficit), 0.0)
+    return ResultadoAporte(None, None, None, None, motivo=motivo, deficit=deficit)
+
+
+def _simulador(
+    idade_atual: int,
+    idade_aposentadoria: int,
+    expectativa_vida: int,
+    poupanca_inicial: float,
+    renda_mensal: float,
+    rentabilidade_anual: float,
+    modo: str,
+    funcao_imposto: Callable[[float, int, int], float],
+    valor_final_desejado: Optional[float]
+) -> Callable[..., Tuple[float, ResultadoAporte]]:
+    """Função `aporte -> (saldo final − alvo, resultado)` para um perfil e regime (resíduo None sem alvo)."""
+    def simular(aporte: float, historico: str = "nenhum", parar_se_negativo: bool = False, periodo: str = "mensal"):
+        saldo_final, patrimonio_aposentadoria, serie, total_ir = simular_aposentadoria(
+            idade_atual, idade_aposentadoria, expectativa_vida,
+            poupanca_inicial, aporte, renda_mensal, rentabilidade_anual, funcao_imposto,
+            modo_historico=historico, parar_se_negativo=parar_se_negativo, periodo=periodo
+        )
+        alvo = determinar_alvo(modo, patrimonio_aposentadoria, valor_final_desejado)
+        motivo = "ja_financiado" if aporte == 0 else "resolvido"
+        resultado = ResultadoAporte(aporte, saldo_final, patrimonio_aposentadoria, total_ir, serie, motivo)
+        # "manter" sem patrimônio na aposentadoria (ela não ocorre na simulação): sem alvo.
+        return (None if alvo is None else saldo_final - alvo), resultado
+    return simular
+
+
+def _verificar_viabilidade(
+    simular: Callable[..., Tuple[float, ResultadoAporte]],
+    sem_fase_de_aportes: bool,
+    max_aporte: float,
+    tolerancia: float,
+    modo_historico: str,
+    periodo: str = "mensal"
+) -> Tuple[Optional[ResultadoAporte], float, float]:
+    """Simula aporte zero e `max_aporte`; retorna `(resultado se já é a resposta, resíduo zero, resíduo max)`."""
+    # Com passo grosseiro, uma resposta com aporte zero é refeita mês a mês.
+    grosseiro = periodo != "mensal"
+    residuo_zero, resultado = simular(0.0, "nenhum" if grosseiro else modo_historico, periodo=periodo)
+    if residuo_zero is None:
+        # "manter" sem patrimônio na aposentadoria: nenhum aporte forma o alvo.
+        return _sem_aporte("sem_fase_de_aportes", None), math.nan, math.nan
+    # Sem meses de aporte, o aporte não altera a simulação: o resíduo é plano e, como
+    # no método direto, basta estar dentro da tolerância.
+    suficiente = -tolerancia if sem_fase_de_aportes else 0
+    if residuo_zero >= suficiente and grosseiro:
+        residuo_zero, resultado = simular(0.0, modo_historico)
+    if residuo_zero >= suficiente:
+        return resultado, residuo_zero, residuo_zero
+    if sem_fase_de_aportes:
+        return _sem_aporte("sem_fase_de_aportes", -residuo_zero), residuo_zero, residuo_zero
+    residuo_max, _ = simular(max_aporte, periodo=periodo)
+    if residuo_max < -tolerancia:
+        return _sem_aporte("inviavel", -residuo_max), residuo_zero, residuo_max
+    return None, residuo_zero, residuo_max
+
 # ==== BISSERÇÃO DO APORTE ====
 
-def calcular_aporte_com_ir(
+def _aporte_por_bissecao(
     idade_atual: int,
     idade_aposentadoria: int,
     expectativa_vida: int,
@@ -108,11 +414,33 @@ def calcular_aporte_com_ir(
     modo: str,
     funcao_imposto: Callable[[float, int, int], float],
     valor_final_desejado: Optional[float] = None,
-    max_aporte: float = 100_000
-) -> Tuple[Optional[float], Optional[float]]:
+    max_aporte: float = 100_000,
+    modo_historico: str = "nenhum",
+    verificar_viabilidade: bool = True,
+    periodo: str = "mensal"
+) -> ResultadoAporte:
     """Aplica bisseção para encontrar o menor aporte mensal necessário com IR aplicado."""
-    min_aporte = 0
     tolerancia = 1
+    simular = _simulador(
+        idade_atual, idade_aposentadoria, expectativa_vida, poupanca_inicial, renda_mensal,
+        rentabilidade_anual, modo, funcao_imposto, valor_final_desejado
+    )
+    if verificar_viabilidade:
+        diagnostico, _, _ = _verificar_viabilidade(
+            simular, idade_aposentadoria <= idade_atual, max_aporte, tolerancia, modo_historico, periodo
+        )
+        if diagnostico is not None:
+            return diagnostico
+
+    # Nas iterações só o sinal do resíduo importa: com alvo não negativo, a simulação
+    # pode parar no primeiro saldo negativo. No modo "manter" o alvo é o patrimônio na
+    # aposentadoria, não negativo se a poupança não for.
+    if modo == "manter":
+        alvo_nao_negativo = poupanca_inicial >= 0
+    else:
+        alvo_nao_negativo = determinar_alvo(modo, 0.0, valor_final_desejado) >= 0
+
+    min_aporte = 0
     max_iteracoes = 100
     iteracoes = 0
 
@@ -120,51 +448,130 @@ def calcular_aporte_com_ir(
         iteracoes += 1
         aporte_teste = (min_aporte + max_aporte) / 2
 
-        saldo_final, patrimonio_aposentadoria, _, _ = simular_aposentadoria(
-            idade_atual, idade_aposentadoria, expectativa_vida,
-            poupanca_inicial, aporte_teste, renda_mensal, rentabilidade_anual, funcao_imposto
-        )
+        residuo, _ = simular(aporte_teste, parar_se_negativo=alvo_nao_negativo, periodo=periodo)
 
-        alvo = determinar_alvo(modo, patrimonio_aposentadoria, valor_final_desejado)
-
-        if saldo_final > alvo:
+        if residuo > 0:
             max_aporte = aporte_teste
         else:
             min_aporte = aporte_teste
 
     aporte_final = round((min_aporte + max_aporte) / 2, 2)
-    saldo_final, patrimonio_aposentadoria, _, _ = simular_aposentadoria(
-        idade_atual, idade_aposentadoria, expectativa_vida,
-        poupanca_inicial, aporte_final, renda_mensal, rentabilidade_anual, funcao_imposto
-    )
-    alvo = determinar_alvo(modo, patrimonio_aposentadoria, valor_final_desejado)
+    # A simulação final é sempre mensal, com o histórico pedido.
+    residuo_final, resultado = simular(aporte_final, modo_historico)
+    if residuo_final < -tolerancia:
+        # O ponto médio pode ficar abaixo do alvo; o limite superior do intervalo não fica.
+        aporte_final = math.ceil(max_aporte * 100) / 100
+        residuo_final, resultado = simular(aporte_final, modo_historico)
 
-    if saldo_final < alvo - tolerancia:
-        return None, None
+    if residuo_final < -tolerancia:
+        return _sem_aporte("inviavel", -residuo_final)
+
+    return resultado
+
+# ==== SOLUÇÃO DIRETA DO APORTE ====
+
+def calcular_aporte_com_ir(
+    idade_atual: int,
+    idade_aposentadoria: int,
+    expectativa_vida: int,
+    poupanca_inicial: float,
+    renda_mensal: float,
+    rentabilidade_anual: float,
+    modo: str,
+    funcao_imposto: Callable[[float, int, int], float],
+    valor_final_desejado: Optional[float] = None,
+    max_aporte: float = 100_000,
+    metodo: str = "direto",
+    modo_historico: str = "nenhum",
+    periodo: str = "mensal"
+) -> ResultadoAporte:
+    """Encontra o menor aporte mensal necessário com IR aplicado; sem aporte viável, o `motivo` diz por quê.
+
+    `periodo` é o passo das simulações de teste; a simulação final é sempre mensal.
+    """
+    if max_aporte < 0:
+        raise ValueError("max_aporte não pode ser negativo.")
+    if metodo == "bissecao":
+        return _aporte_por_bissecao(
+            idade_atual, idade_aposentadoria, expectativa_vida,
+            poupanca_inicial, renda_mensal, rentabilidade_anual,
+            modo, funcao_imposto, valor_final_desejado, max_aporte, modo_historico,
+            periodo=periodo
+        )
+    if metodo != "direto":
+        raise ValueError("Método inválido. Use 'direto' ou 'bissecao'.")
 
-    _, _, _, total_ir = simular_aposentadoria(
-        idade_atual, idade_aposentadoria, expectativa_vida,
-        poupanca_inicial, aporte_final, renda_mensal, rentabilidade_anual, funcao_imposto
+    tolerancia = 1
+    simular = _simulador(
+        idade_atual, idade_aposentadoria, expectativa_vida, poupanca_inicial, renda_mensal,
+        rentabilidade_anual, modo, funcao_imposto, valor_final_desejado
+    )
+    diagnostico, residuo_zero, residuo_max = _verificar_viabilidade(
+        simular, idade_aposentadoria <= idade_atual, max_aporte, tolerancia, modo_historico, periodo
     )
-    return aporte_final, total_ir
+    if diagnostico is not None:
+        return diagnostico
+
+    if residuo_max - residuo_zero <= tolerancia and residuo_zero >= -tolerancia:
+        # O aporte mal altera o resíduo (ou max_aporte é zero), que já está dentro da tolerância.
+        return simular(0.0, modo_historico)[1]
+    # Os saques não dependem do saldo, então o resíduo é afim no aporte: a reta sai das
+    # duas simulações da pré-verificação e a raiz é confirmada por uma terceira.
+    inclinacao = (residuo_max - residuo_zero) / max_aporte
+
+    # Arredonda para cima no centavo para não ficar abaixo do alvo.
+    raiz = -residuo_zero / inclinacao
+    aporte_final = min(math.ceil(raiz * 100 - 1e-6) / 100, max_aporte)
+
+    residuo_final, resultado = simular(aporte_final, modo_historico)
+    previsto = residuo_zero + inclinacao * aporte_final
+    # Fora da reta prevista (não linearidade), recorre à bisseção.
+    if residuo_final < -tolerancia or abs(residuo_final - previsto) > tolerancia:
+        return _aporte_por_bissecao(
+            idade_atual, idade_aposentadoria, expectativa_vida,
+            poupanca_inicial, renda_mensal, rentabilidade_anual,
+            modo, funcao_imposto, valor_final_desejado, max_aporte, modo_historico,
+            verificar_viabilidade=False, periodo=periodo
+        )
+    return resultado
 
 # ==== COMPARAÇÃO ENTRE REGIMES ====
 
 def selecionar_melhor_regime(
-    prog: Optional[Tuple[float, float]],
-    regr: Optional[Tuple[float, float]]
+    prog: Optional[ResultadoAporte],
+    regr: Optional[ResultadoAporte]
 ) -> dict:
-    """Compara os dois regimes e retorna o mais vantajoso."""
-    if prog is None and regr is None:
-        return {"aporte_mensal": None}
-    if prog is None:
-        return {"aporte_mensal": regr[0], "regime": "regressivo"}
-    if regr is None:
-        return {"aporte_mensal": prog[0], "regime": "progressivo"}
-    return {"aporte_mensal": prog[0], "regime": "progressivo"} if prog[0] < regr[0] else {"aporte_mensal": regr[0], "regime": "regressivo"}
+    """Compara os dois regimes e retorna o mais vantajoso com as saídas da sua simulação."""
+    viaveis = {
+        regime: resultado for regime, resultado in (("progressivo", prog), ("regressivo", regr))
+        if resultado is not None and resultado.viavel
+    }
+    if not viaveis:
+        diagnosticos = [resultado for resultado in (prog, regr) if resultado is not None]
+        if not diagnosticos:
+            return {"aporte_mensal": None, "motivo": "inviavel", "deficit": None}
+        # Nenhum regime viável: fica o motivo do que chega mais perto do alvo.
+        melhor = min(diagnosticos, key=lambda resultado: resultado.deficit or 0.0)
+        return {"aporte_mensal": None, "motivo": melhor.motivo, "deficit": melhor.deficit}
+    if len(viaveis) == 1:
+        regime, escolhido = next(iter(viaveis.items()))
+    elif prog.aporte_mensal < regr.aporte_mensal:
+        regime, escolhido = "progressivo", prog
+    else:
+        regime, escolhido = "regressivo", regr
+    return {
+        "aporte_mensal": escolhido.aporte_mensal,
+        "regime": regime,
+        "motivo": escolhido.motivo,
+        "saldo_final": escolhido.saldo_final,
+        "patrimonio_aposentadoria": escolhido.patrimonio_aposentadoria,
+        "total_ir": escolhido.total_ir,
+        "historico": escolhido.historico,
+    }
 
 # ==== FUNÇÃO PRINCIPAL ====
 
+@cronometrado()
 def calcular_aporte(
     idade_atual: int,
     idade_aposentadoria: int,
@@ -177,21 +584,170 @@ def calcular_aporte(
     valor_final_desejado: Optional[float] = None,
     renda_atual: Optional[float] = None,
     percentual_de_renda: Optional[float] = None,
-    max_aporte: float = 100_000
+    max_aporte: float = 100_000,
+    modo_historico: str = "nenhum",
+    periodo: str = "mensal"
 ) -> dict:
-    """Calcula o aporte ideal comparando regimes progressivo e regressivo de IR."""
-    resultado_prog = calcular_aporte_com_ir(
-        idade_atual, idade_aposentadoria, expectativa_vida,
-        poupanca_inicial, renda_mensal, rentabilidade_anual,
-        modo, lambda v, m, a: ir_progressivo(v),
-        valor_final_desejado, max_aporte
+    """Calcula o aporte ideal comparando regimes progressivo e regressivo de IR.
+
+    Traz o regime escolhido, o `motivo`, as saídas da sua simulação e, em "comparacao", cada regime.
+    """
+    comparacao = {
+        regime: calcular_aporte_com_ir(
+            idade_atual, idade_aposentadoria, expectativa_vida,
+            poupanca_inicial, renda_mensal, rentabilidade_anual,
+            modo, funcao_imposto,
+            valor_final_desejado, max_aporte, modo_historico=modo_historico, periodo=periodo
+        )
+        for regime, funcao_imposto in FUNCOES_IMPOSTO.items()
+    }
+
+    resultado = selecionar_melhor_regime(comparacao["progressivo"], comparacao["regressivo"])
+    resultado["comparacao"] = comparacao
+    return resultado
+
+# ==== CONJUNTOS DE CENÁRIOS ====
+
+# Parâmetros que definem uma simulação; cenários que diferem só no objetivo
+# (`modo`, `valor_final_desejado`) compartilham as mesmas simulações.
+CAMPOS_SIMULACAO = (
+    "idade_atual", "idade_aposentadoria", "expectativa_vida",
+    "poupanca_inicial", "renda_mensal", "rentabilidade_anual",
+)
+
+
+def _chave_simulacao(cenario: dict) -> tuple:
+    return (
+        int(cenario["idade_atual"]), int(cenario["idade_aposentadoria"]), int(cenario["expectativa_vida"]),
+        float(cenario["poupanca_inicial"]), float(cenario["renda_mensal"]), float(cenario["rentabilidade_anual"]),
     )
 
-    resultado_regr = calcular_aporte_com_ir(
-        idade_atual, idade_aposentadoria, expectativa_vida,
-        poupanca_inicial, renda_mensal, rentabilidade_anual,
-        modo, ir_regressivo,
-        valor_final_desejado, max_aporte
+
+@lru_cache(maxsize=1024)
+def _valor_futuro_saques(renda_mensal: float, rentabilidade_anual: float, meses_saque: int, anos_aporte: int, regime: str) -> float:
+    """Quanto os saques de toda a fase de retirada descontam do saldo final; não depende do aporte."""
+    import numpy as np
+
+    taxa = taxa_mensal(rentabilidade_anual)
+    tabela = FUNCOES_IMPOSTO[regime].tabela(renda_mensal / 0.85, meses_saque, anos_aporte)
+    if not isinstance(tabela, tuple):
+        return _saldo_composto(0.0, renda_mensal + tabela, taxa, math.log1p(taxa), meses_saque)
+    # Σ saque_k · g^(meses_saque − 1 − k)
+    fatores = np.exp(np.arange(meses_saque - 1, -1, -1) * math.log1p(taxa))
+    return float(np.dot(renda_mensal + np.asarray(tabela), fatores))
+
+
+def comparar_cenarios(
+    cenarios: Sequence[dict],
+    max_aporte: float = 100_000,
+    modo_historico: str = "nenhum"
+) -> List[dict]:
+    """Resolve vários cenários de uma vez e retorna uma linha de comparação por cenário.
+
+    Cada cenário traz os argumentos de `calcular_aporte` e, opcionalmente, `nome`.
+    """
+    import numpy as np
+
+    if modo_historico not in MODOS_HISTORICO:
+        raise ValueError("Modo de histórico inválido. Use 'nenhum', 'anual' ou 'completo'.")
+    cenarios = [
+        {"modo": "manter", "valor_final_desejado": None, **cenario, "nome": cenario.get("nome") or f"Cenário {i}"}
+        for i, cenario in enumerate(cenarios, start=1)
+    ]
+    if not cenarios:
+        return []
+    for cenario in cenarios:
+        determinar_alvo(cenario["modo"], 0.0, cenario["valor_final_desejado"])  # valida o modo
+
+    linhas = [(indice, regime) for indice in range(len(cenarios)) for regime in FUNCOES_IMPOSTO]
+    chaves = [_chave_simulacao(cenarios[indice]) for indice, _ in linhas]
+    idade_atual, idade_aposentadoria, expectativa, poupanca, renda, rentabilidade = (
+        np.array(coluna, dtype=float) for coluna in zip(*chaves)
     )
+    meses_aporte = (idade_aposentadoria - idade_atual) * 12
+    meses_saque = (expectativa - idade_aposentadoria) * 12
+    taxa = np.array([taxa_mensal(r) for r in rentabilidade])
+    direto = (meses_aporte > 0) & (meses_saque >= 0) & (taxa > -1)
+
+    # O resíduo de cada cenário e regime é afim no aporte, com coeficientes em forma fechada:
+    # patrimônio(a) = poupança·g^n + a·anuidade; saldo final(a) = patrimônio(a)·g^m − saques.
+    log_fator = np.log1p(np.where(direto, taxa, 0.0))
+    crescimento_aporte = np.expm1(meses_aporte * log_fator)
+    crescimento_saque = np.expm1(meses_saque * log_fator)
+    anuidade = np.where(taxa == 0, meses_aporte, crescimento_aporte / np.where(taxa == 0, 1.0, taxa))
+    patrimonio_zero = poupanca * (1 + crescimento_aporte)
+    saques = np.array([
+        _valor_futuro_saques(chave[4], chave[5], int(m), chave[1] - chave[0], regime) if ok else 0.0
+        for chave, (_, regime), m, ok in zip(chaves, linhas, meses_saque, direto)
+    ])
+
+    manter = np.array([cenarios[indice]["modo"] == "manter" for indice, _ in linhas])
+    alvo_fixo = np.array([
+        (cenarios[indice]["valor_final_desejado"] or 0) if cenarios[indice]["modo"] == "atingir" else 0.0
+        for indice, _ in linhas
+    ])
+    fator_alvo = np.where(manter, crescimento_saque, 1 + crescimento_saque)
+    residuo_zero = patrimonio_zero * fator_alvo - saques - alvo_fixo
+    inclinacao = anuidade * fator_alvo
+
+    tolerancia = 1
+    with np.errstate(divide="ignore", invalid="ignore"):
+        raiz = np.ceil(-residuo_zero / inclinacao * 100 - 1e-6) / 100
+    # Se o aporte mal altera o resíduo e ele já está dentro da tolerância, zero basta.
+    plano = (inclinacao * max_aporte <= tolerancia) & (residuo_zero >= -tolerancia)
+    aportes = np.where((residuo_zero >= 0) | plano, 0.0, np.minimum(raiz, max_aporte))
+    residuo_max = residuo_zero + inclinacao * max_aporte
+    inviavel = (residuo_zero < 0) & (residuo_max < -tolerancia)
+    deficit = -residuo_max
+
+    por_cenario: Dict[int, dict] = {indice: {} for indice in range(len(cenarios))}
+    finais = {}
+    for posicao, (indice, regime) in enumerate(linhas):
+        cenario = cenarios[indice]
+        if direto[posicao] and inviavel[posicao]:
+            por_cenario[indice][regime] = _sem_aporte("inviavel", deficit[posicao])
+            continue
+        if direto[posicao]:
+            aporte = float(aportes[posicao])
+            # Uma simulação confirma cada raiz; cenários que só diferem no objetivo a compartilham.
+            chave_final = (chaves[posicao], regime, aporte)
+            if chave_final not in finais:
+                saldo_final, patrimonio, historico, total_ir = simular_aposentadoria(
+                    *chaves[posicao][:4], aporte, *chaves[posicao][4:], FUNCOES_IMPOSTO[regime],
+                    modo_historico=modo_historico
+                )
+                finais[chave_final] = ResultadoAporte(
+                    aporte, saldo_final, patrimonio, total_ir, historico,
+                    motivo="ja_financiado" if aporte == 0 else "resolvido"
+                )
+            resultado = finais[chave_final]
+            residuo = resultado.saldo_final - determinar_alvo(
+                cenario["modo"], resultado.patrimonio_aposentadoria, cenario["valor_final_desejado"]
+            )
+            previsto = residuo_zero[posicao] + inclinacao[posicao] * aporte
+            if residuo >= -tolerancia and abs(residuo - previsto) <= tolerancia:
+                por_cenario[indice][regime] = resultado
+                continue
+        # Confirmação falhou ou não há fase de aportes: resolve pelo caminho escalar.
+        por_cenario[indice][regime] = calcular_aporte_com_ir(
+            *chaves[posicao], cenario["modo"], FUNCOES_IMPOSTO[regime],
+            cenario["valor_final_desejado"], max_aporte, modo_historico=modo_historico
+        )
 
-    return selecionar_melhor_regime(resultado_prog, resultado_regr)
+    tabela = []
+    for indice, cenario in enumerate(cenarios):
+        melhor = selecionar_melhor_regime(por_cenario[indice]["progressivo"], por_cenario[indice]["regressivo"])
+        tabela.append({
+            "nome": cenario["nome"],
+            **{campo: cenario[campo] for campo in CAMPOS_SIMULACAO},
+            "modo": cenario["modo"],
+            "valor_final_desejado": cenario["valor_final_desejado"],
+            "aporte_mensal": melhor["aporte_mensal"],
+            "regime": melhor.get("regime"),
+            "motivo": melhor["motivo"],
+            "patrimonio_aposentadoria": melhor.get("patrimonio_aposentadoria"),
+            "saldo_final": melhor.get("saldo_final"),
+            "total_ir": melhor.get("total_ir"),
+            "historico": melhor.get("historico"),
+        })
+    return tabela
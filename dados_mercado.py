@@ -0,0 +1,207 @@
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from instrumentacao import contar, cronometrado
+
+logger = logging.getLogger(__name__)
+
+# ==== CONFIGURAÇÃO ====
+
+URL_SGS = "https://api.bcb.gov.br/dados/serie/bcdata.sgs.{codigo}/dados"
+SERIE_IPCA = 433
+SERIE_SELIC = 4390
+DIRETORIO_PADRAO = os.environ.get(
+    "CACHE_DADOS_MERCADO", os.path.join(os.path.expanduser("~"), ".cache", "calculadora-aportes")
+)
+
+# ==== TRANSPORTE HTTP ====
+
+class TransporteRequests:
+    """Transporte HTTP padrão: uma sessão `requests` com pool de conexões reaproveitado."""
+
+    def __init__(self, tamanho_pool: int = 4):
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.sessao = requests.Session()
+        adaptador = HTTPAdapter(pool_connections=tamanho_pool, pool_maxsize=tamanho_pool, max_retries=1)
+        self.sessao.mount("https://", adaptador)
+        self.sessao.mount("http://", adaptador)
+
+    def obter_json(self, url: str, parametros: dict, timeout: float):
+        resposta = self.sessao.get(url, params=parametros, timeout=timeout)
+        resposta.raise_for_status()
+        return resposta.json()
+
+
+_transporte_padrao: Optional[TransporteRequests] = None
+_trava_transporte = threading.Lock()
+
+
+def transporte_padrao() -> TransporteRequests:
+    """Transporte compartilhado pelo processo, criado no primeiro uso."""
+    global _transporte_padrao
+    with _trava_transporte:
+        if _transporte_padrao is None:
+            _transporte_padrao = TransporteRequests()
+        return _transporte_padrao
+
+# ==== CACHE EM DISCO ====
+
+class CacheSeries:
+    """Pontos de séries SGS gravados em disco, um arquivo JSON por série.
+
+    Além dos pontos, cada arquivo registra o início já consultado, a data do último
+    ponto recebido e o instante da última consulta, o que permite buscar só os
+    trechos que faltam.
+    """
+
+    def __init__(self, diretorio: str = DIRETORIO_PADRAO):
+        self.diretorio = diretorio
+        self._trava = threading.Lock()
+
+    def _caminho(self, codigo: int) -> str:
+        return os.path.join(self.diretorio, f"sgs_{codigo}.json")
+
+    def carregar(self, codigo: int) -> dict:
+        try:
+            with open(self._caminho(codigo), encoding="utf-8") as arquivo:
+                return json.load(arquivo)
+        except (OSError, ValueError):
+            return {"pontos": {}, "inicio": None, "fim": None, "consultado_em": 0}
+
+    def salvar(self, codigo: int, dados: dict) -> None:
+        """Grava de forma atômica (arquivo temporário + rename)."""
+        with self._trava:
+            os.makedirs(self.diretorio, exist_ok=True)
+            descritor, temporario = tempfile.mkstemp(dir=self.diretorio, suffix=".tmp")
+            with os.fdopen(descritor, "w", encoding="utf-8") as arquivo:
+                json.dump(dados, arquivo)
+            os.replace(temporario, self._caminho(codigo))
+
+# ==== BUSCA INCREMENTAL ====
+
+def _formatar(data: date) -> str:
+    return data.strftime("%d/%m/%Y")
+
+
+def _trechos_faltantes(dados: dict, inicio: date, fim: date, validade: float) -> List[Tuple[date, date]]:
+    """Intervalos de [inicio, fim] que ainda não foram consultados (ou cuja cauda expirou)."""
+    if dados["inicio"] is None:
+        return [(inicio, fim)]
+    coberto_inicio = date.fromisoformat(dados["inicio"])
+    # `fim` é a data do último ponto recebido (None se nenhum chegou ainda), não o fim
+    # pedido: meses ainda não publicados continuam faltando até aparecerem.
+    coberto_fim = date.fromisoformat(dados["fim"]) if dados["fim"] else coberto_inicio - timedelta(days=1)
+    trechos = []
+    if inicio < coberto_inicio:
+        trechos.append((inicio, coberto_inicio - timedelta(days=1)))
+    # A cauda pode ganhar pontos novos: só é consultada de novo após a validade.
+    if fim > coberto_fim and time.time() - dados["consultado_em"] > validade:
+        trechos.append((coberto_fim + timedelta(days=1), fim))
+    return trechos
+
+
+def _consultar(transporte, url_base: str, codigo: int, inicio: date, fim: date, timeout: float) -> Dict[str, float]:
+    brutos = transporte.obter_json(
+        url_base.format(codigo=codigo),
+        {"formato": "json", "dataInicial": _formatar(inicio), "dataFinal": _formatar(fim)},
+        timeout,
+    )
+    return {
+        datetime.strptime(ponto["data"], "%d/%m/%Y").date().isoformat(): float(str(ponto["valor"]).replace(",", "."))
+        for ponto in brutos
+    }
+
+
+@cronometrado()
+def buscar_series(
+    codigos: Iterable[int],
+    inicio: date,
+    fim: date,
+    transporte=None,
+    cache: Optional[CacheSeries] = None,
+    url_base: str = URL_SGS,
+    timeout: float = 5.0,
+    validade: float = 12 * 3600
+) -> Dict[int, Dict[date, float]]:
+    """Retorna as séries SGS pedidas no intervalo, consultando a API só no que falta.
+
+    Os trechos faltantes de todas as séries são buscados em paralelo, com `timeout`
+    por requisição. Se a API falhar (ou não houver rede), o trecho é ignorado e a
+    série é servida com o que houver no cache. `transporte` é qualquer objeto com
+    `obter_json(url, parametros, timeout)`, o que permite apontar para um servidor
+    local em testes.
+    """
+    codigos = list(codigos)
+    if cache is None:
+        cache = CacheSeries()
+    dados = {codigo: cache.carregar(codigo) for codigo in codigos}
+    tarefas = [
+        (codigo, trecho_inicio, trecho_fim)
+        for codigo in codigos
+        for trecho_inicio, trecho_fim in _trechos_faltantes(dados[codigo], inicio, fim, validade)
+    ]
+
+    if tarefas:
+        contar("sgs_consultas", len(tarefas))
+        if transporte is None:
+            transporte = transporte_padrao()
+        with ThreadPoolExecutor(max_workers=min(len(tarefas), 4)) as executor:
+            futuros = {
+                tarefa: executor.submit(_consultar, transporte, url_base, *tarefa, timeout)
+                for tarefa in tarefas
+            }
+
+        alterados = set()
+        for (codigo, trecho_inicio, trecho_fim), futuro in futuros.items():
+            try:
+                pontos = futuro.result()
+            except Exception as erro:
+                contar("sgs_falhas")
+                logger.warning("Falha ao consultar a série SGS %s (%s a %s): %s", codigo, trecho_inicio, trecho_fim, erro)
+                continue
+            serie = dados[codigo]
+            serie["pontos"].update(pontos)
+            serie["inicio"] = min(filter(None, [serie["inicio"], trecho_inicio.isoformat()]))
+            serie["fim"] = max(filter(None, [serie["fim"], *pontos]), default=None)
+            serie["consultado_em"] = time.time()
+            alterados.add(codigo)
+
+        for codigo in alterados:
+            try:
+                cache.salvar(codigo, dados[codigo])
+            except OSError as erro:
+                logger.warning("Não foi possível gravar o cache da série SGS %s: %s", codigo, erro)
+
+    return {
+        codigo: {
+            date.fromisoformat(dia): valor
+            for dia, valor in sorted(dados[codigo]["pontos"].items())
+            if inicio <= date.fromisoformat(dia) <= fim
+        }
+        for codigo in codigos
+    }
+
+# ==== MÉDIAS HISTÓRICAS ====
+
+def medias_historicas(ipca: Dict[date, float], selic: Dict[date, float]) -> Optional[Tuple[float, float, float]]:
+    """Médias anualizadas (em %) de SELIC, IPCA e juros real nos meses comuns às duas séries."""
+    meses = sorted(set(ipca) & set(selic))
+    if not meses:
+        return None
+    ipca_mensal = [ipca[mes] / 100 for mes in meses]
+    selic_mensal = [selic[mes] / 100 for mes in meses]
+    juros_real_mensal = [(1 + s) / (1 + i) - 1 for s, i in zip(selic_mensal, ipca_mensal)]
+
+    def anualizar(valores: List[float]) -> float:
+        return round(((1 + sum(valores) / len(valores)) ** 12 - 1) * 100, 2)
+
+    return anualizar(selic_mensal), anualizar(ipca_mensal), anualizar(juros_real_mensal)
@@ -0,0 +1,401 @@
+"""Teste diferencial dos motores otimizados contra o oráculo congelado (`referencia.py`).
+
+Uso:
+    python diferencial.py                    # 100 exemplos por propriedade
+    python diferencial.py --exemplos 1000    # busca mais longa
+    python diferencial.py --filtro solucao   # só as propriedades cujo nome contém "solucao"
+    python diferencial.py --aleatorio        # exemplos novos a cada execução
+
+Requer o pacote hypothesis (pip install -r requirements-dev.txt). Cada propriedade gera perfis
+válidos aleatórios e compara uma implementação alternativa com a referência:
+
+- simulacao_*: `core.simular_aposentadoria` em cada motor, período e modo de
+  histórico, `lote.simular_aposentadoria_lote` e `cache.simular_aposentadoria_cacheado`.
+  Saldo final, patrimônio na aposentadoria, IR total e histórico (amostrado como o modo
+  pede) precisam coincidir com tolerância relativa de 1e-9 da escala da simulação (o
+  maior valor absoluto envolvido): fórmulas fechadas e passos maiores só mudam a ordem
+  dos arredondamentos.
+- solucao_*: `core.calcular_aporte_com_ir` (métodos direto e bisseção, passos mensal e
+  anual), `core.calcular_aporte` e `core.comparar_cenarios`. A bisseção de referência
+  tem folga de R$ 1, então o aporte é conferido pela simulação de referência: com ele
+  o saldo final fica no máximo R$ 1 abaixo do alvo, e com R$ 1,01 a menos não passa
+  do alvo (mínimo dentro da folga, mais um centavo de arredondamento para cima). Sem
+  aporte viável, a simulação de referência com `max_aporte` fica mais de R$ 1 abaixo
+  do alvo; no modo "manter" sem patrimônio na aposentadoria, não há alvo e o
+  motivo é "sem_fase_de_aportes". O regime escolhido segue
+  `referencia.selecionar_melhor_regime`.
+- sensibilidade_grade: cada célula de `sensibilidade.iterar_grade_sensibilidade` é
+  conferida como as soluções acima e precisa repetir `core.calcular_aporte`.
+- monte_carlo_sem_volatilidade: com volatilidade zero, todas as trajetórias de
+  `monte_carlo.simular_monte_carlo` são a simulação de referência; faixas anuais e
+  saldo final (em cada percentil) precisam coincidir com ela dentro da tolerância mais
+  a largura de uma faixa do histograma, e ruína e sucesso são 0 ou 1 conforme ela.
+
+Com os exemplos derivados de forma determinística (padrão), a execução é reprodutível
+e serve de portão para mudanças de desempenho. Termina com código 1 se alguma
+propriedade falhar, mostrando o menor contraexemplo encontrado.
+"""
+import argparse
+import math
+import sys
+from typing import Callable, List, Optional, Tuple
+
+try:
+    from hypothesis import given, settings
+    from hypothesis import strategies as st
+except ImportError:
+    sys.exit("diferencial.py requer o pacote hypothesis: pip install -r requirements-dev.txt")
+
+import core
+import referencia
+
+TOLERANCIA_RELATIVA = 1e-9
+TOLERANCIA_ALVO = 1  # folga do saldo final em relação ao alvo, a mesma dos solvers
+FOLGA_APORTE = 1.01  # folga da bisseção de referência mais um centavo
+
+# Funções de imposto na forma usada pela referência (`referencia.calcular_aporte`).
+IMPOSTOS_REFERENCIA = {
+    "progressivo": lambda valor, mes, anos_aporte: referencia.ir_progressivo(valor),
+    "regressivo": referencia.ir_regressivo,
+}
+PROPRIEDADES: List[Tuple[str, Callable, st.SearchStrategy]] = []
+
+
+def propriedade(nome: str, estrategia: st.SearchStrategy):
+    """Registra uma função `(exemplo) -> None`, que falha com AssertionError, como propriedade."""
+    def registrar(funcao):
+        PROPRIEDADES.append((nome, funcao, estrategia))
+        return funcao
+    return registrar
+
+# ==== PERFIS ====
+
+def _valor(maximo: float) -> st.SearchStrategy:
+    return st.one_of(st.just(0.0), st.floats(0, maximo, allow_nan=False, allow_infinity=False))
+
+
+RENTABILIDADES = st.one_of(st.sampled_from([0.0, 0.045]), st.floats(-0.05, 0.15, allow_nan=False))
+
+
+@st.composite
+def perfis_simulacao(draw) -> dict:
+    """Aposentadoria imediata, após a expectativa de vida e horizonte zero incluídos."""
+    idade_atual = draw(st.integers(18, 80))
+    return {
+        "idade_atual": idade_atual,
+        "idade_aposentadoria": draw(st.integers(idade_atual, idade_atual + 50)),
+        "expectativa_vida": draw(st.integers(idade_atual, 110)),
+        "poupanca_inicial": draw(_valor(5e6)),
+        "aporte_mensal": draw(_valor(5e4)),
+        "renda_mensal": draw(_valor(8e4)),
+        "rentabilidade_anual": draw(RENTABILIDADES),
+        "regime": draw(st.sampled_from(list(core.FUNCOES_IMPOSTO))),
+    }
+
+
+@st.composite
+def perfis_solucao(draw) -> dict:
+    """Perfis com fase de aportes, como a interface exige, e sem ela (aposentadoria imediata)."""
+    idade_atual = draw(st.integers(18, 70))
+    idade_aposentadoria = draw(st.one_of(st.just(idade_atual), st.integers(idade_atual + 1, 85)))
+    modo = draw(st.sampled_from(["zerar", "manter", "atingir"]))
+    return {
+        "idade_atual": idade_atual,
+        "idade_aposentadoria": idade_aposentadoria,
+        "expectativa_vida": draw(st.integers(idade_aposentadoria, 110)),
+        "poupanca_inicial": draw(_valor(5e6)),
+        "renda_mensal": draw(_valor(8e4)),
+        "rentabilidade_anual": draw(RENTABILIDADES),
+        "modo": modo,
+        "valor_final_desejado": draw(_valor(5e6)) if modo == "atingir" else None,
+        "max_aporte": draw(st.sampled_from([100_000, 2_000])),
+    }
+
+
+@st.composite
+def grades_sensibilidade(draw) -> dict:
+    """Grades pequenas; combinações de idade inválidas são descartadas pela própria grade."""
+    idade_atual = draw(st.integers(18, 70))
+    modo = draw(st.sampled_from(["zerar", "manter", "atingir"]))
+    return {
+        "idade_atual": idade_atual,
+        "poupanca_inicial": draw(_valor(5e6)),
+        "idades_aposentadoria": draw(st.lists(st.integers(idade_atual, 85), min_size=1, max_size=3, unique=True)),
+        "rentabilidades": draw(st.lists(RENTABILIDADES, min_size=1, max_size=2)),
+        "rendas": draw(st.lists(_valor(8e4), min_size=1, max_size=2)),
+        "expectativas": draw(st.lists(st.integers(idade_atual, 110), min_size=1, max_size=2)),
+        "modo": modo,
+        "valor_final_desejado": draw(_valor(5e6)) if modo == "atingir" else None,
+        "max_aporte": draw(st.sampled_from([100_000, 2_000])),
+    }
+
+
+@st.composite
+def perfis_monte_carlo(draw) -> dict:
+    """Perfis com horizonte positivo e aposentadoria até a expectativa de vida."""
+    idade_atual = draw(st.integers(18, 80))
+    expectativa_vida = draw(st.integers(idade_atual + 1, 110))
+    modo = draw(st.sampled_from(["zerar", "manter", "atingir"]))
+    return {
+        "idade_atual": idade_atual,
+        "idade_aposentadoria": draw(st.integers(idade_atual, expectativa_vida)),
+        "expectativa_vida": expectativa_vida,
+        "poupanca_inicial": draw(_valor(5e6)),
+        "aporte_mensal": draw(_valor(5e4)),
+        "renda_mensal": draw(_valor(8e4)),
+        "rentabilidade_anual": draw(RENTABILIDADES),
+        "regime": draw(st.sampled_from(list(core.FUNCOES_IMPOSTO))),
+        "modo": modo,
+        "valor_final_desejado": draw(_valor(5e6)) if modo == "atingir" else None,
+    }
+
+
+def _argumentos(perfil: dict) -> tuple:
+    return tuple(perfil[campo] for campo in core.CAMPOS_SIMULACAO)
+
+# ==== CONFERÊNCIA ====
+
+def _simular_referencia(perfil: dict, aporte: float, regime: str):
+    return referencia.simular_aposentadoria(
+        perfil["idade_atual"], perfil["idade_aposentadoria"], perfil["expectativa_vida"],
+        perfil["poupanca_inicial"], aporte, perfil["renda_mensal"], perfil["rentabilidade_anual"],
+        IMPOSTOS_REFERENCIA[regime]
+    )
+
+
+def _conferir_simulacao(esperado, obtido, passo_historico: int, rotulo: str) -> None:
+    """Compara (saldo, patrimônio, histórico, IR) com a saída da referência."""
+    saldo, patrimonio, historico, total_ir = esperado
+    pontos = historico[::passo_historico] if passo_historico else []
+    escala = max([1.0, abs(saldo), abs(total_ir), abs(patrimonio or 0.0)] + [abs(valor) for valor in historico])
+
+    def proximos(campo, a, b):
+        assert abs(a - b) <= TOLERANCIA_RELATIVA * escala, f"{rotulo}: {campo} {a!r} contra {b!r}"
+
+    proximos("saldo", saldo, obtido[0])
+    proximos("ir", total_ir, obtido[3])
+    assert (patrimonio is None) == (obtido[1] is None), f"{rotulo}: patrimônio {patrimonio!r} contra {obtido[1]!r}"
+    if patrimonio is not None:
+        proximos("patrimonio", patrimonio, obtido[1])
+    obtidos = list(obtido[2] or [])
+    assert len(pontos) == len(obtidos), f"{rotulo}: histórico com {len(obtidos)} pontos, esperados {len(pontos)}"
+    for i, (a, b) in enumerate(zip(pontos, obtidos)):
+        proximos(f"historico[{i}]", a, b)
+
+
+def _conferir_aporte(perfil: dict, regime: str, aporte, rotulo: str, motivo: Optional[str] = None) -> None:
+    """Confere o aporte (ou a ausência dele) pela simulação e pelo alvo de referência."""
+    def alvo(valor: float):
+        saldo, patrimonio, _, _ = _simular_referencia(perfil, valor, regime)
+        return saldo, referencia.determinar_alvo(perfil["modo"], patrimonio, perfil["valor_final_desejado"])
+
+    def residuo(valor: float) -> float:
+        saldo, valor_alvo = alvo(valor)
+        return saldo - valor_alvo
+
+    if alvo(0.0)[1] is None:
+        # "manter" sem patrimônio na aposentadoria: a referência não tem alvo.
+        assert aporte is None, f"{rotulo}: aporte {aporte} sem alvo de referência"
+        assert motivo in (None, "sem_fase_de_aportes"), f"{rotulo}: motivo {motivo} sem alvo de referência"
+        return
+    if aporte is None:
+        assert residuo(perfil["max_aporte"]) < -TOLERANCIA_ALVO, f"{rotulo}: inviável, mas max_aporte atinge o alvo"
+        return
+    assert 0 <= aporte <= perfil["max_aporte"] + 0.01, f"{rotulo}: aporte {aporte} fora de [0, max_aporte]"
+    assert residuo(aporte) >= -TOLERANCIA_ALVO, f"{rotulo}: aporte {aporte} não atinge o alvo"
+    if aporte >= FOLGA_APORTE:
+        assert residuo(aporte - FOLGA_APORTE) <= 0, f"{rotulo}: aporte {aporte} não é mínimo"
+
+
+def _regime_referencia(prog, regr) -> dict:
+    """Regra de escolha da referência, aplicada só a resultados viáveis."""
+    tuplas = [None if r.aporte_mensal is None else (r.aporte_mensal, r.total_ir) for r in (prog, regr)]
+    return referencia.selecionar_melhor_regime(*tuplas)
+
+# ==== SIMULAÇÃO ====
+
+@propriedade("simulacao_core", perfis_simulacao())
+def _simulacao_core(perfil: dict) -> None:
+    esperado = _simular_referencia(perfil, perfil["aporte_mensal"], perfil["regime"])
+    argumentos = (
+        perfil["idade_atual"], perfil["idade_aposentadoria"], perfil["expectativa_vida"], perfil["poupanca_inicial"],
+        perfil["aporte_mensal"], perfil["renda_mensal"], perfil["rentabilidade_anual"],
+        core.FUNCOES_IMPOSTO[perfil["regime"]],
+    )
+    for motor in core.MOTORES:
+        for periodo in core.PERIODOS:
+            for modo_historico, passo in core.MODOS_HISTORICO.items():
+                if periodo != "mensal" and modo_historico == "completo":
+                    continue
+                obtido = core.simular_aposentadoria(*argumentos, modo_historico, motor=motor, periodo=periodo)
+                _conferir_simulacao(esperado, obtido, passo, f"{motor}/{periodo}/{modo_historico}")
+
+
+@propriedade("simulacao_lote", perfis_simulacao())
+def _simulacao_lote(perfil: dict) -> None:
+    from lote import simular_aposentadoria_lote
+
+    esperado = _simular_referencia(perfil, perfil["aporte_mensal"], perfil["regime"])
+    for modo_historico, passo in core.MODOS_HISTORICO.items():
+        saldo, patrimonio, historico, total_ir = simular_aposentadoria_lote(
+            perfil["idade_atual"], perfil["idade_aposentadoria"], perfil["expectativa_vida"],
+            perfil["poupanca_inicial"], perfil["aporte_mensal"], perfil["renda_mensal"],
+            perfil["rentabilidade_anual"], regime=perfil["regime"], modo_historico=modo_historico
+        )
+        patrimonio = None if math.isnan(patrimonio[0]) else float(patrimonio[0])
+        obtido = (float(saldo[0]), patrimonio, historico[0].tolist(), float(total_ir[0]))
+        _conferir_simulacao(esperado, obtido, passo, f"lote/{modo_historico}")
+
+
+@propriedade("simulacao_cache", perfis_simulacao())
+def _simulacao_cache(perfil: dict) -> None:
+    from cache import CacheLRU, simular_aposentadoria_cacheado
+
+    # O cache normaliza os valores monetários ao centavo; a referência recebe os mesmos valores.
+    perfil = {campo: round(valor, 2) if isinstance(valor, float) and campo != "rentabilidade_anual" else valor
+              for campo, valor in perfil.items()}
+    esperado = _simular_referencia(perfil, perfil["aporte_mensal"], perfil["regime"])
+    cache = CacheLRU(max_itens=8)
+    for rotulo in ("cache/falha", "cache/acerto"):
+        obtido = simular_aposentadoria_cacheado(
+            perfil["idade_atual"], perfil["idade_aposentadoria"], perfil["expectativa_vida"],
+            perfil["poupanca_inicial"], perfil["aporte_mensal"], perfil["renda_mensal"],
+            perfil["rentabilidade_anual"], core.FUNCOES_IMPOSTO[perfil["regime"]],
+            modo_historico="anual", cache=cache
+        )
+        _conferir_simulacao(esperado, obtido, 12, rotulo)
+
+# ==== SOLUÇÃO DO APORTE ====
+
+@propriedade("solucao_calcular_aporte", perfis_solucao())
+def _solucao(perfil: dict) -> None:
+    opcoes = dict(valor_final_desejado=perfil["valor_final_desejado"], max_aporte=perfil["max_aporte"])
+    for regime, funcao_imposto in core.FUNCOES_IMPOSTO.items():
+        for metodo in ("direto", "bissecao"):
+            for periodo in ("mensal", "anual"):
+                resultado = core.calcular_aporte_com_ir(
+                    *_argumentos(perfil), perfil["modo"], funcao_imposto, metodo=metodo, periodo=periodo, **opcoes
+                )
+                _conferir_aporte(
+                    perfil, regime, resultado.aporte_mensal, f"{regime}/{metodo}/{periodo}", resultado.motivo
+                )
+
+    melhor = core.calcular_aporte(*_argumentos(perfil), modo=perfil["modo"], **opcoes)
+    esperado = _regime_referencia(melhor["comparacao"]["progressivo"], melhor["comparacao"]["regressivo"])
+    assert melhor["aporte_mensal"] == esperado["aporte_mensal"], f"aporte {melhor['aporte_mensal']} contra {esperado}"
+    assert melhor.get("regime") == esperado.get("regime"), f"regime {melhor.get('regime')} contra {esperado}"
+
+
+@propriedade("solucao_comparar_cenarios", st.lists(perfis_solucao(), min_size=1, max_size=4))
+def _solucao_cenarios(perfis: List[dict]) -> None:
+    # Todos os cenários de uma chamada compartilham o max_aporte do primeiro.
+    perfis = [dict(perfil, max_aporte=perfis[0]["max_aporte"]) for perfil in perfis]
+    linhas = core.comparar_cenarios(
+        [{campo: perfil[campo] for campo in (*core.CAMPOS_SIMULACAO, "modo", "valor_final_desejado")}
+         for perfil in perfis],
+        max_aporte=perfis[0]["max_aporte"]
+    )
+    for i, (perfil, linha) in enumerate(zip(perfis, linhas)):
+        _conferir_aporte(
+            perfil, linha["regime"] or "progressivo", linha["aporte_mensal"], f"cenário {i}", linha["motivo"]
+        )
+        escalar = core.calcular_aporte(
+            *_argumentos(perfil), modo=perfil["modo"], valor_final_desejado=perfil["valor_final_desejado"],
+            max_aporte=perfil["max_aporte"]
+        )
+        assert (linha["aporte_mensal"], linha["regime"]) == (escalar["aporte_mensal"], escalar.get("regime")), \
+            f"cenário {i}: {linha['aporte_mensal']} ({linha['regime']}) contra calcular_aporte {escalar}"
+
+# ==== GRADE DE SENSIBILIDADE ====
+
+@propriedade("sensibilidade_grade", grades_sensibilidade())
+def _sensibilidade(grade: dict) -> None:
+    from sensibilidade import iterar_grade_sensibilidade
+
+    linhas = [linha for bloco in iterar_grade_sensibilidade(**grade, processos=1) for linha in bloco]
+    esperadas = len(grade["rendas"]) * len(grade["rentabilidades"]) * sum(
+        grade["idade_atual"] < idade < expectativa
+        for idade in grade["idades_aposentadoria"] for expectativa in grade["expectativas"]
+    )
+    assert len(linhas) == esperadas, f"{len(linhas)} células, esperadas {esperadas}"
+    for linha in linhas:
+        perfil = dict(
+            grade, idade_aposentadoria=linha["idade_aposentadoria"], expectativa_vida=linha["expectativa_vida"],
+            renda_mensal=linha["renda_mensal"], rentabilidade_anual=linha["rentabilidade_anual"]
+        )
+        rotulo = f"célula {(linha['idade_aposentadoria'], linha['expectativa_vida'], linha['rentabilidade_anual'])}"
+        _conferir_aporte(perfil, linha["regime"] or "progressivo", linha["aporte_mensal"], rotulo)
+        escalar = core.calcular_aporte(
+            *_argumentos(perfil), modo=perfil["modo"], valor_final_desejado=perfil["valor_final_desejado"],
+            max_aporte=perfil["max_aporte"]
+        )
+        assert (linha["aporte_mensal"], linha["regime"]) == (escalar["aporte_mensal"], escalar.get("regime")), \
+            f"{rotulo}: {linha['aporte_mensal']} ({linha['regime']}) contra calcular_aporte {escalar}"
+
+# ==== MONTE CARLO ====
+
+@propriedade("monte_carlo_sem_volatilidade", perfis_monte_carlo())
+def _monte_carlo(perfil: dict) -> None:
+    from monte_carlo import simular_monte_carlo
+
+    saldo, patrimonio, historico, _ = _simular_referencia(perfil, perfil["aporte_mensal"], perfil["regime"])
+    resultado = simular_monte_carlo(
+        *(perfil[campo] for campo in ("idade_atual", "idade_aposentadoria", "expectativa_vida", "poupanca_inicial",
+                                      "aporte_mensal", "renda_mensal", "rentabilidade_anual")),
+        volatilidade_anual=0.0, regime=perfil["regime"], modo=perfil["modo"],
+        valor_final_desejado=perfil["valor_final_desejado"], n_trajetorias=4, tamanho_lote=2, semente=0
+    )
+    escala = max([1.0, abs(saldo)] + [abs(valor) for valor in historico])
+    # A faixa do histograma com trajetórias idênticas mede menos de 1e-9 do valor.
+    tolerancia = 2 * TOLERANCIA_RELATIVA * escala
+
+    anuais = historico[::12]
+    for p, faixa in resultado.faixas.items():
+        assert len(faixa) == len(anuais), f"P{p}: {len(faixa)} faixas anuais, esperadas {len(anuais)}"
+        for i, (a, b) in enumerate(zip(anuais, faixa)):
+            assert abs(a - b) <= tolerancia, f"P{p}: faixa[{i}] {b!r} contra {a!r}"
+    for p, valor in resultado.saldo_final.items():
+        assert abs(saldo - valor) <= tolerancia, f"P{p}: saldo final {valor!r} contra {saldo!r}"
+
+    meses_aporte = (perfil["idade_aposentadoria"] - perfil["idade_atual"]) * 12
+    saques = historico[meses_aporte:]
+    if saques and min(abs(valor) for valor in saques) > tolerancia:
+        ruina = float(min(saques) < 0)
+        assert resultado.probabilidade_ruina == ruina, f"ruína {resultado.probabilidade_ruina} contra {ruina}"
+    alvo = referencia.determinar_alvo(perfil["modo"], patrimonio, perfil["valor_final_desejado"])
+    if alvo is not None and abs(saldo - alvo) > tolerancia and resultado.probabilidade_ruina in (0.0, 1.0):
+        sucesso = float(not resultado.probabilidade_ruina and saldo >= alvo)
+        assert resultado.probabilidade_sucesso == sucesso, f"sucesso {resultado.probabilidade_sucesso} contra {sucesso}"
+
+# ==== EXECUÇÃO ====
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Teste diferencial dos motores contra a referência.")
+    parser.add_argument("--exemplos", type=int, default=100, help="exemplos gerados por propriedade")
+    parser.add_argument("--filtro", default="", help="executa só propriedades cujo nome contém o texto")
+    parser.add_argument("--aleatorio", action="store_true", help="não deriva os exemplos de forma determinística")
+    args = parser.parse_args(argv)
+
+    configuracao = settings(max_examples=args.exemplos, deadline=None, database=None, derandomize=not args.aleatorio)
+    falhas = 0
+    for nome, funcao, estrategia in PROPRIEDADES:
+        if args.filtro not in nome:
+            continue
+        try:
+            configuracao(given(estrategia)(funcao))()
+        except Exception as erro:
+            falhas += 1
+            print(f"FALHA {nome}: {erro}")
+            for nota in getattr(erro, "__notes__", []):  # contraexemplo reduzido pelo Hypothesis
+                print(f"      {nota}")
+        else:
+            print(f"ok    {nome}")
+    if falhas:
+        print(f"{falhas} propriedades falharam.")
+        return 1
+    print("Motores equivalentes à referência dentro das tolerâncias.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,215 @@
+"""Confere que o motor analítico de `simular_aposentadoria` reproduz o laço mês a mês.
+
+Uso: python equivalencia.py
+
+Percorre uma grade de perfis (incluindo rentabilidade zero e negativa, aposentadoria
+imediata, após a expectativa de vida e já passada) em todos os modos de histórico e
+regimes, e compara saldo final, patrimônio na aposentadoria, histórico e IR total do
+laço mensal ("iterativo") com o motor "analitico" e com os passos trimestral e anual
+dos dois motores. A fórmula fechada e os passos maiores não somam os mesmos
+arredondamentos que o laço, então a comparação usa tolerância relativa à escala dos
+valores da simulação. Também confere que o aporte resolvido não muda mais que um
+centavo com o motor analítico ou com a solução grosseira anual, que a simulação em
+lote com argumentos 2-D repete o laço célula a célula, que a formatação monetária em
+coluna repete a formatação valor a valor, e que perfis sem fase de aportes no modo
+"manter" são diagnosticados como "sem_fase_de_aportes".
+Termina com código 1 se alguma diferença passar da tolerância.
+"""
+import itertools
+import sys
+
+from core import (
+    FUNCOES_IMPOSTO, MODOS_HISTORICO, MOTORES, PERIODOS, calcular_aporte, calcular_aporte_com_ir, comparar_cenarios,
+    ir_progressivo_saque, simular_aposentadoria
+)
+
+TOLERANCIA_RELATIVA = 1e-9
+TOLERANCIA_APORTE = 0.01
+
+IDADES = [(30, 65, 90), (45, 45, 85), (25, 60, 100), (50, 95, 90), (60, 55, 80), (40, 41, 41)]
+POUPANCAS = [0.0, 250_000.0]
+APORTES = [0.0, 3_500.0]
+RENDAS = [0.0, 12_000.0]
+RENTABILIDADES = [0.0, 0.045, 0.12, -0.02]
+IMPOSTOS = dict(FUNCOES_IMPOSTO, funcao=ir_progressivo_saque)
+# (motor, período) comparados ao laço mensal; o histórico completo só existe no passo mensal.
+VARIANTES = [("analitico", "mensal")] + [(motor, periodo) for motor in MOTORES for periodo in ("trimestral", "anual")]
+
+
+def _escala(*valores) -> float:
+    """Maior valor absoluto envolvido; serve de referência para a tolerância."""
+    return max([1.0] + [abs(valor) for valor in valores if valor is not None])
+
+
+def comparar_simulacoes() -> list:
+    falhas = []
+    for (idades, poupanca, aporte, renda, rentabilidade, (nome, imposto), modo) in itertools.product(
+        IDADES, POUPANCAS, APORTES, RENDAS, RENTABILIDADES, IMPOSTOS.items(), MODOS_HISTORICO
+    ):
+        argumentos = (*idades, poupanca, aporte, renda, rentabilidade, imposto, modo)
+        esperado = simular_aposentadoria(*argumentos, motor="iterativo")
+        historico_esperado = list(esperado[2] or [])
+        escala = _escala(poupanca, esperado[0], esperado[1], esperado[3], *historico_esperado)
+
+        for motor, periodo in VARIANTES:
+            if periodo != "mensal" and modo == "completo":
+                continue
+            rotulo = f"{nome} {modo} {motor}/{periodo} {argumentos[:7]}"
+            obtido = simular_aposentadoria(*argumentos, motor=motor, periodo=periodo)
+            historico_obtido = list(obtido[2] or [])
+            pares = [("saldo", esperado[0], obtido[0]), ("ir", esperado[3], obtido[3])]
+            if (esperado[1] is None) != (obtido[1] is None):
+                falhas.append(f"{rotulo}: patrimônio {esperado[1]} contra {obtido[1]}")
+                continue
+            if esperado[1] is not None:
+                pares.append(("patrimonio", esperado[1], obtido[1]))
+            if len(historico_esperado) != len(historico_obtido):
+                falhas.append(f"{rotulo}: histórico com tamanhos diferentes")
+                continue
+            pares += [(f"historico[{i}]", a, b) for i, (a, b) in enumerate(zip(historico_esperado, historico_obtido))]
+
+            for campo, a, b in pares:
+                if abs(a - b) > TOLERANCIA_RELATIVA * escala:
+                    falhas.append(f"{rotulo}: {campo} {a!r} contra {b!r}")
+                    break
+    return falhas
+
+
+def comparar_aportes() -> list:
+    """O aporte resolvido (arredondado ao centavo) deve ser o mesmo com os dois motores e com o passo anual."""
+    falhas = []
+    for (idade_atual, idade_aposentadoria, expectativa), modo, rentabilidade in itertools.product(
+        [(30, 65, 90), (25, 60, 100), (45, 55, 85)], ["zerar", "manter", "atingir"], [0.0, 0.045, 0.1]
+    ):
+        for nome, regime in FUNCOES_IMPOSTO.items():
+            resultados = []
+            for motor in ("iterativo", "analitico"):
+                def simular(*argumentos, motor=motor, **opcoes):
+                    return simular_aposentadoria(*argumentos, motor=motor, **opcoes)
+
+                resultados.append(_resolver_com(simular, idade_atual, idade_aposentadoria, expectativa,
+                                                50_000, 10_000, rentabilidade, modo, regime))
+            resultados.append(calcular_aporte_com_ir(
+                idade_atual, idade_aposentadoria, expectativa, 50_000, 10_000, rentabilidade, modo, regime,
+                valor_final_desejado=1_000_000, periodo="anual"
+            ).aporte_mensal)
+            a, *outros = resultados
+            for b in outros:
+                if (a is None) != (b is None) or (a is not None and abs(a - b) > TOLERANCIA_APORTE):
+                    falhas.append(f"{nome} {modo} {(idade_atual, idade_aposentadoria, expectativa, rentabilidade)}: "
+                                  f"aporte {a} contra {b}")
+    return falhas
+
+
+def _resolver_com(simular, *argumentos):
+    """Resolve o aporte trocando temporariamente a simulação usada por `core`."""
+    import core
+
+    original = core.simular_aposentadoria
+    core.simular_aposentadoria = simular
+    try:
+        resultado = calcular_aporte_com_ir(*argumentos, valor_final_desejado=1_000_000)
+    finally:
+        core.simular_aposentadoria = original
+    return resultado.aporte_mensal
+
+
+def comparar_lote_2d() -> list:
+    """`lote.simular_aposentadoria_lote` com broadcast 2-D contra o laço mensal, célula a célula."""
+    import numpy as np
+
+    from lote import simular_aposentadoria_lote
+
+    idades = np.array([[30, 40], [35, 45]])
+    rentabilidades = np.array([[0.045], [0.12]])
+    falhas = []
+    for modo_historico, passo in MODOS_HISTORICO.items():
+        saldo, patrimonio, historico, total_ir = simular_aposentadoria_lote(
+            idades, 65, 90, 250_000.0, 3_500.0, 12_000.0, rentabilidades, modo_historico=modo_historico
+        )
+        for i, j in np.ndindex(idades.shape):
+            esperado = simular_aposentadoria(
+                int(idades[i, j]), 65, 90, 250_000.0, 3_500.0, 12_000.0, float(rentabilidades[i, 0]),
+                FUNCOES_IMPOSTO["progressivo"], modo_historico, motor="iterativo"
+            )
+            pontos = [valor for valor in historico[i, j] if not np.isnan(valor)]
+            esperado = (*esperado[:2], list(esperado[2] or []), esperado[3])
+            obtido = (saldo[i, j], patrimonio[i, j], pontos, total_ir[i, j])
+            escala = _escala(esperado[0], esperado[1], *esperado[2])
+            pares = [("saldo", esperado[0], obtido[0]), ("patrimonio", esperado[1], obtido[1]),
+                     ("ir", esperado[3], obtido[3])]
+            if len(esperado[2]) != len(pontos):
+                falhas.append(f"lote 2-D {modo_historico} [{i}, {j}]: {len(pontos)} pontos, esperados {len(esperado[2])}")
+            pares += [(f"historico[{k}]", a, b) for k, (a, b) in enumerate(zip(esperado[2], pontos))]
+            falhas += [f"lote 2-D {modo_historico} [{i}, {j}] {campo}: {a} contra {b}"
+                       for campo, a, b in pares if abs(a - b) > TOLERANCIA_RELATIVA * escala]
+    return falhas
+
+
+def comparar_formatacao() -> list:
+    """`resultados.formatar_moeda_serie` contra a formatação valor a valor, inclusive em empates."""
+    import numpy as np
+
+    from resultados import formatar_moeda_serie
+
+    gerador = np.random.default_rng(0)
+    valores = np.concatenate([
+        [0.0, -0.0, -0.4, 0.5, 2.5, 999.5, 999_999.5, 1e15, 1e20, 2.675, 1.005, np.nan, np.inf, -np.inf],
+        gerador.normal(0, 1e6, 20_000),
+        gerador.integers(-10**6, 10**6, 20_000) / 1000 + 0.0005,  # empates em todas as casas
+    ])
+    falhas = []
+    for decimais in range(4):
+        obtido = formatar_moeda_serie(valores, decimais)
+        for valor, texto in zip(valores, obtido):
+            esperado = "R$ " + f"{valor:,.{decimais}f}".replace(",", "X").replace(".", ",").replace("X", ".")
+            if texto != esperado:
+                falhas.append(f"formatar_moeda_serie({valor!r}, {decimais}): {texto!r} contra {esperado!r}")
+    return falhas
+
+
+def conferir_sem_fase_de_aportes() -> list:
+    """No modo "manter", aposentadoria imediata ou após a expectativa não tem alvo nem aporte."""
+    falhas = []
+    perfis = [(45, 45, 85), (50, 95, 90), (60, 55, 80)]
+    for (idade_atual, idade_aposentadoria, expectativa), periodo in itertools.product(perfis, PERIODOS):
+        for metodo in ("direto", "bissecao"):
+            for nome, regime in FUNCOES_IMPOSTO.items():
+                resultado = calcular_aporte_com_ir(
+                    idade_atual, idade_aposentadoria, expectativa, 250_000, 10_000, 0.045, "manter", regime,
+                    metodo=metodo, periodo=periodo
+                )
+                if resultado.motivo != "sem_fase_de_aportes" or resultado.aporte_mensal is not None:
+                    falhas.append(f"{nome} {metodo} {periodo} {(idade_atual, idade_aposentadoria, expectativa)}: "
+                                  f"motivo {resultado.motivo}, aporte {resultado.aporte_mensal}")
+        resultado = calcular_aporte(idade_atual, idade_aposentadoria, expectativa, 250_000, 10_000, 0.045, "manter",
+                                    periodo=periodo)
+        if resultado["motivo"] != "sem_fase_de_aportes":
+            falhas.append(f"calcular_aporte {periodo} {(idade_atual, idade_aposentadoria, expectativa)}: "
+                          f"motivo {resultado['motivo']}")
+    linhas = comparar_cenarios([
+        {"idade_atual": idade_atual, "idade_aposentadoria": idade_aposentadoria, "expectativa_vida": expectativa,
+         "poupanca_inicial": 250_000, "renda_mensal": 10_000, "rentabilidade_anual": 0.045}
+        for idade_atual, idade_aposentadoria, expectativa in perfis
+    ])
+    falhas += [f"comparar_cenarios {linha['nome']}: motivo {linha['motivo']}"
+               for linha in linhas if linha["motivo"] != "sem_fase_de_aportes"]
+    return falhas
+
+
+def main() -> int:
+    falhas = (
+        comparar_simulacoes() + comparar_aportes() + comparar_lote_2d() + comparar_formatacao()
+        + conferir_sem_fase_de_aportes()
+    )
+    for falha in falhas[:20]:
+        print(f"DIVERGÊNCIA {falha}")
+    if falhas:
+        print(f"{len(falhas)} divergências acima da tolerância.")
+        return 1
+    print("Motores e períodos equivalentes ao laço mensal dentro da tolerância.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,254 @@
+"""Recalcula em lote o aporte necessário de uma carteira de clientes (CSV ou JSONL).
+
+Uso: python executar_lote.py clientes.csv resultados.jsonl --processos 8
+
+Cada registro precisa de idade_atual, idade_aposentadoria, expectativa_vida,
+poupanca_inicial, renda_mensal e rentabilidade_anual; modo, valor_final_desejado,
+max_aporte, periodo (passo da solução grosseira: mensal, trimestral ou anual) e id são
+opcionais. Os resultados são gravados na ordem da entrada, bloco a
+bloco, e um arquivo de checkpoint permite retomar a execução após uma interrupção; ele
+guarda a identificação da entrada (caminho, tamanho e data de modificação) e é
+apagado quando a execução termina.
+"""
+import argparse
+import csv
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Callable, Iterator, List, Optional
+
+from core import calcular_aporte
+
+logger = logging.getLogger(__name__)
+
+CAMPOS_SAIDA = ["id", "aporte_mensal", "regime", "patrimonio_aposentadoria", "total_ir", "erro"]
+
+# ==== LEITURA ====
+
+def ler_registros(caminho: str, formato: Optional[str] = None) -> Iterator[dict]:
+    """Lê os registros um a um, sem carregar o arquivo inteiro."""
+    formato = formato or ("jsonl" if caminho.endswith((".jsonl", ".json")) else "csv")
+    with open(caminho, encoding="utf-8", newline="") as arquivo:
+        if formato == "csv":
+            yield from csv.DictReader(arquivo)
+        elif formato == "jsonl":
+            for linha in arquivo:
+                if linha.strip():
+                    yield json.loads(linha)
+        else:
+            raise ValueError("Formato inválido. Use 'csv' ou 'jsonl'.")
+
+# ==== PROCESSAMENTO ====
+
+def _opcional(valor) -> Optional[float]:
+    return None if valor in (None, "") else float(valor)
+
+
+def processar_registro(registro: dict, indice: int) -> dict:
+    """Calcula o aporte de um cliente; erros de dados viram uma linha com `erro`."""
+    identificador = registro.get("id") or indice
+    try:
+        max_aporte = _opcional(registro.get("max_aporte"))
+        resultado = calcular_aporte(
+            int(registro["idade_atual"]),
+            int(registro["idade_aposentadoria"]),
+            int(registro["expectativa_vida"]),
+            float(registro["poupanca_inicial"]),
+            float(registro["renda_mensal"]),
+            float(registro["rentabilidade_anual"]),
+            modo=registro.get("modo") or "manter",
+            valor_final_desejado=_opcional(registro.get("valor_final_desejado")),
+            max_aporte=100_000 if max_aporte is None else max_aporte,
+            periodo=registro.get("periodo") or "mensal",
+        )
+    except (KeyError, TypeError, ValueError, ArithmeticError) as erro:
+        return {"id": identificador, "erro": f"{type(erro).__name__}: {erro}"}
+    return {
+        "id": identificador,
+        "aporte_mensal": resultado["aporte_mensal"],
+        "regime": resultado.get("regime"),
+        "patrimonio_aposentadoria": resultado.get("patrimonio_aposentadoria"),
+        "total_ir": resultado.get("total_ir"),
+    }
+
+
+def _processar_bloco(bloco: List[tuple]) -> List[dict]:
+    return [processar_registro(registro, indice) for indice, registro in bloco]
+
+# ==== CHECKPOINT ====
+
+def impressao_entrada(caminho: str) -> dict:
+    """Identifica a versão do arquivo de entrada (caminho, tamanho e modificação)."""
+    estado = os.stat(caminho)
+    return {"caminho": os.path.abspath(caminho), "tamanho": estado.st_size, "modificado_em": estado.st_mtime_ns}
+
+
+def ler_checkpoint(caminho: str) -> dict:
+    try:
+        with open(caminho, encoding="utf-8") as arquivo:
+            return json.load(arquivo)
+    except (OSError, ValueError):
+        return {"registros": 0, "bytes": 0, "entrada": None}
+
+
+def gravar_checkpoint(caminho: str, registros: int, posicao: int, entrada: dict) -> None:
+    """Grava de forma atômica quantos registros (e bytes de saída) já estão concluídos."""
+    temporario = caminho + ".tmp"
+    with open(temporario, "w", encoding="utf-8") as arquivo:
+        json.dump({"registros": registros, "bytes": posicao, "entrada": entrada}, arquivo)
+    os.replace(temporario, caminho)
+
+# ==== ESCRITA ====
+
+class Escritor:
+    """Grava resultados em JSONL ou CSV, sempre com flush ao fim de cada bloco."""
+
+    def __init__(self, caminho: str, posicao: int):
+        self.formato = "csv" if caminho.endswith(".csv") else "jsonl"
+        self.arquivo = open(caminho, "a+", encoding="utf-8", newline="")
+        # Descarta o que foi escrito depois do último checkpoint.
+        self.arquivo.truncate(posicao)
+        self.arquivo.seek(posicao)
+        self.csv = csv.DictWriter(self.arquivo, fieldnames=CAMPOS_SAIDA) if self.formato == "csv" else None
+        if self.csv is not None and posicao == 0:
+            self.csv.writeheader()
+
+    def escrever(self, resultados: List[dict]) -> int:
+        for resultado in resultados:
+            if self.csv is not None:
+                self.csv.writerow(resultado)
+            else:
+                self.arquivo.write(json.dumps(resultado, ensure_ascii=False) + "\n")
+        self.arquivo.flush()
+        os.fsync(self.arquivo.fileno())
+        return self.arquivo.tell()
+
+    def fechar(self) -> None:
+        self.arquivo.close()
+
+# ==== EXECUÇÃO ====
+
+def _blocos(registros: Iterator[dict], inicio: int, tamanho: int) -> Iterator[List[tuple]]:
+    numerados = enumerate(registros, start=1)
+    for _ in islice(numerados, inicio):
+        pass
+    while True:
+        bloco = list(islice(numerados, tamanho))
+        if not bloco:
+            return
+        yield bloco
+
+
+def executar(
+    entrada: str,
+    saida: str,
+    processos: int = 1,
+    tamanho_bloco: int = 200,
+    checkpoint: Optional[str] = None,
+    formato_entrada: Optional[str] = None,
+    intervalo_relatorio: float = 5.0,
+    ao_concluir: Optional[Callable[[int], None]] = None,
+    inicio_processos: Optional[str] = None
+) -> dict:
+    """Processa a carteira e retorna estatísticas da execução.
+
+    No máximo `processos * 2` blocos ficam em voo ao mesmo tempo e os resultados são
+    gravados na ordem da entrada, então a memória não cresce com o tamanho da carteira.
+    `ao_concluir`, se dado, recebe o total de registros concluídos após cada bloco
+    gravado; uma exceção levantada por ele interrompe a execução, que pode ser
+    retomada pelo checkpoint. `inicio_processos` escolhe o método de início do pool
+    ("spawn", "forkserver"); None usa o padrão da plataforma.
+    """
+    checkpoint = checkpoint or saida + ".checkpoint"
+    impressao = impressao_entrada(entrada)
+    estado = ler_checkpoint(checkpoint)
+    concluidos, posicao = estado["registros"], estado["bytes"]
+    if concluidos and estado.get("entrada") != impressao:
+        raise ValueError(f"Checkpoint {checkpoint} foi gravado para outra versão de {entrada}; apague-o para recomeçar.")
+    tamanho_saida = os.path.getsize(saida) if os.path.exists(saida) else 0
+    if tamanho_saida < posicao:
+        raise ValueError(f"Checkpoint {checkpoint} não corresponde a {saida}; apague-o para recomeçar.")
+    if concluidos:
+        logger.info("Retomando após %s registros.", concluidos)
+
+    escritor = Escritor(saida, posicao)
+    blocos = _blocos(ler_registros(entrada, formato_entrada), concluidos, tamanho_bloco)
+    inicio = ultimo_relatorio = time.perf_counter()
+    processados = 0
+
+    def concluir(tamanho: int, resultados: List[dict]) -> None:
+        nonlocal concluidos, processados, posicao, ultimo_relatorio
+        posicao = escritor.escrever(resultados)
+        concluidos += tamanho
+        processados += tamanho
+        gravar_checkpoint(checkpoint, concluidos, posicao, impressao)
+        if ao_concluir is not None:
+            ao_concluir(concluidos)
+
+        agora = time.perf_counter()
+        if agora - ultimo_relatorio >= intervalo_relatorio:
+            ultimo_relatorio = agora
+            logger.info("%s registros | %.1f perfis/s", concluidos, processados / (agora - inicio))
+
+    contexto = multiprocessing.get_context(inicio_processos) if inicio_processos else None
+    executor = ProcessPoolExecutor(max_workers=processos, mp_context=contexto) if processos > 1 else None
+    try:
+        em_voo = deque()
+        for bloco in blocos:
+            if executor is None:
+                concluir(len(bloco), _processar_bloco(bloco))
+                continue
+            em_voo.append((len(bloco), executor.submit(_processar_bloco, bloco)))
+            if len(em_voo) >= processos * 2:
+                tamanho, futuro = em_voo.popleft()
+                concluir(tamanho, futuro.result())
+        while em_voo:
+            tamanho, futuro = em_voo.popleft()
+            concluir(tamanho, futuro.result())
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+        escritor.fechar()
+    # Execução completa: um checkpoint deixado para trás faria a próxima execução
+    # com a mesma saída pular a carteira inteira.
+    if os.path.exists(checkpoint):
+        os.remove(checkpoint)
+
+    duracao = time.perf_counter() - inicio
+    return {
+        "processados": processados,
+        "total": concluidos,
+        "segundos": duracao,
+        "perfis_por_segundo": processados / duracao if duracao > 0 else 0.0,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Recalcula o aporte necessário de uma carteira de clientes.")
+    parser.add_argument("entrada", help="arquivo CSV ou JSONL com um cliente por registro")
+    parser.add_argument("saida", help="arquivo de resultados (.jsonl ou .csv)")
+    parser.add_argument("--processos", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--tamanho-bloco", type=int, default=200)
+    parser.add_argument("--checkpoint", help="arquivo de checkpoint (padrão: <saida>.checkpoint)")
+    parser.add_argument("--formato-entrada", choices=["csv", "jsonl"])
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s", stream=sys.stderr)
+
+    estatisticas = executar(
+        args.entrada, args.saida, args.processos, args.tamanho_bloco, args.checkpoint, args.formato_entrada
+    )
+    print(
+        f"{estatisticas['processados']} perfis em {estatisticas['segundos']:.1f}s "
+        f"({estatisticas['perfis_por_segundo']:.1f} perfis/s); total concluído: {estatisticas['total']}.",
+        file=sys.stderr,
+    )
+
+
+if __name__ == "__main__":
+    main()
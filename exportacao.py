@@ -0,0 +1,164 @@
+import csv
+from io import BytesIO, TextIOWrapper
+from typing import Dict, Iterator, Sequence, Union
+
+import xlsxwriter
+
+from instrumentacao import cronometrado
+
+Destino = Union[str, BytesIO, None]
+
+FORMATO_MOEDA = {"num_format": "R$ #,##0"}
+FORMATO_PERCENTUAL = {"num_format": "0%"}
+FORMATO_CABECALHO = {"bold": True, "bg_color": "#123934", "font_color": "white"}
+
+# ==== UTILITÁRIOS ====
+
+def _lista(coluna: Sequence) -> list:
+    """Converte arrays NumPy/pandas em listas de tipos nativos aceitos pelo xlsxwriter."""
+    return coluna.tolist() if hasattr(coluna, "tolist") else list(coluna)
+
+
+def _fatias(coluna: Sequence, tamanho: int) -> Iterator[list]:
+    for inicio in range(0, len(coluna), tamanho):
+        yield _lista(coluna[inicio:inicio + tamanho])
+
+
+def _abrir_destino(destino: Destino):
+    return BytesIO() if destino is None else destino
+
+
+def _finalizar(destino):
+    if isinstance(destino, BytesIO):
+        destino.seek(0)
+    return destino
+
+
+def escrever_colunas(
+    planilha, linha_inicial: int, colunas: Sequence[Sequence], formatos: Sequence = (), tamanho_fatia: int = 10_000
+) -> int:
+    """Escreve colunas paralelas a partir de `linha_inicial`, linha a linha.
+
+    No modo `constant_memory` o xlsxwriter descarta cada linha ao avançar para a
+    seguinte, então a escrita em bloco é feita com `write_row` em ordem crescente de
+    linha (`write_column` só funcionaria com a planilha inteira em memória). As
+    colunas são convertidas em fatias de `tamanho_fatia` linhas. Retorna a próxima
+    linha livre.
+    """
+    formatos = list(formatos) + [None] * (len(colunas) - len(formatos))
+    linha = linha_inicial
+    for fatia in zip(*(_fatias(coluna, tamanho_fatia) for coluna in colunas)):
+        if not any(formatos):
+            for valores in zip(*fatia):
+                planilha.write_row(linha, 0, valores)
+                linha += 1
+            continue
+        for valores in zip(*fatia):
+            for coluna, (valor, formato) in enumerate(zip(valores, formatos)):
+                planilha.write(linha, coluna, valor, formato)
+            linha += 1
+    return linha
+
+# ==== EXCEL DA SIMULAÇÃO ====
+
+@cronometrado()
+def gerar_excel(
+    idades: Sequence,
+    montantes: Sequence,
+    aporte_int: int,
+    patrimonio_final: float,
+    anos_aporte: int,
+    percentual: float,
+    regime: str,
+    percentual_ir_efetivo: float,
+    parametros: dict,
+    destino: Destino = None
+):
+    """Gera a planilha da simulação (resumo, evolução do patrimônio e parâmetros).
+
+    Usa o modo `constant_memory` do xlsxwriter, então o consumo de memória não cresce
+    com o número de linhas. Sem `destino` a planilha é montada em um `BytesIO`; com um
+    caminho, é gravada direto no arquivo (útil para históricos mensais grandes).
+    """
+    destino = _abrir_destino(destino)
+    workbook = xlsxwriter.Workbook(destino, {"constant_memory": True})
+    money = workbook.add_format(FORMATO_MOEDA)
+    percent_fmt = workbook.add_format(FORMATO_PERCENTUAL)
+    header_format = workbook.add_format(FORMATO_CABECALHO)
+
+    ws1 = workbook.add_worksheet("Simulação")
+    ws1.set_column("A:Z", 22)
+    ws1.write_row("B2", ["💰 Aporte mensal", "🏦 Poupança necessária", "📆 Anos de aportes",
+                         "📊 % da renda atual", "🧾 Tributação", "📉 Carga efetiva IR"])
+    ws1.write("B3", aporte_int, money)
+    ws1.write("C3", patrimonio_final, money)
+    ws1.write("D3", anos_aporte)
+    ws1.write("E3", percentual / 100, percent_fmt)
+    ws1.write("F3", f"Tabela {regime.capitalize()}")
+    ws1.write("G3", percentual_ir_efetivo, percent_fmt)
+
+    ws1.write_row("A6", ["Idade", "Patrimônio"], header_format)
+    escrever_colunas(ws1, 6, [idades, montantes], [None, money])
+
+    ws2 = workbook.add_worksheet("Parametros")
+    ws2.set_column("A:B", 30)
+    escrever_colunas(ws2, 0, [list(parametros.keys()), list(parametros.values())])
+
+    workbook.close()
+    return _finalizar(destino)
+
+# ==== TABELAS GENÉRICAS ====
+
+def exportar_tabela(
+    colunas: Dict[str, Sequence],
+    destino: Destino = None,
+    formato: str = "xlsx",
+    nome_planilha: str = "Dados"
+):
+    """Exporta colunas paralelas em xlsx, csv ou parquet sem montar um DataFrame intermediário.
+
+    xlsx e csv são escritos em fluxo; parquet depende do pandas com pyarrow (ou
+    fastparquet) instalado.
+    """
+    if formato == "xlsx":
+        return exportar_planilhas({nome_planilha: colunas}, destino)
+
+    if formato == "csv":
+        if destino is None or isinstance(destino, BytesIO):
+            saida = _abrir_destino(destino)
+            texto = TextIOWrapper(saida, encoding="utf-8", newline="")
+            _escrever_csv(texto, colunas)
+            texto.detach()
+            return _finalizar(saida)
+        with open(destino, "w", encoding="utf-8", newline="") as arquivo:
+            _escrever_csv(arquivo, colunas)
+        return destino
+
+    if formato == "parquet":
+        import pandas as pd
+
+        destino = _abrir_destino(destino)
+        pd.DataFrame(dict(colunas)).to_parquet(destino, index=False)
+        return _finalizar(destino)
+
+    raise ValueError("Formato inválido. Use 'xlsx', 'csv' ou 'parquet'.")
+
+
+def exportar_planilhas(abas: Dict[str, Dict[str, Sequence]], destino: Destino = None):
+    """Exporta várias tabelas de colunas paralelas num único xlsx, uma por aba, em fluxo."""
+    destino = _abrir_destino(destino)
+    workbook = xlsxwriter.Workbook(destino, {"constant_memory": True})
+    cabecalho = workbook.add_format(FORMATO_CABECALHO)
+    for nome, colunas in abas.items():
+        planilha = workbook.add_worksheet(nome)
+        planilha.write_row(0, 0, list(colunas.keys()), cabecalho)
+        escrever_colunas(planilha, 1, list(colunas.values()))
+    workbook.close()
+    return _finalizar(destino)
+
+
+def _escrever_csv(arquivo, colunas: Dict[str, Sequence], tamanho_fatia: int = 10_000) -> None:
+    escritor = csv.writer(arquivo)
+    escritor.writerow(colunas.keys())
+    for fatia in zip(*(_fatias(valores, tamanho_fatia) for valores in colunas.values())):
+        escritor.writerows(zip(*fatia))
@@ -0,0 +1,207 @@
+"""Medições de tempo e contadores dos caminhos críticos.
+
+Spans (`medir`, `cronometrado`) e contadores (`contar`) são acumulados em dois
+lugares: na requisição ativa, se houver uma (`iniciar_requisicao`), e nas métricas
+agregadas do processo, exportáveis no formato texto do Prometheus. Ao encerrar, a
+requisição é registrada como uma linha JSON no logger `instrumentacao` e, se
+`INSTRUMENTACAO_LOG` apontar para um arquivo, também nele.
+"""
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+ARQUIVO_LOG = os.environ.get("INSTRUMENTACAO_LOG")
+PREFIXO_METRICAS = "calculadora"
+
+# ==== MÉTRICAS DO PROCESSO ====
+
+class Metricas:
+    """Totais de spans (contagem, soma e máximo em segundos) e de contadores, seguros entre threads."""
+
+    def __init__(self):
+        self._spans: Dict[str, List[float]] = {}
+        self._contadores: Dict[str, int] = {}
+        self._trava = threading.Lock()
+
+    def registrar_span(self, nome: str, segundos: float) -> None:
+        with self._trava:
+            total = self._spans.setdefault(nome, [0, 0.0, 0.0])
+            total[0] += 1
+            total[1] += segundos
+            total[2] = max(total[2], segundos)
+
+    def incrementar(self, nome: str, quantidade: int = 1) -> None:
+        with self._trava:
+            self._contadores[nome] = self._contadores.get(nome, 0) + quantidade
+
+    def instantaneo(self) -> dict:
+        """Cópia dos totais: {"spans": {nome: {contagem, soma_s, maximo_s}}, "contadores": {...}}."""
+        with self._trava:
+            return {
+                "spans": {
+                    nome: {"contagem": contagem, "soma_s": soma, "maximo_s": maximo}
+                    for nome, (contagem, soma, maximo) in self._spans.items()
+                },
+                "contadores": dict(self._contadores),
+            }
+
+    def limpar(self) -> None:
+        with self._trava:
+            self._spans.clear()
+            self._contadores.clear()
+
+    def exportar_prometheus(self) -> str:
+        """Métricas no formato texto de exposição do Prometheus."""
+        dados = self.instantaneo()
+        linhas = [
+            f"# HELP {PREFIXO_METRICAS}_span_segundos Duração dos trechos instrumentados.",
+            f"# TYPE {PREFIXO_METRICAS}_span_segundos summary",
+        ]
+        for nome, span in sorted(dados["spans"].items()):
+            linhas.append(f'{PREFIXO_METRICAS}_span_segundos_count{{span="{nome}"}} {span["contagem"]}')
+            linhas.append(f'{PREFIXO_METRICAS}_span_segundos_sum{{span="{nome}"}} {span["soma_s"]:.6f}')
+        for nome, valor in sorted(dados["contadores"].items()):
+            linhas.append(f"# TYPE {PREFIXO_METRICAS}_{nome}_total counter")
+            linhas.append(f"{PREFIXO_METRICAS}_{nome}_total {valor}")
+        return "\n".join(linhas) + "\n"
+
+
+METRICAS = Metricas()
+
+# ==== REQUISIÇÃO ATIVA ====
+
+@dataclass
+class Requisicao:
+    """Spans e contadores de uma execução (por exemplo, um rerun do Streamlit)."""
+    nome: str
+    inicio: float = field(default_factory=time.time)
+    spans: List[Tuple[str, float]] = field(default_factory=list)
+    contadores: Dict[str, int] = field(default_factory=dict)
+    duracao: Optional[float] = None
+
+    def resumo(self) -> dict:
+        return {
+            "requisicao": self.nome,
+            "inicio": self.inicio,
+            "duracao_s": self.duracao,
+            "spans": [{"nome": nome, "segundos": segundos} for nome, segundos in self.spans],
+            "contadores": dict(self.contadores),
+        }
+
+
+_requisicao_atual: ContextVar[Optional[Requisicao]] = ContextVar("requisicao_atual", default=None)
+
+
+def requisicao_atual() -> Optional[Requisicao]:
+    return _requisicao_atual.get()
+
+
+def iniciar_requisicao(nome: str) -> Requisicao:
+    """Passa a acumular spans e contadores do contexto atual numa nova requisição."""
+    requisicao = Requisicao(nome)
+    _requisicao_atual.set(requisicao)
+    return requisicao
+
+
+def encerrar_requisicao(requisicao: Requisicao) -> dict:
+    """Fecha a requisição, registra o resumo em JSON e o retorna."""
+    if _requisicao_atual.get() is requisicao:
+        _requisicao_atual.set(None)
+    requisicao.duracao = time.time() - requisicao.inicio
+    resumo = requisicao.resumo()
+    linha = json.dumps(resumo, ensure_ascii=False)
+    logger.info(linha)
+    if ARQUIVO_LOG:
+        try:
+            with open(ARQUIVO_LOG, "a", encoding="utf-8") as arquivo:
+                arquivo.write(linha + "\n")
+        except OSError as erro:
+            logger.warning("Não foi possível gravar o log de instrumentação em %s: %s", ARQUIVO_LOG, erro)
+    return resumo
+
+
+@contextmanager
+def requisicao(nome: str):
+    """Bloco `with` equivalente a `iniciar_requisicao` + `encerrar_requisicao`."""
+    atual = iniciar_requisicao(nome)
+    try:
+        yield atual
+    finally:
+        encerrar_requisicao(atual)
+
+# ==== SPANS E CONTADORES ====
+
+def contar(nome: str, quantidade: int = 1) -> None:
+    """Soma `quantidade` ao contador na requisição ativa e no processo."""
+    atual = _requisicao_atual.get()
+    if atual is not None:
+        atual.contadores[nome] = atual.contadores.get(nome, 0) + quantidade
+    METRICAS.incrementar(nome, quantidade)
+
+
+@contextmanager
+def medir(nome: str):
+    """Mede o tempo do bloco como um span chamado `nome`."""
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        segundos = time.perf_counter() - inicio
+        atual = _requisicao_atual.get()
+        if atual is not None:
+            atual.spans.append((nome, segundos))
+        METRICAS.registrar_span(nome, segundos)
+
+
+def cronometrado(nome: Optional[str] = None) -> Callable:
+    """Decorador que mede cada chamada da função como um span (padrão: o nome da função)."""
+    def decorar(funcao):
+        rotulo = nome or funcao.__name__
+
+        @functools.wraps(funcao)
+        def medida(*args, **kwargs):
+            with medir(rotulo):
+                return funcao(*args, **kwargs)
+        return medida
+    return decorar
+
+# ==== ENDPOINT HTTP ====
+
+_servidor: Optional[ThreadingHTTPServer] = None
+_trava_servidor = threading.Lock()
+
+
+class _TratadorMetricas(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip("/") not in ("", "/metrics"):
+            self.send_error(404)
+            return
+        corpo = METRICAS.exportar_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def log_message(self, *args):
+        pass
+
+
+def servir_metricas(porta: int = 9464, endereco: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """Publica `/metrics` numa thread de fundo; chamadas repetidas reaproveitam o servidor."""
+    global _servidor
+    with _trava_servidor:
+        if _servidor is None:
+            _servidor = ThreadingHTTPServer((endereco, porta), _TratadorMetricas)
+            threading.Thread(target=_servidor.serve_forever, name="metricas", daemon=True).start()
+        return _servidor
@@ -0,0 +1,458 @@
+"""Conferências de integração dos componentes com estado, sem rede.
+
+Uso:
+    python integracao.py                  # todas as conferências
+    python integracao.py --filtro dados   # só as conferências cujo nome contém "dados"
+
+- dados_*: `dados_mercado.buscar_series` com um transporte falso e cache em diretório
+  temporário. A busca incremental só consulta os trechos que faltam (o início anterior
+  ao já consultado e a cauda expirada); sem rede, a série é servida do cache sem
+  erro; pontos novos são mesclados aos gravados em disco sem perder os antigos.
+- cache_*: `cache.CacheLRU` com relógio falso. O item usado há mais tempo é o
+  descartado ao exceder o limite, um item vale até `ttl` inclusive e é removido ao
+  expirar, e `calcular_aporte_cacheado` reaproveita entradas iguais ao centavo sem que
+  alterações do chamador contaminem o cache.
+- lote_*: `executar_lote.executar` interrompida por `ao_concluir`. A retomada pelo
+  checkpoint descarta o que foi escrito após ele e produz a mesma saída de uma
+  execução sem interrupção; um checkpoint de outra versão da entrada, ou maior que a
+  saída, é recusado.
+- fila_*: `tarefas.FilaTarefas` num banco temporário, com um tipo de tarefa de
+  conferência. O cancelamento é atendido entre etapas (e antes de começar, se a
+  tarefa ainda está pendente); ao abrir o banco, só as tarefas de filas encerradas
+  ou de processos mortos são dadas como interrompidas, e as terminadas há mais de
+  `retencao` são apagadas.
+
+Termina com código 1 se alguma conferência falhar.
+"""
+import argparse
+import json
+import logging
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date
+from typing import Callable, Dict, Iterator, List, Tuple
+
+from cache import CacheLRU, calcular_aporte_cacheado
+from dados_mercado import CacheSeries, buscar_series
+from executar_lote import executar, impressao_entrada, ler_checkpoint
+from tarefas import (
+    CANCELADA, CONCLUIDA, EXECUTANDO, FALHOU, MENSAGEM_CANCELAMENTO, PENDENTE, FilaTarefas, tipo_tarefa
+)
+
+CONFERENCIAS: List[Tuple[str, Callable[[str], None]]] = []
+
+
+@contextmanager
+def _avisos(modulo: str) -> Iterator[List[str]]:
+    """Recolhe (em vez de imprimir) as mensagens de nível INFO ou acima do logger do módulo."""
+    mensagens: List[str] = []
+    coletor = logging.Handler()
+    coletor.emit = lambda registro: mensagens.append(registro.getMessage())
+    logger = logging.getLogger(modulo)
+    nivel = logger.level
+    logger.addHandler(coletor)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    try:
+        yield mensagens
+    finally:
+        logger.removeHandler(coletor)
+        logger.setLevel(nivel)
+        logger.propagate = True
+
+
+def conferencia(nome: str):
+    """Registra uma conferência; ela recebe um diretório temporário exclusivo."""
+    def registrar(funcao):
+        CONFERENCIAS.append((nome, funcao))
+        return funcao
+    return registrar
+
+# ==== DADOS DE MERCADO ====
+
+class TransporteFalso:
+    """Serve pontos mensais fixos no formato da API SGS e registra cada consulta."""
+
+    def __init__(self, series: dict):
+        self.series = series
+        self.consultas = []
+        self.offline = False
+
+    def obter_json(self, url: str, parametros: dict, timeout: float):
+        codigo = int(url.split("bcdata.sgs.")[1].split("/")[0])
+        inicio = date(*reversed([int(parte) for parte in parametros["dataInicial"].split("/")]))
+        fim = date(*reversed([int(parte) for parte in parametros["dataFinal"].split("/")]))
+        self.consultas.append((codigo, inicio, fim))
+        if self.offline:
+            raise ConnectionError("sem rede")
+        return [
+            {"data": dia.strftime("%d/%m/%Y"), "valor": str(valor).replace(".", ",")}
+            for dia, valor in sorted(self.series[codigo].items())
+            if inicio <= dia <= fim
+        ]
+
+
+def _serie_mensal(ano: int, valor: float) -> dict:
+    return {date(ano, mes, 1): round(valor + mes / 100, 2) for mes in range(1, 13)}
+
+
+@conferencia("dados_busca_incremental")
+def _dados_busca_incremental(diretorio: str) -> None:
+    transporte = TransporteFalso({433: {**_serie_mensal(2023, 0.3), **_serie_mensal(2024, 0.4)}})
+    cache = CacheSeries(diretorio)
+
+    serie = buscar_series([433], date(2024, 1, 1), date(2024, 6, 30), transporte, cache)[433]
+    assert transporte.consultas == [(433, date(2024, 1, 1), date(2024, 6, 30))], transporte.consultas
+    assert len(serie) == 6, serie
+
+    transporte.consultas.clear()
+    buscar_series([433], date(2024, 1, 1), date(2024, 6, 30), transporte, cache)
+    assert transporte.consultas == [], f"intervalo já consultado gerou {transporte.consultas}"
+
+    # Só o início anterior ao já consultado; a cauda ainda está dentro da validade.
+    serie = buscar_series([433], date(2023, 7, 1), date(2024, 12, 31), transporte, cache)[433]
+    assert transporte.consultas == [(433, date(2023, 7, 1), date(2023, 12, 31))], transporte.consultas
+    assert len(serie) == 12, serie
+
+    # Com a validade expirada, a cauda é consultada a partir do último ponto recebido.
+    transporte.consultas.clear()
+    serie = buscar_series([433], date(2023, 7, 1), date(2024, 12, 31), transporte, cache, validade=0)[433]
+    assert transporte.consultas == [(433, date(2024, 6, 2), date(2024, 12, 31))], transporte.consultas
+    assert len(serie) == 18, serie
+
+
+@conferencia("dados_sem_rede")
+def _dados_sem_rede(diretorio: str) -> None:
+    transporte = TransporteFalso({433: _serie_mensal(2024, 0.4), 4390: _serie_mensal(2024, 0.9)})
+    cache = CacheSeries(diretorio)
+    esperado = buscar_series([433, 4390], date(2024, 1, 1), date(2024, 12, 31), transporte, cache)
+    gravado = cache.carregar(433)
+
+    transporte.offline = True
+    transporte.consultas.clear()
+    with _avisos("dados_mercado") as avisos:
+        obtido = buscar_series([433, 4390], date(2023, 1, 1), date(2024, 12, 31), transporte, cache, validade=0)
+        vazio = buscar_series([11], date(2024, 1, 1), date(2024, 12, 31), transporte, CacheSeries(os.path.join(diretorio, "vazio")))
+    assert len(avisos) == len(transporte.consultas) == 5, (avisos, transporte.consultas)
+    assert obtido == esperado, "sem rede, a série deve vir do cache"
+    assert cache.carregar(433) == gravado, "consulta que falhou não pode alterar o cache"
+    assert vazio == {11: {}}, vazio
+
+
+@conferencia("dados_mescla_cache")
+def _dados_mescla_cache(diretorio: str) -> None:
+    cache = CacheSeries(diretorio)
+    cache.salvar(433, {
+        "pontos": {"2024-01-01": 0.42, "2024-02-01": 0.83},
+        "inicio": "2024-01-01", "fim": "2024-02-01", "consultado_em": 0,
+    })
+    transporte = TransporteFalso({433: {date(2024, 2, 1): 9.99, date(2024, 3, 1): 0.16, date(2024, 4, 1): 0.38}})
+
+    serie = buscar_series([433], date(2024, 1, 1), date(2024, 4, 30), transporte, cache)[433]
+    assert transporte.consultas == [(433, date(2024, 2, 2), date(2024, 4, 30))], transporte.consultas
+    assert serie == {date(2024, 1, 1): 0.42, date(2024, 2, 1): 0.83, date(2024, 3, 1): 0.16, date(2024, 4, 1): 0.38}, serie
+
+    gravado = CacheSeries(diretorio).carregar(433)
+    assert sorted(gravado["pontos"]) == ["2024-01-01", "2024-02-01", "2024-03-01", "2024-04-01"], gravado
+    assert (gravado["inicio"], gravado["fim"]) == ("2024-01-01", "2024-04-01"), gravado
+    assert gravado["consultado_em"] > 0, gravado
+    assert not [nome for nome in os.listdir(diretorio) if nome.endswith(".tmp")], "temporário deixado no diretório"
+
+# ==== CACHE DE RESULTADOS ====
+
+class RelogioFalso:
+    """Relógio controlado pela conferência, no lugar de `time.monotonic`."""
+
+    def __init__(self):
+        self.agora = 0.0
+
+    def __call__(self) -> float:
+        return self.agora
+
+
+@conferencia("cache_descarte_lru")
+def _cache_descarte_lru(diretorio: str) -> None:
+    cache = CacheLRU(max_itens=2, relogio=RelogioFalso())
+    cache.guardar("a", 1)
+    cache.guardar("b", 2)
+    assert cache.obter("a") == (True, 1)
+    cache.guardar("c", 3)  # "b" é o usado há mais tempo
+    assert cache.obter("b") == (False, None), "o item usado há mais tempo deveria ter saído"
+    assert cache.obter("a") == (True, 1) and cache.obter("c") == (True, 3)
+
+    cache.guardar("a", 10)  # regravar também conta como uso
+    cache.guardar("d", 4)
+    assert cache.obter("c") == (False, None), "o item usado há mais tempo deveria ter saído"
+    assert cache.obter("a") == (True, 10) and len(cache) == 2
+
+    estatisticas = cache.estatisticas()
+    assert (estatisticas["acertos"], estatisticas["falhas"], estatisticas["itens"]) == (4, 2, 2), estatisticas
+    cache.limpar()
+    assert len(cache) == 0 and cache.estatisticas()["acertos"] == 0
+
+
+@conferencia("cache_validade")
+def _cache_validade(diretorio: str) -> None:
+    relogio = RelogioFalso()
+    cache = CacheLRU(max_itens=4, ttl=10, relogio=relogio)
+    cache.guardar("a", 1)
+    relogio.agora = 5
+    cache.guardar("b", 2)
+
+    relogio.agora = 10
+    assert cache.obter("a") == (True, 1), "item ainda válido no limite do ttl"
+    relogio.agora = 10.5
+    assert cache.obter("a") == (False, None), "item expirado"
+    assert len(cache) == 1, "item expirado deve sair do cache"
+    assert cache.obter("b") == (True, 2), "a leitura não renova a validade, mas b ainda vale"
+
+    cache.guardar("a", 3)  # regravar renova a validade
+    relogio.agora = 20
+    assert cache.obter("a") == (True, 3) and cache.obter("b") == (False, None)
+
+
+@conferencia("cache_aporte")
+def _cache_aporte(diretorio: str) -> None:
+    cache = CacheLRU(max_itens=8)
+    perfil = (30, 65, 90, 50_000.0, 8_000.0, 0.06)
+    primeiro = calcular_aporte_cacheado(*perfil, modo_historico="anual", cache=cache)
+    primeiro["aporte_mensal"] = -1
+    primeiro["comparacao"].clear()
+
+    # Mesma entrada ao centavo: reaproveita o resultado guardado, intacto.
+    segundo = calcular_aporte_cacheado(30, 65, 90, 50_000.001, 8_000.0, 0.06, modo_historico="anual", cache=cache)
+    assert (cache.acertos, cache.falhas) == (1, 1), cache.estatisticas()
+    assert segundo["aporte_mensal"] > 0 and set(segundo["comparacao"]) == {"progressivo", "regressivo"}, segundo
+    assert isinstance(segundo["historico"], tuple), type(segundo["historico"])
+
+# ==== EXECUÇÃO EM LOTE ====
+
+class Interrupcao(Exception):
+    pass
+
+
+def _carteira(diretorio: str, clientes: int = 10) -> str:
+    caminho = os.path.join(diretorio, "clientes.jsonl")
+    with open(caminho, "w", encoding="utf-8") as arquivo:
+        for indice in range(clientes):
+            registro = {
+                "id": f"c{indice}", "idade_atual": 30 + indice, "idade_aposentadoria": 65, "expectativa_vida": 90,
+                "poupanca_inicial": 10_000 * indice, "renda_mensal": 5_000, "rentabilidade_anual": 0.05,
+            }
+            if indice == 4:
+                del registro["renda_mensal"]  # vira uma linha de erro
+            arquivo.write(json.dumps(registro) + "\n")
+    return caminho
+
+
+def _interromper_apos(registros: int) -> Callable[[int], None]:
+    def ao_concluir(concluidos: int) -> None:
+        if concluidos >= registros:
+            raise Interrupcao(concluidos)
+    return ao_concluir
+
+
+def _ler(caminho: str) -> str:
+    with open(caminho, encoding="utf-8") as arquivo:
+        return arquivo.read()
+
+
+@conferencia("lote_retomada")
+def _lote_retomada(diretorio: str) -> None:
+    entrada = _carteira(diretorio)
+    referencia = os.path.join(diretorio, "referencia.jsonl")
+    executar(entrada, referencia, tamanho_bloco=3)
+    assert not os.path.exists(referencia + ".checkpoint"), "checkpoint não apagado ao terminar"
+    assert '"erro": "KeyError' in _ler(referencia), "registro sem renda deveria virar linha de erro"
+
+    saida = os.path.join(diretorio, "resultados.jsonl")
+    try:
+        executar(entrada, saida, tamanho_bloco=3, ao_concluir=_interromper_apos(6))
+    except Interrupcao:
+        pass
+    else:
+        raise AssertionError("a execução deveria ter sido interrompida")
+    assert ler_checkpoint(saida + ".checkpoint")["registros"] == 6
+    with open(saida, "a", encoding="utf-8") as arquivo:
+        arquivo.write('{"id": "escrito após o checkpoint"')
+
+    with _avisos("executar_lote") as avisos:
+        estatisticas = executar(entrada, saida, tamanho_bloco=3)
+    assert avisos[:1] == ["Retomando após 6 registros."], avisos
+    assert (estatisticas["processados"], estatisticas["total"]) == (4, 10), estatisticas
+    assert _ler(saida) == _ler(referencia), "a retomada não reproduz a execução sem interrupção"
+    assert not os.path.exists(saida + ".checkpoint"), "checkpoint não apagado ao terminar"
+
+
+@conferencia("lote_checkpoint_divergente")
+def _lote_checkpoint_divergente(diretorio: str) -> None:
+    entrada = _carteira(diretorio)
+    saida = os.path.join(diretorio, "resultados.jsonl")
+    try:
+        executar(entrada, saida, tamanho_bloco=3, ao_concluir=_interromper_apos(3))
+    except Interrupcao:
+        pass
+    parcial = _ler(saida)
+
+    with open(entrada, "a", encoding="utf-8") as arquivo:
+        arquivo.write(json.dumps({"id": "novo", "idade_atual": 40}) + "\n")
+    try:
+        executar(entrada, saida, tamanho_bloco=3)
+    except ValueError as erro:
+        assert "outra versão" in str(erro), erro
+    else:
+        raise AssertionError("checkpoint de outra versão da entrada foi aceito")
+    assert _ler(saida) == parcial, "a saída não pode mudar quando o checkpoint é recusado"
+
+    with open(saida, "w", encoding="utf-8"):
+        pass  # saída truncada por fora: menor que a posição do checkpoint
+    checkpoint = ler_checkpoint(saida + ".checkpoint")
+    with open(saida + ".checkpoint", "w", encoding="utf-8") as arquivo:
+        json.dump({**checkpoint, "entrada": impressao_entrada(entrada)}, arquivo)
+    try:
+        executar(entrada, saida, tamanho_bloco=3)
+    except ValueError as erro:
+        assert "não corresponde" in str(erro), erro
+    else:
+        raise AssertionError("checkpoint maior que a saída foi aceito")
+
+# ==== FILA DE TAREFAS ====
+
+# Por chave de conferência: o evento que libera as etapas e quantas já terminaram.
+_LIBERACOES: Dict[str, threading.Event] = {}
+_ETAPAS: Dict[str, int] = {}
+
+
+@tipo_tarefa("conferencia_etapas")
+def _tarefa_etapas(parametros: dict, contexto) -> int:
+    """Executa `etapas` etapas, cada uma esperando ser liberada, e informa o progresso entre elas."""
+    chave = parametros["chave"]
+    for concluidas in range(1, parametros["etapas"] + 1):
+        _LIBERACOES[chave].wait(10)
+        _ETAPAS[chave] = _ETAPAS.get(chave, 0) + 1
+        contexto.progresso(concluidas / parametros["etapas"], f"{concluidas} etapas")
+    return parametros["etapas"]
+
+
+def _aguardar_estado(fila: FilaTarefas, identificador: str, estado: str, timeout: float = 10) -> dict:
+    limite = time.monotonic() + timeout
+    while True:
+        tarefa = fila.consultar(identificador)
+        if tarefa["estado"] == estado or time.monotonic() > limite:
+            return tarefa
+        time.sleep(0.01)
+
+
+@conferencia("fila_cancelamento")
+def _fila_cancelamento(diretorio: str) -> None:
+    fila = FilaTarefas(os.path.join(diretorio, "tarefas.sqlite3"), max_trabalhadores=1)
+    liberar = _LIBERACOES["cancelamento"] = threading.Event()
+    try:
+        rodando = fila.submeter("conferencia_etapas", {"chave": "cancelamento", "etapas": 50})
+        pendente = fila.submeter("conferencia_etapas", {"chave": "cancelamento", "etapas": 50})
+        assert _aguardar_estado(fila, rodando, EXECUTANDO)["estado"] == EXECUTANDO
+
+        assert fila.cancelar(pendente) and fila.cancelar(rodando)
+        tarefa = fila.consultar(rodando)
+        assert tarefa["cancelar"] and tarefa["mensagem"] == MENSAGEM_CANCELAMENTO, tarefa
+        liberar.set()
+
+        # A etapa em andamento termina e a gravação de progresso seguinte para a tarefa.
+        assert fila.aguardar(rodando, timeout=10)["estado"] == CANCELADA
+        assert fila.aguardar(pendente, timeout=10)["estado"] == CANCELADA
+        assert _ETAPAS["cancelamento"] == 1, f"{_ETAPAS['cancelamento']} etapas rodaram após o cancelamento"
+        assert not fila.cancelar(rodando), "cancelar uma tarefa terminada deve retornar False"
+
+        concluida = fila.submeter("conferencia_etapas", {"chave": "cancelamento", "etapas": 2})
+        tarefa = fila.aguardar(concluida, timeout=10)
+        assert (tarefa["estado"], tarefa["resultado"], tarefa["progresso"]) == (CONCLUIDA, 2, 1.0), tarefa
+    finally:
+        liberar.set()
+        fila.encerrar()
+        fila._executor.shutdown(wait=True)
+
+
+def _pid_encerrado() -> int:
+    processo = subprocess.Popen([sys.executable, "-c", "pass"])
+    processo.wait()
+    return processo.pid
+
+
+@conferencia("fila_donos")
+def _fila_donos(diretorio: str) -> None:
+    caminho = os.path.join(diretorio, "tarefas.sqlite3")
+    liberar = _LIBERACOES["donos"] = threading.Event()
+    anterior = FilaTarefas(caminho)
+    viva = FilaTarefas(caminho)
+    try:
+        orfa = anterior.submeter("conferencia_etapas", {"chave": "donos", "etapas": 1})
+        propria = viva.submeter("conferencia_etapas", {"chave": "donos", "etapas": 1})
+        assert _aguardar_estado(viva, propria, EXECUTANDO)["estado"] == EXECUTANDO
+        anterior.encerrar()
+
+        agora = time.time()
+        maquina = socket.gethostname()
+        linhas = [
+            ("morta", PENDENTE, f"{maquina}:{_pid_encerrado()}:x", agora),
+            ("outra_maquina", EXECUTANDO, f"{maquina}-outra:1:x", agora),
+            ("sem_dono", EXECUTANDO, None, agora),
+            ("antiga", CONCLUIDA, None, agora - 3600),
+            ("recente", CONCLUIDA, None, agora),
+        ]
+        with viva._conectar() as conexao:
+            conexao.executemany(
+                "INSERT INTO tarefas (id, tipo, estado, parametros, criada_em, atualizada_em, dono)"
+                " VALUES (?, 'conferencia_etapas', ?, '{}', ?, ?, ?)",
+                [(identificador, estado, quando, quando, dono) for identificador, estado, dono, quando in linhas],
+            )
+
+        nova = FilaTarefas(caminho, retencao=60)
+        nova.encerrar()
+        esperado = {
+            orfa: FALHOU, propria: EXECUTANDO, "morta": FALHOU, "outra_maquina": EXECUTANDO,
+            "sem_dono": FALHOU, "antiga": None, "recente": CONCLUIDA,
+        }
+        estados = {identificador: (viva.consultar(identificador) or {}).get("estado") for identificador in esperado}
+        assert estados == esperado, estados
+        assert viva.consultar(orfa)["erro"] == "Interrompida pelo encerramento do servidor."
+    finally:
+        # Espera as threads das duas filas antes de o diretório temporário ser apagado.
+        liberar.set()
+        for fila in (anterior, viva):
+            fila.encerrar()
+            fila._executor.shutdown(wait=True)
+
+# ==== EXECUÇÃO ====
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Conferências de integração sem rede.")
+    parser.add_argument("--filtro", default="", help="executa só conferências cujo nome contém o texto")
+    args = parser.parse_args(argv)
+
+    falhas = 0
+    for nome, funcao in CONFERENCIAS:
+        if args.filtro not in nome:
+            continue
+        try:
+            with tempfile.TemporaryDirectory() as diretorio:
+                funcao(diretorio)
+        except Exception as erro:
+            falhas += 1
+            print(f"FALHA {nome}: {type(erro).__name__}: {erro}")
+        else:
+            print(f"ok    {nome}")
+    if falhas:
+        print(f"{falhas} conferências falharam.")
+        return 1
+    print("Componentes com estado conferidos.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
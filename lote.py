@@ -0,0 +1,120 @@
+from typing import Tuple, Union
+
+import numpy as np
+
+from core import MODOS_HISTORICO, taxa_mensal
+
+# ==== IMPOSTO DE RENDA VETORIZADO ====
+
+REGIMES = ("progressivo", "regressivo")
+
+
+def ir_progressivo_vetorizado(valor: np.ndarray) -> np.ndarray:
+    """IR pela tabela progressiva mensal (2024), aplicado elemento a elemento."""
+    condicoes = [valor <= 2112, valor <= 2826.65, valor <= 3751.05, valor <= 4664.68]
+    faixas = [
+        np.zeros_like(valor),
+        np.maximum(valor * 0.075 - 158.4, 0),
+        np.maximum(valor * 0.15 - 370.4, 0),
+        np.maximum(valor * 0.225 - 651.73, 0),
+    ]
+    return np.select(condicoes, faixas, default=np.maximum(valor * 0.275 - 884.96, 0))
+
+
+def ir_regressivo_vetorizado(valor: np.ndarray, mes: np.ndarray, anos_aporte: np.ndarray) -> np.ndarray:
+    """IR regressivo com base no tempo médio de cada aporte, elemento a elemento."""
+    anos_de_saque = mes / 12
+    tempo_medio = anos_aporte - anos_de_saque
+
+    aliquota = np.where(
+        tempo_medio >= 10, 0.10,
+        np.where(tempo_medio <= 0, 0.35, 0.35 - ((tempo_medio / 10) * 0.25))
+    )
+    aliquota = np.maximum(np.minimum(aliquota, 0.35), 0.10)
+    return valor * aliquota
+
+# ==== SIMULAÇÃO EM LOTE ====
+
+def simular_aposentadoria_lote(
+    idade_atual,
+    idade_aposentadoria,
+    expectativa_vida,
+    poupanca_inicial,
+    aporte_mensal,
+    renda_mensal,
+    rentabilidade_anual,
+    regime: Union[str, np.ndarray] = "progressivo",
+    modo_historico: str = "completo"
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Simula vários cenários de uma vez, avançando todos mês a mês com arrays NumPy.
+
+    Cada argumento aceita escalar ou array (com broadcast). Horizontes diferentes são
+    tratados por máscara: o saldo de um cenário fica congelado após o fim da sua vida.
+    Reproduz `core.simular_aposentadoria(..., motor="iterativo")` operação a operação;
+    as saídas têm a forma dos argumentos após o broadcast e o histórico ganha um eixo
+    final de pontos (com a mesma amostragem de `modo_historico`), com NaN após o
+    horizonte de cada cenário. O patrimônio na aposentadoria é NaN quando não há meses
+    de aporte. Com `modo_historico="nenhum"` o eixo de pontos tem tamanho zero.
+    """
+    if modo_historico not in MODOS_HISTORICO:
+        raise ValueError("Modo de histórico inválido. Use 'nenhum', 'anual' ou 'completo'.")
+
+    (idade_atual, idade_aposentadoria, expectativa_vida, poupanca_inicial,
+     aporte_mensal, renda_mensal, rentabilidade_anual, regime) = np.broadcast_arrays(
+        np.atleast_1d(np.asarray(idade_atual, dtype=np.int64)),
+        np.asarray(idade_aposentadoria, dtype=np.int64),
+        np.asarray(expectativa_vida, dtype=np.int64),
+        np.asarray(poupanca_inicial, dtype=np.float64),
+        np.asarray(aporte_mensal, dtype=np.float64),
+        np.asarray(renda_mensal, dtype=np.float64),
+        np.asarray(rentabilidade_anual, dtype=np.float64),
+        np.asarray(regime),
+    )
+    invalidos = ~np.isin(regime, REGIMES)
+    if invalidos.any():
+        raise ValueError("Regime inválido. Use 'progressivo' ou 'regressivo'.")
+
+    meses_total = (expectativa_vida - idade_atual) * 12
+    meses_aporte = (idade_aposentadoria - idade_atual) * 12
+    anos_aporte = idade_aposentadoria - idade_atual
+    meses_max = int(meses_total.max(initial=0))
+
+    saldo = poupanca_inicial.copy()
+    # Conversão escalar para reproduzir exatamente o `pow` usado pelo motor escalar.
+    fator = 1 + np.array([taxa_mensal(float(r)) for r in rentabilidade_anual.ravel()]).reshape(saldo.shape)
+    patrimonio_no_aposentadoria = np.full(saldo.shape, np.nan)
+    passo_historico = MODOS_HISTORICO[modo_historico]
+    pontos = -(-meses_max // passo_historico) if passo_historico else 0
+    historico = np.full(saldo.shape + (pontos,), np.nan)
+    total_ir_pago = np.zeros(saldo.shape)
+
+    saque_liquido = renda_mensal
+    saque_bruto_estimado = saque_liquido / 0.85
+    regressivo = regime == "regressivo"
+    # O valor bruto é constante, então o IR progressivo é calculado uma única vez.
+    ir_prog = ir_progressivo_vetorizado(saque_bruto_estimado)
+
+    for mes in range(meses_max):
+        ativo = mes < meses_total
+        acumulando = mes < meses_aporte
+        sacando = ativo & ~acumulando
+
+        novo_saldo = saldo * fator
+        if regressivo.any():
+            ir_regr = ir_regressivo_vetorizado(saque_bruto_estimado, mes - meses_aporte, anos_aporte)
+            ir = np.where(regressivo, ir_regr, ir_prog)
+        else:
+            ir = ir_prog
+        saque_bruto = saque_liquido + ir
+        novo_saldo = np.where(acumulando, novo_saldo + aporte_mensal, novo_saldo - saque_bruto)
+
+        saldo = np.where(ativo, novo_saldo, saldo)
+        total_ir_pago = np.where(sacando, total_ir_pago + ir, total_ir_pago)
+
+        if passo_historico and mes % passo_historico == 0:
+            historico[..., mes // passo_historico] = np.where(ativo, saldo, np.nan)
+
+        snapshot = ativo & (mes == meses_aporte - 1)
+        patrimonio_no_aposentadoria = np.where(snapshot, saldo, patrimonio_no_aposentadoria)
+
+    return saldo, patrimonio_no_aposentadoria, historico, total_ir_pago
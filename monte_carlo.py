@@ -0,0 +1,280 @@
+import math
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterator, Optional, Sequence, Tuple
+
+import numpy as np
+
+from lote import REGIMES, ir_progressivo_vetorizado, ir_regressivo_vetorizado
+
+# ==== RESULTADO ====
+
+@dataclass
+class ResultadoMonteCarlo:
+    """Faixas de patrimônio e probabilidades agregadas de uma simulação estocástica."""
+    idades: np.ndarray
+    faixas: Dict[int, np.ndarray]
+    saldo_final: Dict[int, float]
+    probabilidade_ruina: float
+    probabilidade_sucesso: float
+    n_trajetorias: int
+
+# ==== QUANTIS EM FLUXO ====
+
+class HistogramaStreaming:
+    """Estima quantis por ponto de controle sem guardar as trajetórias.
+
+    As faixas de cada ponto começam no intervalo do primeiro lote (com margem de uma
+    amplitude para cada lado). Quando um lote seguinte sai desse intervalo, as faixas
+    do ponto dobram de largura, juntando pares vizinhos, até cobri-lo; assim nenhum
+    valor cai numa faixa que não é a sua, e o erro de cada quantil fica limitado à
+    largura final de uma faixa do ponto.
+    """
+
+    def __init__(self, n_pontos: int, n_faixas: int = 4096):
+        if n_faixas < 2 or n_faixas % 2:
+            raise ValueError("O número de faixas precisa ser par.")
+        self.n_pontos = n_pontos
+        self.n_faixas = n_faixas
+        self.inicio: Optional[np.ndarray] = None
+        self.largura: Optional[np.ndarray] = None
+        self.contagens = np.zeros((n_pontos, n_faixas), dtype=np.int64)
+        self.total = 0
+
+    def adicionar(self, valores: np.ndarray) -> None:
+        """Acumula um lote com forma trajetórias × pontos de controle."""
+        if self.inicio is None:
+            minimo, maximo = valores.min(axis=0), valores.max(axis=0)
+            amplitude = np.maximum(maximo - minimo, np.maximum(np.abs(maximo), 1.0) * 1e-6)
+            self.inicio = minimo - amplitude
+            self.largura = 3 * amplitude / self.n_faixas
+        else:
+            self._ampliar(valores.min(axis=0), valores.max(axis=0))
+
+        indices = ((valores - self.inicio) / self.largura).astype(np.int64)
+        indices = np.clip(indices, 0, self.n_faixas - 1) + np.arange(self.n_pontos) * self.n_faixas
+        self.contagens += np.bincount(
+            indices.ravel(), minlength=self.n_pontos * self.n_faixas
+        ).reshape(self.n_pontos, self.n_faixas)
+        self.total += valores.shape[0]
+
+    def _ampliar(self, minimos: np.ndarray, maximos: np.ndarray) -> None:
+        """Dobra a largura das faixas de cada ponto até o intervalo cobrir [mínimo, máximo]."""
+        faixas = np.arange(self.n_faixas)
+        for ponto in range(self.n_pontos):
+            while True:
+                abaixo = minimos[ponto] < self.inicio[ponto]
+                acima = maximos[ponto] >= self.inicio[ponto] + self.n_faixas * self.largura[ponto]
+                if not (abaixo or acima):
+                    break
+                if abaixo:
+                    # Estende para baixo: as faixas antigas ocupam a metade superior.
+                    destino = (faixas + self.n_faixas) // 2
+                    self.inicio[ponto] -= self.n_faixas * self.largura[ponto]
+                else:
+                    destino = faixas // 2
+                self.contagens[ponto] = np.bincount(
+                    destino, weights=self.contagens[ponto], minlength=self.n_faixas
+                ).astype(np.int64)
+                self.largura[ponto] *= 2
+
+    def quantil(self, q: float) -> np.ndarray:
+        """Quantil `q` (0–1) em cada ponto de controle, interpolado dentro da faixa."""
+        acumulado = np.cumsum(self.contagens, axis=1)
+        alvo = q * self.total
+        faixa = np.argmax(acumulado >= alvo, axis=1)
+        linhas = np.arange(self.n_pontos)
+        anteriores = np.where(faixa > 0, acumulado[linhas, np.maximum(faixa - 1, 0)], 0)
+        na_faixa = np.maximum(self.contagens[linhas, faixa], 1)
+        fracao = np.clip((alvo - anteriores) / na_faixa, 0, 1)
+        return self.inicio + (faixa + fracao) * self.largura
+
+# ==== TRAJETÓRIAS ====
+
+def _parametros_retorno(rentabilidade_anual: float, volatilidade_anual: float) -> Tuple[float, float]:
+    """Média e desvio mensais do log-retorno; a rentabilidade é a média geométrica anual."""
+    return math.log(1 + rentabilidade_anual) / 12, volatilidade_anual / math.sqrt(12)
+
+
+def _lotes(n_trajetorias: int, tamanho_lote: int) -> Iterator[int]:
+    restantes = n_trajetorias
+    while restantes > 0:
+        tamanho = min(tamanho_lote, restantes)
+        restantes -= tamanho
+        yield tamanho
+
+
+def _tabela_ir(regime: str, renda_mensal: float, meses_saque: int, anos_aporte: int) -> np.ndarray:
+    """IR de cada mês de saque; não depende da trajetória de retornos."""
+    if regime not in REGIMES:
+        raise ValueError("Regime inválido. Use 'progressivo' ou 'regressivo'.")
+    valor = np.full(meses_saque, renda_mensal / 0.85)
+    if regime == "progressivo":
+        return ir_progressivo_vetorizado(valor)
+    return ir_regressivo_vetorizado(valor, np.arange(meses_saque), anos_aporte)
+
+
+def _alvo_final(modo: str, patrimonio_aposentadoria: np.ndarray, valor_final_desejado: Optional[float]):
+    if modo == "zerar":
+        return 0.0
+    elif modo == "manter":
+        return patrimonio_aposentadoria
+    elif modo == "atingir":
+        return valor_final_desejado or 0
+    else:
+        raise ValueError("Modo inválido. Use 'zerar', 'manter' ou 'atingir'.")
+
+# ==== SIMULAÇÃO ESTOCÁSTICA ====
+
+def simular_monte_carlo(
+    idade_atual: int,
+    idade_aposentadoria: int,
+    expectativa_vida: int,
+    poupanca_inicial: float,
+    aporte_mensal: float,
+    renda_mensal: float,
+    rentabilidade_anual: float,
+    volatilidade_anual: float,
+    regime: str = "progressivo",
+    modo: str = "zerar",
+    valor_final_desejado: Optional[float] = None,
+    n_trajetorias: int = 10_000,
+    tamanho_lote: int = 1_000,
+    semente: Optional[int] = None,
+    percentis: Sequence[int] = (5, 50, 95),
+    progresso: Optional[Callable[[float], None]] = None
+) -> ResultadoMonteCarlo:
+    """Simula trajetórias de retornos reais log-normais e agrega faixas de patrimônio.
+
+    As trajetórias são geradas e avançadas em lotes; só os histogramas anuais e os
+    contadores de ruína/sucesso sobrevivem entre lotes, então a memória não cresce
+    com `n_trajetorias`. Ruína é saldo negativo em algum mês de saque; sucesso é
+    não arruinar e terminar com saldo no alvo do `modo`. `progresso`, se dado, é
+    chamado ao fim de cada lote com a fração de trajetórias concluída.
+    """
+    meses_total = (expectativa_vida - idade_atual) * 12
+    meses_aporte = (idade_aposentadoria - idade_atual) * 12
+    anos_aporte = idade_aposentadoria - idade_atual
+    tabela_ir = _tabela_ir(regime, renda_mensal, meses_total - meses_aporte, anos_aporte)
+    saque_bruto = renda_mensal + tabela_ir
+
+    media, desvio = _parametros_retorno(rentabilidade_anual, volatilidade_anual)
+    rng = np.random.default_rng(semente)
+    pontos = np.arange(0, meses_total, 12)
+    histograma = HistogramaStreaming(len(pontos))
+    histograma_final = HistogramaStreaming(1)
+    ruinas = sucessos = concluidas = 0
+
+    for tamanho in _lotes(n_trajetorias, tamanho_lote):
+        fatores = np.exp(media + desvio * rng.standard_normal((tamanho, meses_total)))
+        saldo = np.full(tamanho, float(poupanca_inicial))
+        patrimonio = np.full(tamanho, np.nan)
+        arruinada = np.zeros(tamanho, dtype=bool)
+        anuais = np.empty((tamanho, len(pontos)))
+
+        for mes in range(meses_total):
+            saldo *= fatores[:, mes]
+            if mes < meses_aporte:
+                saldo += aporte_mensal
+            else:
+                saldo -= saque_bruto[mes - meses_aporte]
+                arruinada |= saldo < 0
+            if mes % 12 == 0:
+                anuais[:, mes // 12] = saldo
+            if mes == meses_aporte - 1:
+                patrimonio = saldo.copy()
+
+        alvo = _alvo_final(modo, patrimonio, valor_final_desejado)
+        ruinas += int(arruinada.sum())
+        sucessos += int((~arruinada & (saldo >= alvo)).sum())
+        histograma.adicionar(anuais)
+        histograma_final.adicionar(saldo[:, None])
+        concluidas += tamanho
+        if progresso is not None:
+            progresso(concluidas / n_trajetorias)
+
+    return ResultadoMonteCarlo(
+        idades=idade_atual + pontos // 12,
+        faixas={p: histograma.quantil(p / 100) for p in percentis},
+        saldo_final={p: float(histograma_final.quantil(p / 100)[0]) for p in percentis},
+        probabilidade_ruina=ruinas / n_trajetorias,
+        probabilidade_sucesso=sucessos / n_trajetorias,
+        n_trajetorias=n_trajetorias,
+    )
+
+# ==== APORTE PARA PROBABILIDADE DE SUCESSO ====
+
+def calcular_aporte_probabilidade(
+    idade_atual: int,
+    idade_aposentadoria: int,
+    expectativa_vida: int,
+    poupanca_inicial: float,
+    renda_mensal: float,
+    rentabilidade_anual: float,
+    volatilidade_anual: float,
+    probabilidade_alvo: float = 0.9,
+    regime: str = "progressivo",
+    modo: str = "zerar",
+    valor_final_desejado: Optional[float] = None,
+    n_trajetorias: int = 10_000,
+    tamanho_lote: int = 1_000,
+    semente: Optional[int] = None,
+    max_aporte: float = 100_000
+) -> Optional[float]:
+    """Menor aporte mensal cuja probabilidade de sucesso atinge `probabilidade_alvo`.
+
+    Para uma trajetória fixa o saldo de cada mês é afim no aporte (A + aporte·B), então
+    cada trajetória tem um aporte mínimo de sucesso calculado em uma única passada. O
+    aporte procurado é o quantil `probabilidade_alvo` desses mínimos. Com a mesma
+    `semente` as trajetórias coincidem com as de `simular_monte_carlo`.
+    """
+    meses_total = (expectativa_vida - idade_atual) * 12
+    meses_aporte = (idade_aposentadoria - idade_atual) * 12
+    anos_aporte = idade_aposentadoria - idade_atual
+    tabela_ir = _tabela_ir(regime, renda_mensal, meses_total - meses_aporte, anos_aporte)
+    saque_bruto = renda_mensal + tabela_ir
+
+    media, desvio = _parametros_retorno(rentabilidade_anual, volatilidade_anual)
+    rng = np.random.default_rng(semente)
+    minimos = []
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for tamanho in _lotes(n_trajetorias, tamanho_lote):
+            fatores = np.exp(media + desvio * rng.standard_normal((tamanho, meses_total)))
+            # Saldo com aporte zero (A) e sensibilidade ao aporte (B).
+            base = np.full(tamanho, float(poupanca_inicial))
+            sensibilidade = np.zeros(tamanho)
+            base_aposentadoria = base.copy()
+            sens_aposentadoria = sensibilidade.copy()
+            minimo_ruina = np.zeros(tamanho)
+
+            for mes in range(meses_total):
+                base *= fatores[:, mes]
+                sensibilidade *= fatores[:, mes]
+                if mes < meses_aporte:
+                    sensibilidade += 1
+                else:
+                    base -= saque_bruto[mes - meses_aporte]
+                    necessario = np.where(
+                        sensibilidade > 0, -base / sensibilidade, np.where(base < 0, np.inf, 0.0)
+                    )
+                    minimo_ruina = np.maximum(minimo_ruina, necessario)
+                if mes == meses_aporte - 1:
+                    base_aposentadoria = base.copy()
+                    sens_aposentadoria = sensibilidade.copy()
+
+            if modo == "manter":
+                deficit = base_aposentadoria - base
+                inclinacao = sensibilidade - sens_aposentadoria
+            else:
+                deficit = _alvo_final(modo, base, valor_final_desejado) - base
+                inclinacao = sensibilidade
+            minimo_final = np.where(
+                inclinacao > 0, deficit / inclinacao, np.where(deficit > 0, np.inf, 0.0)
+            )
+            minimos.append(np.maximum(np.maximum(minimo_ruina, minimo_final), 0.0))
+
+    # O ceil(q·n)-ésimo menor mínimo: exatamente a fração q das trajetórias tem sucesso com ele.
+    aporte = float(np.quantile(np.concatenate(minimos), probabilidade_alvo, method="inverted_cdf"))
+    if not math.isfinite(aporte) or aporte > max_aporte:
+        return None
+    return math.ceil(aporte * 100 - 1e-6) / 100
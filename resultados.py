@@ -0,0 +1,128 @@
+"""Preparação dos resultados para gráficos e exportação.
+
+Monta quadros de idade × patrimônio a partir do histórico devolvido por
+`simular_aposentadoria` (ou de várias simulações), sempre indexando por mês inteiro:
+a idade é derivada do mês, nunca o contrário, então não há comparação de floats.
+"""
+import math
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+# Intervalo, em meses, entre pontos de cada resolução.
+RESOLUCOES = {"anual": 12, "mensal": 1}
+
+# Troca os separadores do formato americano (1,234.56) pelos do brasileiro (1.234,56).
+_SEPARADORES_BR = str.maketrans({",": ".", ".": ","})
+# Texto de cada grupo de milhar: o primeiro sem zeros à esquerda, os demais com o ponto.
+_GRUPOS_INICIAIS = np.array([str(grupo) for grupo in range(1000)])
+_GRUPOS_MILHAR = np.array([f".{grupo:03d}" for grupo in range(1000)])
+
+# ==== FORMATAÇÃO ====
+
+def formatar_moeda_serie(valores, decimais: int = 0) -> pd.Series:
+    """Formata uma coluna inteira como "R$ 1.234"; equivalente a `formatar_moeda` do app."""
+    serie = pd.Series(valores, dtype=float)
+    if serie.empty:
+        return pd.Series([], index=serie.index, dtype=object)
+    escala = 10 ** decimais
+    # Arredonda uma vez, em unidades da última casa, e monta o texto por grupos de milhar
+    # (consultados em tabela) com aritmética inteira sobre a coluna inteira.
+    escalados = serie.to_numpy() * escala
+    unidades = np.rint(escalados)
+    # NaN, infinitos, valores sem inteiro exato e, com casas decimais, empates em x,5 no
+    # produto já arredondado (o valor exato pode estar de qualquer lado) ficam com a
+    # formatação escalar.
+    with np.errstate(invalid="ignore"):
+        vetorizados = (np.abs(unidades) < 2 ** 52) & ((decimais == 0) | (np.abs(escalados - unidades) != 0.5))
+    absolutos = np.abs(np.where(vetorizados, unidades, 0)).astype(np.int64)
+    inteiros = absolutos // escala
+
+    grupos = 1 + sum(inteiros >= 1000 ** grupo for grupo in range(1, 6))
+    texto = _GRUPOS_INICIAIS[inteiros // 1000 ** (grupos - 1) % 1000]
+    for grupo in range(int(grupos.max(initial=1)) - 2, -1, -1):
+        milhar = _GRUPOS_MILHAR[inteiros // 1000 ** grupo % 1000]
+        texto = np.char.add(texto, np.where(grupo < grupos - 1, milhar, ""))
+    if decimais:
+        casas = np.char.zfill((absolutos % escala).astype(str), decimais)
+        texto = np.char.add(np.char.add(texto, ","), casas)
+    texto = pd.Series(np.char.add(np.where(np.signbit(unidades), "R$ -", "R$ "), texto), index=serie.index, dtype=object)
+    if not vetorizados.all():
+        escalares = serie[~vetorizados]
+        texto[~vetorizados] = "R$ " + escalares.map(f"{{:,.{decimais}f}}".format).str.translate(_SEPARADORES_BR)
+    return texto
+
+# ==== SÉRIES ====
+
+def indices_amostragem(pontos: int, passo: int = 1, max_pontos: Optional[int] = None) -> np.ndarray:
+    """Posições amostradas a cada `passo`, decimadas para no máximo `max_pontos`.
+
+    A decimação usa um passo inteiro uniforme e mantém o último ponto da série, para
+    o gráfico terminar no saldo final.
+    """
+    if pontos <= 0:
+        return np.zeros(0, dtype=np.int64)
+    if max_pontos is not None and max_pontos < 2:
+        raise ValueError("max_pontos precisa ser ao menos 2.")
+    indices = np.arange(0, pontos, passo, dtype=np.int64)
+    if max_pontos is not None and len(indices) > max_pontos:
+        indices = indices[::math.ceil(len(indices) / (max_pontos - 1))]
+        if indices[-1] != pontos - 1:
+            indices = np.append(indices, pontos - 1)
+    return indices
+
+
+def serie_patrimonio(
+    historico: Sequence[float],
+    idade_atual: int,
+    passo_historico: int = 12,
+    resolucao: str = "anual",
+    max_pontos: Optional[int] = None,
+    formatar: bool = True
+) -> pd.DataFrame:
+    """Quadro com Mes, Idade, Montante (e Montante formatado) a partir de um histórico.
+
+    `passo_historico` é o intervalo em meses entre os pontos do histórico (12 para
+    `modo_historico="anual"`, 1 para "completo"). `resolucao` escolhe o intervalo do
+    quadro ("anual" ou "mensal", que exige histórico mensal) e `max_pontos` decima a
+    série uniformemente. Pontos NaN (histórico em lote após o horizonte) são
+    descartados.
+    """
+    if resolucao not in RESOLUCOES:
+        raise ValueError("Resolução inválida. Use 'anual' ou 'mensal'.")
+    if RESOLUCOES[resolucao] % passo_historico:
+        raise ValueError(f"Um histórico a cada {passo_historico} meses não tem resolução {resolucao}.")
+
+    montantes = np.asarray(historico, dtype=float)
+    preenchidos = np.flatnonzero(~np.isnan(montantes))
+    montantes = montantes[:preenchidos[-1] + 1] if preenchidos.size else montantes[:0]
+    indices = indices_amostragem(len(montantes), RESOLUCOES[resolucao] // passo_historico, max_pontos)
+    meses = indices * passo_historico
+
+    quadro = pd.DataFrame({
+        "Mes": meses,
+        "Idade": idade_atual + meses / 12,
+        "Montante": montantes[indices],
+    })
+    if formatar:
+        quadro["Montante formatado"] = formatar_moeda_serie(quadro["Montante"]).to_numpy()
+    return quadro
+
+
+def quadro_cenarios(
+    historicos: Dict[str, Sequence[float]],
+    idade_atual: int,
+    passo_historico: int = 12,
+    resolucao: str = "anual",
+    max_pontos: Optional[int] = None,
+    formatar: bool = True
+) -> pd.DataFrame:
+    """Quadro longo (uma linha por cenário e ponto) para sobrepor várias simulações."""
+    quadros = [
+        serie_patrimonio(historico, idade_atual, passo_historico, resolucao, max_pontos, formatar).assign(Cenario=nome)
+        for nome, historico in historicos.items()
+    ]
+    if not quadros:
+        return pd.DataFrame(columns=["Mes", "Idade", "Montante", "Cenario"])
+    return pd.concat(quadros, ignore_index=True)
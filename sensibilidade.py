@@ -0,0 +1,130 @@
+import itertools
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Iterator, List, Optional, Sequence
+
+from core import calcular_aporte
+
+# ==== CÉLULAS ====
+
+def _celulas(idade_atual, idades_aposentadoria, rentabilidades, rendas, expectativas) -> List[tuple]:
+    """Combinações válidas, ordenadas para que células vizinhas compartilhem tabelas de IR.
+
+    A tabela regressiva depende só de renda e prazos (não da rentabilidade), e é
+    memorizada em `core`; com a rentabilidade variando mais rápido, cada bloco a
+    reaproveita entre as suas células.
+    """
+    return [
+        (idade_aposentadoria, rentabilidade, renda, expectativa)
+        for renda, idade_aposentadoria, expectativa, rentabilidade in itertools.product(
+            rendas, idades_aposentadoria, expectativas, rentabilidades
+        )
+        if idade_atual < idade_aposentadoria < expectativa
+    ]
+
+
+def _resolver_bloco(idade_atual, poupanca_inicial, modo, valor_final_desejado, max_aporte, bloco) -> List[dict]:
+    """Resolve um bloco de células; executado nos processos de trabalho."""
+    resultados = []
+    for idade_aposentadoria, rentabilidade, renda, expectativa in bloco:
+        melhor = calcular_aporte(
+            idade_atual, idade_aposentadoria, expectativa,
+            poupanca_inicial, renda, rentabilidade,
+            modo=modo, valor_final_desejado=valor_final_desejado, max_aporte=max_aporte
+        )
+        resultados.append({
+            "idade_aposentadoria": idade_aposentadoria,
+            "rentabilidade_anual": rentabilidade,
+            "renda_mensal": renda,
+            "expectativa_vida": expectativa,
+            "aporte_mensal": melhor["aporte_mensal"],
+            "regime": melhor.get("regime"),
+        })
+    return resultados
+
+# ==== GRADE ====
+
+def iterar_grade_sensibilidade(
+    idade_atual: int,
+    poupanca_inicial: float,
+    idades_aposentadoria: Sequence[int],
+    rentabilidades: Sequence[float],
+    rendas: Sequence[float],
+    expectativas: Sequence[int],
+    modo: str = "manter",
+    valor_final_desejado: Optional[float] = None,
+    max_aporte: float = 100_000,
+    processos: Optional[int] = None,
+    tamanho_bloco: Optional[int] = None,
+    prazo: Optional[float] = None,
+    inicio_processos: Optional[str] = None
+) -> Iterator[List[dict]]:
+    """Gera os resultados da grade bloco a bloco, à medida que ficam prontos.
+
+    As células (produto cartesiano dos intervalos, descartando combinações de idade
+    inválidas) são divididas em blocos distribuídos a um pool de processos. Com
+    `processos=1` tudo roda no processo atual. `prazo` (segundos) limita o tempo
+    total: blocos não concluídos até lá são cancelados e não aparecem no resultado
+    (os que já estão rodando terminam nos processos, sem serem esperados).
+    `inicio_processos` escolhe o método de início do pool ("spawn", "forkserver");
+    None usa o padrão da plataforma.
+    """
+    celulas = _celulas(idade_atual, idades_aposentadoria, rentabilidades, rendas, expectativas)
+    if not celulas:
+        return
+    processos = processos or os.cpu_count() or 1
+    tamanho_bloco = tamanho_bloco or max(1, len(celulas) // (processos * 4))
+    blocos = [celulas[i:i + tamanho_bloco] for i in range(0, len(celulas), tamanho_bloco)]
+    fixos = (idade_atual, poupanca_inicial, modo, valor_final_desejado, max_aporte)
+    limite = None if prazo is None else time.monotonic() + prazo
+
+    if processos == 1 or len(blocos) == 1:
+        for bloco in blocos:
+            if limite is not None and time.monotonic() > limite:
+                return
+            yield _resolver_bloco(*fixos, bloco)
+        return
+
+    contexto = multiprocessing.get_context(inicio_processos) if inicio_processos else None
+    executor = ProcessPoolExecutor(max_workers=min(processos, len(blocos)), mp_context=contexto)
+    try:
+        pendentes = {executor.submit(_resolver_bloco, *fixos, bloco) for bloco in blocos}
+        while pendentes:
+            restante = None if limite is None else limite - time.monotonic()
+            if restante is not None and restante <= 0:
+                break
+            concluidos, pendentes = wait(pendentes, timeout=restante, return_when=FIRST_COMPLETED)
+            for futuro in concluidos:
+                yield futuro.result()
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def grade_sensibilidade(
+    idade_atual: int,
+    poupanca_inicial: float,
+    idades_aposentadoria: Sequence[int],
+    rentabilidades: Sequence[float],
+    rendas: Sequence[float],
+    expectativas: Sequence[int],
+    modo: str = "manter",
+    valor_final_desejado: Optional[float] = None,
+    max_aporte: float = 100_000,
+    processos: Optional[int] = None,
+    tamanho_bloco: Optional[int] = None,
+    prazo: Optional[float] = None
+) -> List[dict]:
+    """Calcula o aporte necessário em toda a grade de parâmetros.
+
+    Retorna uma linha por célula com idade de aposentadoria, rentabilidade, renda,
+    expectativa de vida, aporte (None se inviável) e regime escolhido.
+    """
+    linhas = []
+    for bloco in iterar_grade_sensibilidade(
+        idade_atual, poupanca_inicial, idades_aposentadoria, rentabilidades, rendas, expectativas,
+        modo, valor_final_desejado, max_aporte, processos, tamanho_bloco, prazo
+    ):
+        linhas.extend(bloco)
+    return linhas
@@ -3,16 +3,25 @@ import os
 sys.path.append(os.path.dirname(__file__))
 
 import streamlit as st
-import pandas as pd
-import requests
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from core import calcular_aporte, simular_aposentadoria, ir_progressivo, ir_regressivo
-import altair as alt
-from io import BytesIO
-from dateutil.relativedelta import relativedelta
+from functools import partial
+from cache import CacheLRU, cache_processo, calcular_aporte_cacheado
+from core import comparar_cenarios
+from tarefas import CANCELADA, ESTADOS_FINAIS, FALHOU, fila_processo
+from instrumentacao import METRICAS, medir, requisicao, servir_metricas
+
+# pandas, altair, xlsxwriter (via exportacao) e requests (via dados_mercado) são
+# importados só nas funções que os usam, para não pesar na inicialização do app.
 
 st.set_page_config(page_title="Wealth Planning", layout="wide")
 
+CACHE_COMPARTILHADO = os.environ.get("CACHE_COMPARTILHADO", "1") != "0"
+MEDIAS_PADRAO = (9.5, 5.0, 4.5)
+PORTA_METRICAS = os.environ.get("INSTRUMENTACAO_PORTA")
+if PORTA_METRICAS:
+    servir_metricas(int(PORTA_METRICAS))
+
 # === ESTILOS ===
 st.markdown("""
     <style>
@@ -65,79 +74,180 @@ def campo_monetario(label, valor_padrao):
     st.caption(f"➡️ Valor inserido: {formatar_moeda(val)}")
     return val
 
-def buscar_serie_bcb(codigo, data_inicial, data_final):
-    url = f"https://api.bcb.gov.br/dados/serie/bcdata.sgs.{codigo}/dados?formato=json&dataInicial={data_inicial}&dataFinal={data_final}"
-    r = requests.get(url)
-    r.raise_for_status()
-    df = pd.DataFrame(r.json())
-    df["valor"] = df["valor"].str.replace(",", ".").astype(float)
-    df["data"] = pd.to_datetime(df["data"], dayfirst=True)
-    return df.set_index("data").sort_index()
-
 def calcular_medias_historicas():
+    from dateutil.relativedelta import relativedelta
+    from dados_mercado import SERIE_IPCA, SERIE_SELIC, buscar_series, medias_historicas
+
     fim = datetime.today().replace(day=1) - timedelta(days=1)
     inicio = fim.replace(day=1) - relativedelta(years=4)
+    series = buscar_series([SERIE_IPCA, SERIE_SELIC], inicio.date(), fim.date())
+    medias = medias_historicas(series[SERIE_IPCA], series[SERIE_SELIC])
+    return medias if medias is not None else MEDIAS_PADRAO
+
+@st.cache_resource(ttl=3600, show_spinner=False)
+def medias_em_segundo_plano():
+    """Future com as médias históricas, buscadas numa thread sem bloquear a página."""
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="dados-mercado")
+    futuro = executor.submit(calcular_medias_historicas)
+    executor.shutdown(wait=False)
+    return futuro
+
+def medias_mercado():
+    """(selic, ipca, juros real) e se já vieram do Banco Central; até lá, valores padrão."""
+    futuro = medias_em_segundo_plano()
+    if not futuro.done():
+        return MEDIAS_PADRAO, False
     try:
-        df_ipca = buscar_serie_bcb(433, inicio.strftime("%d/%m/%Y"), fim.strftime("%d/%m/%Y"))
-        df_selic = buscar_serie_bcb(4390, inicio.strftime("%d/%m/%Y"), fim.strftime("%d/%m/%Y"))
-        df = df_selic.join(df_ipca, lsuffix="_selic", rsuffix="_ipca").dropna()
+        return futuro.result(), True
+    except Exception:
+        return MEDIAS_PADRAO, True
+
+@st.fragment(run_every=1.0)
+def aguardar_medias():
+    """Recarrega a página assim que as médias históricas chegam."""
+    if medias_em_segundo_plano().done():
+        st.rerun(scope="app")
+    st.caption("⏳ Buscando médias históricas no Banco Central; usando valores padrão por enquanto.")
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def planilha_simulacao(idades, montantes, aporte_int, patrimonio_final, anos_aporte, percentual,
+                       regime, percentual_ir_efetivo, parametros):
+    """Bytes do Excel da simulação, memorizados pelo hash dos argumentos (gerado só no download)."""
+    from exportacao import gerar_excel
+
+    return gerar_excel(
+        idades, montantes, aporte_int, patrimonio_final, anos_aporte, percentual,
+        regime, percentual_ir_efetivo, dict(parametros)
+    ).getvalue()
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def planilha_cenarios(comparacao, evolucao):
+    """Bytes do Excel com a tabela comparativa e a evolução de todos os cenários."""
+    from exportacao import exportar_planilhas
+
+    return exportar_planilhas({"Comparação": dict(comparacao), "Evolução": dict(evolucao)}).getvalue()
+
+def obter_cache():
+    """Cache de cálculos: do processo (entre sessões) ou exclusivo da sessão."""
+    if CACHE_COMPARTILHADO:
+        return cache_processo()
+    if "cache_calculos" not in st.session_state:
+        st.session_state["cache_calculos"] = CacheLRU(max_itens=32)
+    return st.session_state["cache_calculos"]
+
+def modo_debug():
+    """Painel de instrumentação: `?debug=1` na URL ou DEBUG_INSTRUMENTACAO=1."""
+    return st.query_params.get("debug") == "1" or os.environ.get("DEBUG_INSTRUMENTACAO") == "1"
+
+def exibir_instrumentacao(resumo):
+    with st.expander("🛠️ Instrumentação", expanded=True):
+        st.caption(f"Execução completa em {resumo['duracao_s'] * 1000:.1f} ms")
+        if resumo["spans"]:
+            spans = [{"nome": span["nome"], "ms": span["segundos"] * 1000} for span in resumo["spans"]]
+            st.dataframe(spans, hide_index=True, width="stretch")
+        st.json(resumo["contadores"])
+        st.code(METRICAS.exportar_prometheus(), language="text")
+
+def grafico_patrimonio(df_chart):
+    import altair as alt
+
+    return alt.Chart(df_chart).mark_line(interpolate="monotone").encode(
+        x=alt.X("Idade", title="Idade", axis=alt.Axis(format=".0f")),
+        y=alt.Y("Montante", title="Patrimônio acumulado", axis=alt.Axis(format=".2s")),
+        tooltip=[
+            alt.Tooltip("Idade", title="Idade", format=".0f"),
+            alt.Tooltip("Montante formatado", title="Montante")
+        ]
+    ).properties(width=700, height=400)
 
-        ipca_mensal = df["valor_ipca"] / 100
-        selic_mensal = df["valor_selic"] / 100
-        juros_real_mensal = (1 + selic_mensal) / (1 + ipca_mensal) - 1
-        media_juros_real = (1 + juros_real_mensal.mean()) ** 12 - 1
+def grafico_cenarios(df_cenarios):
+    import altair as alt
 
-        return round((1 + selic_mensal.mean()) ** 12 - 1 * 100, 2), round((1 + ipca_mensal.mean()) ** 12 - 1 * 100, 2), round(media_juros_real * 100, 2)
-    except:
-        return 9.5, 5.0, 4.5
+    return alt.Chart(df_cenarios).mark_line(interpolate="monotone").encode(
+        x=alt.X("Idade", title="Idade", axis=alt.Axis(format=".0f")),
+        y=alt.Y("Montante", title="Patrimônio acumulado", axis=alt.Axis(format=".2s")),
+        color=alt.Color("Cenario", title="Cenário"),
+        tooltip=[
+            alt.Tooltip("Cenario", title="Cenário"),
+            alt.Tooltip("Idade", title="Idade", format=".0f"),
+            alt.Tooltip("Montante formatado", title="Montante")
+        ]
+    ).properties(height=400)
+
+def cenarios_iniciais(idade_atual, idade_aposentadoria, expectativa_vida, taxa_juros, modo, valor_alvo):
+    """Plano atual e variações de idade de aposentadoria como ponto de partida da comparação."""
+    cenarios = []
+    for nome, idade in (("Atual", idade_aposentadoria), ("Aposentar 5 anos antes", idade_aposentadoria - 5),
+                        ("Aposentar 5 anos depois", idade_aposentadoria + 5)):
+        if idade_atual < idade < expectativa_vida:
+            cenarios.append({
+                "Cenário": nome, "Idade de aposentadoria": idade, "Rentabilidade (% a.a.)": taxa_juros,
+                "Objetivo": modo, "Valor alvo (R$)": valor_alvo or 0.0,
+            })
+    return cenarios
+
+def mapa_sensibilidade(linhas):
+    """Heatmap do aporte por idade e rentabilidade; None enquanto não há célula viável."""
+    import altair as alt
+    import pandas as pd
+    from resultados import formatar_moeda_serie
+
+    df_grade = pd.DataFrame(linhas).dropna(subset=["aporte_mensal"])
+    if df_grade.empty:
+        return None
+    df_grade["Rentabilidade"] = df_grade["rentabilidade_anual"] * 100
+    df_grade["Aporte formatado"] = formatar_moeda_serie(df_grade["aporte_mensal"]).to_numpy()
+    return alt.Chart(df_grade).mark_rect().encode(
+        x=alt.X("Rentabilidade:O", title="Rentabilidade real (% a.a.)"),
+        y=alt.Y("idade_aposentadoria:O", title="Idade de aposentadoria"),
+        color=alt.Color("aporte_mensal:Q", title="Aporte mensal", scale=alt.Scale(scheme="greens")),
+        tooltip=[
+            alt.Tooltip("idade_aposentadoria:O", title="Idade"),
+            alt.Tooltip("Rentabilidade:O", title="Rentabilidade (%)"),
+            alt.Tooltip("Aporte formatado", title="Aporte"),
+            alt.Tooltip("regime", title="Tributação"),
+        ]
+    ).properties(height=400)
+
+def acompanhar_grade(identificador):
+    """Progresso da grade enquanto roda (atualizado a cada segundo) e o mapa ao terminar."""
+    tarefa = fila_processo().consultar(identificador)
+    if tarefa is None:
+        st.caption("O cálculo da grade não está mais disponível; gere o mapa novamente.")
+        return
+    if tarefa["estado"] not in ESTADOS_FINAIS:
+        st.fragment(acompanhar_grade_em_andamento, run_every=1.0)(identificador)
+        return
+
+    linhas = tarefa["resultado"] or []
+    total = len(tarefa["parametros"]["idades_aposentadoria"]) * len(tarefa["parametros"]["rentabilidades"])
+    if tarefa["estado"] == FALHOU:
+        st.error(f"Falha ao calcular a grade: {tarefa['erro']}")
+    elif tarefa["estado"] == CANCELADA:
+        st.info("Cálculo da grade cancelado.")
+    elif len(linhas) < total:
+        st.warning(f"Tempo máximo atingido: {len(linhas)} de {total} cenários calculados.")
+    mapa = mapa_sensibilidade(linhas) if linhas else None
+    if mapa is not None:
+        st.altair_chart(mapa, width="stretch")
+
+def acompanhar_grade_em_andamento(identificador):
+    tarefa = fila_processo().consultar(identificador)
+    if tarefa is None or tarefa["estado"] in ESTADOS_FINAIS:
+        st.rerun(scope="app")
+    st.progress(tarefa["progresso"] or 0.0, text=tarefa["mensagem"] or "Na fila...")
+    if st.button("✖️ Cancelar cálculo", key="cancelar_grade"):
+        fila_processo().cancelar(identificador)
+    # O mapa vai sendo preenchido com as linhas parciais gravadas junto do progresso.
+    mapa = mapa_sensibilidade(tarefa["resultado"]) if tarefa["resultado"] else None
+    if mapa is not None:
+        st.altair_chart(mapa, width="stretch")
 
 def calcular_percentual_ir(total_ir, renda_liquida, expectativa_vida, idade_aposentadoria):
     meses_saque = (expectativa_vida - idade_aposentadoria) * 12
     total_sacado = renda_liquida * meses_saque
     return total_ir / total_sacado if total_sacado > 0 else 0
 
-def gerar_excel(df_chart, aporte_int, patrimonio_final, anos_aporte, percentual, regime, percentual_ir_efetivo, parametros):
-    output = BytesIO()
-    with pd.ExcelWriter(output, engine="xlsxwriter") as writer:
-        workbook = writer.book
-
-        ws1 = workbook.add_worksheet("Simulação")
-        writer.sheets["Simulação"] = ws1
-        money = workbook.add_format({'num_format': 'R$ #,##0'})
-        percent_fmt = workbook.add_format({'num_format': '0%'})
-        header_format = workbook.add_format({'bold': True, 'bg_color': '#123934', 'font_color': 'white'})
-
-        ws1.write("B2", "💰 Aporte mensal")
-        ws1.write("B3", aporte_int, money)
-        ws1.write("C2", "🏦 Poupança necessária")
-        ws1.write("C3", patrimonio_final, money)
-        ws1.write("D2", "📆 Anos de aportes")
-        ws1.write("D3", anos_aporte)
-        ws1.write("E2", "📊 % da renda atual")
-        ws1.write("E3", percentual / 100, percent_fmt)
-        ws1.write("F2", "🧾 Tributação")
-        ws1.write("F3", f"Tabela {regime.capitalize()}")
-        ws1.write("G2", "📉 Carga efetiva IR")
-        ws1.write("G3", percentual_ir_efetivo, percent_fmt)
-
-        ws1.write("A6", "Idade", header_format)
-        ws1.write("B6", "Patrimônio", header_format)
-
-        for i, row in df_chart.iterrows():
-            ws1.write(i + 6, 0, int(row["Idade"]))
-            ws1.write(i + 6, 1, row["Montante"], money)
-        ws1.set_column("A:Z", 22)
-
-        ws2 = workbook.add_worksheet("Parametros")
-        writer.sheets["Parametros"] = ws2
-        for i, (chave, valor) in enumerate(parametros.items()):
-            ws2.write(i, 0, chave)
-            ws2.write(i, 1, valor)
-        ws2.set_column("A:B", 30)
-
-    output.seek(0)
-    return output
-
 def verificar_mensagens(idade_atual, idade_aposentadoria, expectativa_vida, renda_atual, taxa_juros, renda_desejada, aporte):
     erros, alertas, informativos = [], [], []
     tempo_aporte = idade_aposentadoria - idade_atual
@@ -179,172 +289,311 @@ def check_password():
         st.text_input("Digite a senha", type="password", on_change=password_entered, key="password")
         st.stop()
 
-check_password()
-
-st.markdown('<div class="header"><img src="https://i.imgur.com/iCRuacp.png" alt="Logo Sow Capital"></div>', unsafe_allow_html=True)
-st.title("Wealth Planning")
+def main():
+    """Página da calculadora, executada dentro de uma requisição instrumentada."""
+    st.markdown('<div class="header"><img src="https://i.imgur.com/iCRuacp.png" alt="Logo Sow Capital"></div>', unsafe_allow_html=True)
+    st.title("Wealth Planning")
 
-selic_media, ipca_media, juros_real_medio = calcular_medias_historicas()
+    (selic_media, ipca_media, juros_real_medio), medias_prontas = medias_mercado()
 
-st.markdown("### 📋 Dados Iniciais")
-renda_atual = campo_monetario("Renda atual (R$)", "10.000")
-idade_atual = st.number_input("Idade atual", min_value=18.0, max_value=100.0, value=30.0, format="%.0f")
-poupanca = campo_monetario("Poupança atual (R$)", "50.000")
+    st.markdown("### 📋 Dados Iniciais")
+    renda_atual = campo_monetario("Renda atual (R$)", "10.000")
+    idade_atual = st.number_input("Idade atual", min_value=18.0, max_value=100.0, value=30.0, format="%.0f")
+    poupanca = campo_monetario("Poupança atual (R$)", "50.000")
 
-st.divider()
+    st.divider()
 
-st.markdown("### 📊 Dados Econômicos")
-st.markdown(f"🔎 Juros real médio histórico: **{juros_real_medio:.2f}% a.a.**")
-taxa_juros = st.number_input("Rentabilidade real esperada (% a.a.)", min_value=0.0, max_value=100.0, value=juros_real_medio, format="%.2f")
+    st.markdown("### 📊 Dados Econômicos")
+    st.markdown(f"🔎 Juros real médio histórico: **{juros_real_medio:.2f}% a.a.**")
+    if not medias_prontas:
+        aguardar_medias()
+    # A sugestão acompanha a média histórica enquanto o usuário não editar o campo.
+    sugestao_anterior = st.session_state.get("taxa_juros_sugerida")
+    if st.session_state.get("taxa_juros") in (None, sugestao_anterior):
+        st.session_state["taxa_juros"] = juros_real_medio
+    st.session_state["taxa_juros_sugerida"] = juros_real_medio
+    taxa_juros = st.number_input("Rentabilidade real esperada (% a.a.)", min_value=0.0, max_value=100.0, format="%.2f", key="taxa_juros")
 
-st.divider()
+    st.divider()
 
-st.markdown("### 🧾 Renda desejada na aposentadoria")
-renda_desejada = campo_monetario("Renda mensal desejada (R$)", "15.000")
-plano_saude = campo_monetario("Plano de saúde (R$)", "0")
-outras_despesas = campo_monetario("Outras despesas planejadas (R$)", "0")
+    st.markdown("### 🧾 Renda desejada na aposentadoria")
+    renda_desejada = campo_monetario("Renda mensal desejada (R$)", "15.000")
+    plano_saude = campo_monetario("Plano de saúde (R$)", "0")
+    outras_despesas = campo_monetario("Outras despesas planejadas (R$)", "0")
 
-st.divider()
+    st.divider()
 
-st.markdown("### 💸 Renda passiva estimada")
-previdencia = campo_monetario("Renda com previdência (R$)", "0")
-aluguel_ou_outras = campo_monetario("Aluguel ou outras fontes de renda (R$)", "0")
+    st.markdown("### 💸 Renda passiva estimada")
+    previdencia = campo_monetario("Renda com previdência (R$)", "0")
+    aluguel_ou_outras = campo_monetario("Aluguel ou outras fontes de renda (R$)", "0")
 
-st.divider()
+    st.divider()
 
-st.markdown("### 🧓 Dados da aposentadoria")
-idade_aposentadoria = st.number_input("Idade para aposentadoria", min_value=idade_atual + 1, max_value=100.0, value=65.0, format="%.0f")
-expectativa_vida = st.number_input("Expectativa de vida", min_value=idade_aposentadoria + 1, max_value=120.0, value=90.0, format="%.0f")
+    st.markdown("### 🧓 Dados da aposentadoria")
+    idade_aposentadoria = st.number_input("Idade para aposentadoria", min_value=idade_atual + 1, max_value=100.0, value=65.0, format="%.0f")
+    expectativa_vida = st.number_input("Expectativa de vida", min_value=idade_aposentadoria + 1, max_value=120.0, value=90.0, format="%.0f")
 
-st.divider()
+    st.divider()
 
-st.markdown("### 🎯 Objetivo Final")
-modo = st.selectbox("Objetivo com o patrimônio", ["manter", "zerar", "atingir"])
-outro_valor = campo_monetario("Valor alvo (R$)", "0") if modo == "atingir" else None
+    st.markdown("### 🎯 Objetivo Final")
+    modo = st.selectbox("Objetivo com o patrimônio", ["manter", "zerar", "atingir"])
+    outro_valor = campo_monetario("Valor alvo (R$)", "0") if modo == "atingir" else None
 
-if st.button("📈 Calcular"):
     renda_passiva_total = previdencia + aluguel_ou_outras
     despesas_adicionais = plano_saude + outras_despesas
     renda_liquida = max(renda_desejada + despesas_adicionais - renda_passiva_total, 0)
 
-    erros, alertas, informativos = verificar_mensagens(
-        idade_atual=int(idade_atual),
-        idade_aposentadoria=int(idade_aposentadoria),
-        expectativa_vida=int(expectativa_vida),
-        renda_atual=renda_atual,
-        taxa_juros=taxa_juros / 100,
-        renda_desejada=renda_desejada,
-        aporte=None
+    if st.button("📈 Calcular"):
+        erros, alertas, informativos = verificar_mensagens(
+            idade_atual=int(idade_atual),
+            idade_aposentadoria=int(idade_aposentadoria),
+            expectativa_vida=int(expectativa_vida),
+            renda_atual=renda_atual,
+            taxa_juros=taxa_juros / 100,
+            renda_desejada=renda_desejada,
+            aporte=None
+        )
+
+        for msg in erros:
+            st.error(msg)
+        for msg in alertas:
+            st.warning(msg)
+        for msg in informativos:
+            st.info(msg)
+
+        if erros:
+            return
+
+        with medir("calcular_aporte_cacheado"):
+            resultado = calcular_aporte_cacheado(
+                int(idade_atual), int(idade_aposentadoria), int(expectativa_vida),
+                poupanca, renda_liquida, taxa_juros / 100,
+                modo=modo, valor_final_desejado=outro_valor,
+                modo_historico="anual", cache=obter_cache()
+            )
+
+        aporte = resultado.get("aporte_mensal")
+        regime = resultado.get("regime")
+
+        erros, alertas, informativos = verificar_mensagens(
+            idade_atual=int(idade_atual),
+            idade_aposentadoria=int(idade_aposentadoria),
+            expectativa_vida=int(expectativa_vida),
+            renda_atual=renda_atual,
+            taxa_juros=taxa_juros / 100,
+            renda_desejada=renda_desejada,
+            aporte=aporte
+        )
+
+        for msg in erros:
+            st.error(msg)
+        for msg in alertas:
+            st.warning(msg)
+        for msg in informativos:
+            st.info(msg)
+
+        if aporte is None:
+            if resultado.get("motivo") == "inviavel" and resultado.get("deficit"):
+                st.warning(
+                    "Com os parâmetros informados, não é possível atingir o objetivo de aposentadoria: "
+                    f"mesmo com o aporte máximo ainda faltariam {formatar_moeda(resultado['deficit'])} no fim do período."
+                )
+            else:
+                st.warning("Com os parâmetros informados, não é possível atingir o objetivo de aposentadoria.")
+            return
+        if aporte == 0:
+            st.success("🎉 Sua poupança atual já é suficiente. Nenhum aporte mensal é necessário.")
+            return
+
+        patrimonio = resultado["historico"]
+        total_ir = resultado["total_ir"]
+
+        anos_aporte = int(idade_aposentadoria - idade_atual)
+        percentual_ir_efetivo = calcular_percentual_ir(total_ir, renda_liquida, int(expectativa_vida), int(idade_aposentadoria))
+        percentual = int(aporte / renda_atual * 100)
+        patrimonio_final = int(patrimonio[anos_aporte])
+        aporte_int = int(aporte)
+
+        st.info(f"🧾 Tributação otimizada: **Tabela {regime.capitalize()}** | 📉 Carga tributária média efetiva: **{percentual_ir_efetivo:.2%}**")
+
+        col1, col2 = st.columns(2)
+        with col1:
+            st.markdown("#### 💰 Aporte mensal")
+            st.markdown(f"<h3 style='margin-top:0'>{formatar_moeda(aporte_int)}</h3>", unsafe_allow_html=True)
+            st.markdown("#### 🏦 Poupança necessária")
+            st.markdown(f"<h3 style='margin-top:0'>{formatar_moeda(patrimonio_final)}</h3>", unsafe_allow_html=True)
+        with col2:
+            st.markdown("#### 📆 Anos de aportes")
+            st.markdown(f"<h3 style='margin-top:0'>{anos_aporte} anos</h3>", unsafe_allow_html=True)
+            st.markdown("#### 📊 % da renda atual")
+            st.markdown(f"<h3 style='margin-top:0'>{percentual}%</h3>", unsafe_allow_html=True)
+
+        with medir("grafico"):
+            from resultados import serie_patrimonio
+
+            df_chart = serie_patrimonio(patrimonio, int(idade_atual), passo_historico=12)
+            st.altair_chart(grafico_patrimonio(df_chart), width="stretch")
+
+        parametros = {
+            "Idade atual": idade_atual,
+            "Idade aposentadoria": idade_aposentadoria,
+            "Expectativa de vida": expectativa_vida,
+            "Renda atual": renda_atual,
+            "Renda desejada": renda_desejada,
+            "Plano de saúde": plano_saude,
+            "Outras despesas": outras_despesas,
+            "Renda passiva previdência": previdencia,
+            "Renda passiva aluguel": aluguel_ou_outras,
+            "Poupança atual": poupanca,
+            "Taxa real esperada": taxa_juros,
+            "Objetivo": modo,
+            "Valor alvo (atingir)": outro_valor or 0,
+        }
+
+        st.download_button(
+            label="📥 Baixar Excel",
+            data=partial(
+                planilha_simulacao,
+                tuple(df_chart["Idade"].astype(int).tolist()), tuple(df_chart["Montante"].tolist()),
+                aporte_int, patrimonio_final, anos_aporte, percentual, regime, percentual_ir_efetivo,
+                tuple(parametros.items())
+            ),
+            file_name="simulacao_aposentadoria.xlsx",
+            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            on_click="ignore"
+        )
+
+    st.divider()
+
+    st.markdown("### ⚖️ Comparar cenários")
+    st.caption("Cada linha é um plano; idade atual, expectativa de vida, poupança e renda vêm dos campos acima.")
+    cenarios_editados = st.data_editor(
+        cenarios_iniciais(int(idade_atual), int(idade_aposentadoria), int(expectativa_vida), taxa_juros, modo, outro_valor),
+        num_rows="dynamic", hide_index=True, width="stretch", key="cenarios",
+        column_config={
+            "Idade de aposentadoria": st.column_config.NumberColumn(min_value=int(idade_atual) + 1, step=1),
+            "Rentabilidade (% a.a.)": st.column_config.NumberColumn(min_value=0.0, max_value=100.0, format="%.2f"),
+            "Objetivo": st.column_config.SelectboxColumn(options=["manter", "zerar", "atingir"]),
+            "Valor alvo (R$)": st.column_config.NumberColumn(min_value=0.0, format="%.0f"),
+        },
     )
 
-    for msg in erros:
-        st.error(msg)
-    for msg in alertas:
-        st.warning(msg)
-    for msg in informativos:
-        st.info(msg)
+    if st.button("⚖️ Comparar cenários"):
+        cenarios, nomes = [], set()
+        for i, linha in enumerate(cenarios_editados, start=1):
+            idade = linha.get("Idade de aposentadoria")
+            if idade is None or linha.get("Rentabilidade (% a.a.)") is None or not int(idade_atual) < idade < int(expectativa_vida):
+                continue
+            nome = linha.get("Cenário") or f"Cenário {i}"
+            nome = f"{nome} ({i})" if nome in nomes else nome
+            nomes.add(nome)
+            cenarios.append({
+                "nome": nome,
+                "idade_atual": int(idade_atual),
+                "idade_aposentadoria": int(idade),
+                "expectativa_vida": int(expectativa_vida),
+                "poupanca_inicial": poupanca,
+                "renda_mensal": renda_liquida,
+                "rentabilidade_anual": linha["Rentabilidade (% a.a.)"] / 100,
+                "modo": linha.get("Objetivo") or "manter",
+                "valor_final_desejado": linha.get("Valor alvo (R$)") or None,
+            })
+        if len(cenarios) < len(cenarios_editados):
+            st.warning("Linhas incompletas ou com idade de aposentadoria fora do intervalo foram ignoradas.")
+
+        with medir("comparar_cenarios"):
+            tabela = comparar_cenarios(cenarios, modo_historico="anual")
+
+        if tabela:
+            from resultados import formatar_moeda_serie, quadro_cenarios
+
+            comparacao = {
+                "Cenário": [linha["nome"] for linha in tabela],
+                "Idade de aposentadoria": [linha["idade_aposentadoria"] for linha in tabela],
+                "Rentabilidade (% a.a.)": [linha["rentabilidade_anual"] * 100 for linha in tabela],
+                "Objetivo": [linha["modo"] for linha in tabela],
+                "Aporte mensal": [linha["aporte_mensal"] for linha in tabela],
+                "Tributação": [linha["regime"] for linha in tabela],
+                "Patrimônio na aposentadoria": [linha["patrimonio_aposentadoria"] for linha in tabela],
+                "Saldo final": [linha["saldo_final"] for linha in tabela],
+                "IR total": [linha["total_ir"] for linha in tabela],
+            }
+            exibicao = dict(comparacao)
+            for coluna in ("Aporte mensal", "Patrimônio na aposentadoria", "Saldo final", "IR total"):
+                exibicao[coluna] = [
+                    None if valor is None else formatado
+                    for valor, formatado in zip(comparacao[coluna], formatar_moeda_serie(
+                        [0.0 if valor is None else valor for valor in comparacao[coluna]]
+                    ))
+                ]
+            st.dataframe(exibicao, hide_index=True, width="stretch")
+
+            historicos = {linha["nome"]: linha["historico"] for linha in tabela if linha["historico"] is not None}
+            if historicos:
+                df_cenarios = quadro_cenarios(historicos, int(idade_atual), passo_historico=12)
+                st.altair_chart(grafico_cenarios(df_cenarios), width="stretch")
+                evolucao = {
+                    "Cenário": tuple(df_cenarios["Cenario"].tolist()),
+                    "Idade": tuple(df_cenarios["Idade"].astype(int).tolist()),
+                    "Patrimônio": tuple(df_cenarios["Montante"].tolist()),
+                }
+                st.download_button(
+                    label="📥 Baixar comparação (Excel)",
+                    data=partial(
+                        planilha_cenarios,
+                        tuple((coluna, tuple(valores)) for coluna, valores in comparacao.items()),
+                        tuple(evolucao.items())
+                    ),
+                    file_name="comparacao_cenarios.xlsx",
+                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                    on_click="ignore"
+                )
+            if any(linha["aporte_mensal"] is None for linha in tabela):
+                st.warning("Alguns cenários não atingem o objetivo com os parâmetros informados.")
+
+    st.divider()
+
+    st.markdown("### 🔥 Sensibilidade do aporte")
+    idade_min_grade = int(idade_atual) + 1
+    idade_max_grade = max(int(expectativa_vida) - 1, idade_min_grade)
+    col_idades, col_taxas = st.columns(2)
+    with col_idades:
+        faixa_idades = st.slider(
+            "Idades de aposentadoria", idade_min_grade, idade_max_grade,
+            (idade_min_grade, min(int(idade_aposentadoria) + 5, idade_max_grade))
+        )
+    with col_taxas:
+        faixa_taxas = st.slider("Rentabilidade real (% a.a.)", 0.0, 15.0, (2.0, 8.0), step=0.5)
+    prazo_grade = st.slider("Tempo máximo de cálculo (s)", 5, 120, 30)
+
+    if st.button("🔥 Gerar mapa de sensibilidade"):
+        idades_grade = list(range(faixa_idades[0], faixa_idades[1] + 1))
+        taxas_grade = [round(faixa_taxas[0] + 0.5 * i, 2) for i in range(int((faixa_taxas[1] - faixa_taxas[0]) / 0.5) + 1)]
+        st.session_state["tarefa_grade"] = fila_processo().submeter("grade_sensibilidade", {
+            "idade_atual": int(idade_atual),
+            "poupanca_inicial": poupanca,
+            "idades_aposentadoria": idades_grade,
+            "rentabilidades": [t / 100 for t in taxas_grade],
+            "rendas": [renda_liquida],
+            "expectativas": [int(expectativa_vida)],
+            "modo": modo,
+            "valor_final_desejado": outro_valor,
+            "prazo": prazo_grade,
+        })
+        # Na URL, o id sobrevive a recarregar a página ou reconectar.
+        st.query_params["grade"] = st.session_state["tarefa_grade"]
+
+    tarefa_grade = st.session_state.get("tarefa_grade") or st.query_params.get("grade")
+    if tarefa_grade:
+        acompanhar_grade(tarefa_grade)
 
-    if erros:
-        st.stop()
-
-    resultado = calcular_aporte(
-        int(idade_atual), int(idade_aposentadoria), int(expectativa_vida),
-        poupanca, renda_liquida, taxa_juros / 100,
-        imposto=None, modo=modo, valor_final_desejado=outro_valor
-    )
-
-    aporte = resultado.get("aporte_mensal")
-    regime = resultado.get("regime")
-
-    erros, alertas, informativos = verificar_mensagens(
-        idade_atual=int(idade_atual),
-        idade_aposentadoria=int(idade_aposentadoria),
-        expectativa_vida=int(expectativa_vida),
-        renda_atual=renda_atual,
-        taxa_juros=taxa_juros / 100,
-        renda_desejada=renda_desejada,
-        aporte=aporte
-    )
-
-    for msg in erros:
-        st.error(msg)
-    for msg in alertas:
-        st.warning(msg)
-    for msg in informativos:
-        st.info(msg)
-
-    if aporte is None:
-        st.warning("Com os parâmetros informados, não é possível atingir o objetivo de aposentadoria.")
-        st.stop()
-    if aporte == 0:
-        st.success("🎉 Sua poupança atual já é suficiente. Nenhum aporte mensal é necessário.")
-        st.stop()
-
-    func_ir_final = (lambda v, m, a: ir_progressivo(v)) if regime == "progressivo" else ir_regressivo
-    _, _, patrimonio, total_ir = simular_aposentadoria(
-        int(idade_atual), int(idade_aposentadoria), int(expectativa_vida),
-        poupanca, aporte, renda_liquida, taxa_juros / 100, func_ir_final
-    )
-
-    anos_aporte = int(idade_aposentadoria - idade_atual)
-    percentual_ir_efetivo = calcular_percentual_ir(total_ir, renda_liquida, int(expectativa_vida), int(idade_aposentadoria))
-    percentual = int(aporte / renda_atual * 100)
-    patrimonio_final = int(patrimonio[anos_aporte * 12])
-    aporte_int = int(aporte)
-
-    st.info(f"🧾 Tributação otimizada: **Tabela {regime.capitalize()}** | 📉 Carga tributária média efetiva: **{percentual_ir_efetivo:.2%}**")
-
-    col1, col2 = st.columns(2)
-    with col1:
-        st.markdown("#### 💰 Aporte mensal")
-        st.markdown(f"<h3 style='margin-top:0'>{formatar_moeda(aporte_int)}</h3>", unsafe_allow_html=True)
-        st.markdown("#### 🏦 Poupança necessária")
-        st.markdown(f"<h3 style='margin-top:0'>{formatar_moeda(patrimonio_final)}</h3>", unsafe_allow_html=True)
-    with col2:
-        st.markdown("#### 📆 Anos de aportes")
-        st.markdown(f"<h3 style='margin-top:0'>{anos_aporte} anos</h3>", unsafe_allow_html=True)
-        st.markdown("#### 📊 % da renda atual")
-        st.markdown(f"<h3 style='margin-top:0'>{percentual}%</h3>", unsafe_allow_html=True)
-
-    df_chart = pd.DataFrame({
-        "Idade": [idade_atual + i / 12 for i in range(len(patrimonio))],
-        "Montante": patrimonio
-    })
-    df_chart = df_chart[df_chart["Idade"] % 1 == 0].reset_index(drop=True)
-    df_chart["Montante formatado"] = df_chart["Montante"].apply(lambda v: formatar_moeda(v, 0))
-
-    chart = alt.Chart(df_chart).mark_line(interpolate="monotone").encode(
-        x=alt.X("Idade", title="Idade", axis=alt.Axis(format=".0f")),
-        y=alt.Y("Montante", title="Patrimônio acumulado", axis=alt.Axis(format=".2s")),
-        tooltip=[
-            alt.Tooltip("Idade", title="Idade", format=".0f"),
-            alt.Tooltip("Montante formatado", title="Montante")
-        ]
-    ).properties(width=700, height=400)
-    st.altair_chart(chart, use_container_width=True)
-
-    parametros = {
-        "Idade atual": idade_atual,
-        "Idade aposentadoria": idade_aposentadoria,
-        "Expectativa de vida": expectativa_vida,
-        "Renda atual": renda_atual,
-        "Renda desejada": renda_desejada,
-        "Plano de saúde": plano_saude,
-        "Outras despesas": outras_despesas,
-        "Renda passiva previdência": previdencia,
-        "Renda passiva aluguel": aluguel_ou_outras,
-        "Poupança atual": poupanca,
-        "Taxa real esperada": taxa_juros,
-        "Objetivo": modo,
-        "Valor alvo (atingir)": outro_valor or 0,
-    }
-
-    st.download_button(
-        label="📥 Baixar Excel",
-        data=gerar_excel(df_chart, aporte_int, patrimonio_final, anos_aporte, percentual, regime, percentual_ir_efetivo, parametros),
-        file_name="simulacao_aposentadoria.xlsx",
-        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-    )
+check_password()
+# As saídas antecipadas da página são `return` em `main`: a requisição é sempre
+# encerrada e registrada, e o painel de depuração aparece também nesses caminhos.
+with requisicao("streamlit") as atual:
+    main()
+if modo_debug():
+    exibir_instrumentacao(atual.resumo())
 
 st.markdown("""
     <div class="footer">
@@ -0,0 +1,332 @@
+"""Fila local de tarefas longas (grade de sensibilidade, lote, Monte Carlo, cenários).
+
+Cada tarefa é gravada num banco SQLite com estado, progresso e resultado (JSON), e
+executada num pool de threads limitado. Assim a execução não depende do script do
+Streamlit: um rerun ou uma reconexão só voltam a consultar o banco pelo id. As
+tarefas pesadas delegam o cálculo aos pools de processos que já existem (grade e
+lote), então as threads aqui só orquestram e gravam o progresso. Esses pools usam
+"spawn": um fork feito de dentro do servidor, com outras threads rodando, pode
+herdar uma trava (de métricas ou de logging) que nunca será liberada no filho.
+
+O cancelamento é cooperativo: `Contexto.progresso` levanta `TarefaCancelada`
+quando a tarefa foi cancelada, e cada função de tarefa o chama entre etapas; a
+etapa em andamento (um bloco da grade ou do lote) termina antes de a tarefa parar.
+
+Cada tarefa registra o seu dono (máquina, pid e instância da fila). Ao abrir o banco,
+só são dadas como interrompidas as tarefas cujo dono não existe mais; tarefas
+terminadas há mais de `retencao` segundos são apagadas.
+"""
+import dataclasses
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional
+
+ARQUIVO_PADRAO = os.environ.get(
+    "TAREFAS_DB",
+    os.path.join(os.path.expanduser("~"), ".cache", "calculadora-aportes", "tarefas.sqlite3")
+)
+
+PENDENTE = "pendente"
+EXECUTANDO = "executando"
+CONCLUIDA = "concluida"
+FALHOU = "falhou"
+CANCELADA = "cancelada"
+ESTADOS_FINAIS = (CONCLUIDA, FALHOU, CANCELADA)
+MENSAGEM_CANCELAMENTO = "Cancelamento pedido; a etapa em andamento termina antes de parar."
+# Método de início dos pools de processos criados pelas tarefas.
+INICIO_PROCESSOS = "spawn"
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS tarefas (
+    id TEXT PRIMARY KEY,
+    tipo TEXT NOT NULL,
+    estado TEXT NOT NULL,
+    progresso REAL,
+    mensagem TEXT,
+    parametros TEXT NOT NULL,
+    resultado TEXT,
+    erro TEXT,
+    cancelar INTEGER NOT NULL DEFAULT 0,
+    criada_em REAL NOT NULL,
+    atualizada_em REAL NOT NULL,
+    dono TEXT
+)
+"""
+
+# Filas abertas neste processo: distingue as tarefas de uma fila viva das deixadas
+# por um processo anterior que teve o mesmo pid.
+_FILAS_ATIVAS = set()
+
+
+class TarefaCancelada(Exception):
+    """Levantada dentro da tarefa quando o cancelamento foi pedido."""
+
+# ==== TIPOS DE TAREFA ====
+
+TIPOS: Dict[str, Callable] = {}
+
+
+def tipo_tarefa(nome: str):
+    """Registra uma função `(parametros, contexto) -> resultado` como tipo de tarefa."""
+    def registrar(funcao):
+        TIPOS[nome] = funcao
+        return funcao
+    return registrar
+
+
+def _serializavel(valor):
+    """Converte arrays, arrays NumPy e dataclasses para tipos aceitos pelo JSON."""
+    if dataclasses.is_dataclass(valor):
+        return {campo.name: getattr(valor, campo.name) for campo in dataclasses.fields(valor)}
+    if isinstance(valor, array) or hasattr(valor, "tolist"):
+        return valor.tolist()
+    raise TypeError(f"{type(valor).__name__} não é serializável")
+
+
+@tipo_tarefa("grade_sensibilidade")
+def _tarefa_grade(parametros: dict, contexto: "Contexto") -> List[dict]:
+    from sensibilidade import iterar_grade_sensibilidade
+
+    total = len(parametros["rendas"]) * len(parametros["rentabilidades"]) * sum(
+        parametros["idade_atual"] < idade < expectativa
+        for idade in parametros["idades_aposentadoria"] for expectativa in parametros["expectativas"]
+    )
+    linhas = []
+    for bloco in iterar_grade_sensibilidade(**parametros, inicio_processos=INICIO_PROCESSOS):
+        linhas.extend(bloco)
+        contexto.progresso(len(linhas) / total if total else 1.0, f"{len(linhas)} de {total} cenários", parcial=linhas)
+    return linhas
+
+
+@tipo_tarefa("comparar_cenarios")
+def _tarefa_cenarios(parametros: dict, contexto: "Contexto") -> List[dict]:
+    from core import comparar_cenarios
+
+    return comparar_cenarios(**parametros)
+
+
+@tipo_tarefa("monte_carlo")
+def _tarefa_monte_carlo(parametros: dict, contexto: "Contexto"):
+    from monte_carlo import simular_monte_carlo
+
+    resultado = simular_monte_carlo(**parametros, progresso=lambda fracao: contexto.progresso(fracao))
+    return {
+        "idades": resultado.idades,
+        "faixas": {str(p): faixa for p, faixa in resultado.faixas.items()},
+        "saldo_final": {str(p): valor for p, valor in resultado.saldo_final.items()},
+        "probabilidade_ruina": resultado.probabilidade_ruina,
+        "probabilidade_sucesso": resultado.probabilidade_sucesso,
+        "n_trajetorias": resultado.n_trajetorias,
+    }
+
+
+@tipo_tarefa("lote")
+def _tarefa_lote(parametros: dict, contexto: "Contexto") -> dict:
+    from executar_lote import executar
+
+    return executar(
+        **parametros, inicio_processos=INICIO_PROCESSOS,
+        ao_concluir=lambda concluidos: contexto.progresso(None, f"{concluidos} registros"),
+    )
+
+# ==== EXECUÇÃO ====
+
+class Contexto:
+    """Canal da tarefa em execução para informar progresso e checar cancelamento."""
+
+    def __init__(self, fila: "FilaTarefas", identificador: str, intervalo: float = 0.25):
+        self.fila = fila
+        self.identificador = identificador
+        self.intervalo = intervalo
+        self._ultima_gravacao = 0.0
+
+    def progresso(self, fracao: Optional[float], mensagem: str = "", parcial=None) -> None:
+        """Grava o progresso (no máximo a cada `intervalo` segundos) e checa cancelamento.
+
+        `parcial`, se dado, é gravado como resultado provisório, para quem acompanha a
+        tarefa já exibir o que foi calculado.
+        """
+        agora = time.monotonic()
+        if agora - self._ultima_gravacao < self.intervalo and (fracao is None or fracao < 1):
+            return
+        self._ultima_gravacao = agora
+        campos = {"progresso": fracao, "mensagem": mensagem}
+        if parcial is not None:
+            campos["resultado"] = json.dumps(parcial, default=_serializavel)
+        cancelar = self.fila._atualizar(self.identificador, **campos)
+        if cancelar:
+            raise TarefaCancelada()
+
+
+class FilaTarefas:
+    """Submete, acompanha e cancela tarefas persistidas em SQLite."""
+
+    def __init__(self, caminho: str = ARQUIVO_PADRAO, max_trabalhadores: int = 2, retencao: float = 7 * 24 * 3600):
+        self.caminho = caminho
+        self.dono = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex}"
+        if os.path.dirname(caminho):
+            os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        with self._conectar() as conexao:
+            conexao.execute("PRAGMA journal_mode=WAL")
+            conexao.execute(_ESQUEMA)
+            colunas = {linha["name"] for linha in conexao.execute("PRAGMA table_info(tarefas)")}
+            if "dono" not in colunas:
+                conexao.execute("ALTER TABLE tarefas ADD COLUMN dono TEXT")
+            agora = time.time()
+            abertas = conexao.execute(
+                "SELECT id, dono FROM tarefas WHERE estado IN (?, ?)", (PENDENTE, EXECUTANDO)
+            ).fetchall()
+            # Só as tarefas de filas que não existem mais ficaram sem quem as execute.
+            conexao.executemany(
+                "UPDATE tarefas SET estado = ?, erro = ?, atualizada_em = ? WHERE id = ?",
+                [
+                    (FALHOU, "Interrompida pelo encerramento do servidor.", agora, linha["id"])
+                    for linha in abertas if _dono_encerrado(linha["dono"])
+                ],
+            )
+            conexao.execute(
+                "DELETE FROM tarefas WHERE estado IN (?, ?, ?) AND atualizada_em < ?",
+                (*ESTADOS_FINAIS, agora - retencao),
+            )
+        _FILAS_ATIVAS.add(self.dono)
+        self._executor = ThreadPoolExecutor(max_workers=max_trabalhadores, thread_name_prefix="tarefa")
+
+    @contextmanager
+    def _conectar(self) -> Iterator[sqlite3.Connection]:
+        """Conexão curta: confirma a transação ao sair do bloco e sempre fecha."""
+        conexao = sqlite3.connect(self.caminho, timeout=30)
+        conexao.row_factory = sqlite3.Row
+        try:
+            with conexao:
+                yield conexao
+        finally:
+            conexao.close()
+
+    def _atualizar(self, identificador: str, **campos) -> bool:
+        """Atualiza campos da tarefa e retorna se o cancelamento foi pedido."""
+        campos["atualizada_em"] = time.time()
+        atribuicoes = ", ".join(f"{campo} = ?" for campo in campos)
+        with self._conectar() as conexao:
+            conexao.execute(f"UPDATE tarefas SET {atribuicoes} WHERE id = ?", (*campos.values(), identificador))
+            linha = conexao.execute("SELECT cancelar FROM tarefas WHERE id = ?", (identificador,)).fetchone()
+        return bool(linha and linha["cancelar"])
+
+    def submeter(self, tipo: str, parametros: dict) -> str:
+        """Enfileira a tarefa e retorna o seu id."""
+        if tipo not in TIPOS:
+            raise ValueError(f"Tipo de tarefa desconhecido: {tipo}. Use um de {', '.join(TIPOS)}.")
+        identificador = uuid.uuid4().hex
+        agora = time.time()
+        with self._conectar() as conexao:
+            conexao.execute(
+                "INSERT INTO tarefas (id, tipo, estado, progresso, mensagem, parametros, criada_em, atualizada_em, dono)"
+                " VALUES (?, ?, ?, 0, '', ?, ?, ?, ?)",
+                (identificador, tipo, PENDENTE, json.dumps(parametros, default=_serializavel), agora, agora, self.dono),
+            )
+        self._executor.submit(self._executar, identificador, tipo, parametros)
+        return identificador
+
+    def _executar(self, identificador: str, tipo: str, parametros: dict) -> None:
+        if self._atualizar(identificador, estado=EXECUTANDO):
+            self._atualizar(identificador, estado=CANCELADA)
+            return
+        try:
+            resultado = TIPOS[tipo](parametros, Contexto(self, identificador))
+        except TarefaCancelada:
+            self._atualizar(identificador, estado=CANCELADA)
+        except Exception as erro:
+            self._atualizar(identificador, estado=FALHOU, erro=f"{type(erro).__name__}: {erro}")
+        else:
+            self._atualizar(
+                identificador, estado=CONCLUIDA, progresso=1.0, mensagem="Concluída",
+                resultado=json.dumps(resultado, default=_serializavel),
+            )
+
+    def consultar(self, identificador: str) -> Optional[dict]:
+        """Estado da tarefa; enquanto ela roda, `resultado` é o parcial gravado (se houver)."""
+        with self._conectar() as conexao:
+            linha = conexao.execute("SELECT * FROM tarefas WHERE id = ?", (identificador,)).fetchone()
+        if linha is None:
+            return None
+        tarefa = dict(linha)
+        tarefa["parametros"] = json.loads(tarefa["parametros"])
+        tarefa["resultado"] = json.loads(tarefa["resultado"]) if tarefa["resultado"] is not None else None
+        tarefa["cancelar"] = bool(tarefa["cancelar"])
+        return tarefa
+
+    def listar(self, limite: int = 20, tipo: Optional[str] = None) -> List[dict]:
+        """Tarefas mais recentes (sem parâmetros nem resultado)."""
+        consulta = "SELECT id, tipo, estado, progresso, mensagem, erro, criada_em, atualizada_em FROM tarefas"
+        argumentos: tuple = ()
+        if tipo is not None:
+            consulta += " WHERE tipo = ?"
+            argumentos = (tipo,)
+        with self._conectar() as conexao:
+            linhas = conexao.execute(consulta + " ORDER BY criada_em DESC LIMIT ?", (*argumentos, limite)).fetchall()
+        return [dict(linha) for linha in linhas]
+
+    def cancelar(self, identificador: str) -> bool:
+        """Pede o cancelamento; retorna False se a tarefa não existe ou já terminou."""
+        with self._conectar() as conexao:
+            cursor = conexao.execute(
+                "UPDATE tarefas SET cancelar = 1, mensagem = ?, atualizada_em = ?"
+                " WHERE id = ? AND estado NOT IN (?, ?, ?)",
+                (MENSAGEM_CANCELAMENTO, time.time(), identificador, *ESTADOS_FINAIS),
+            )
+            return cursor.rowcount > 0
+
+    def aguardar(self, identificador: str, timeout: Optional[float] = None, intervalo: float = 0.1) -> Optional[dict]:
+        """Consulta até a tarefa terminar (ou o `timeout` expirar) e retorna o último estado."""
+        limite = None if timeout is None else time.monotonic() + timeout
+        while True:
+            tarefa = self.consultar(identificador)
+            if tarefa is None or tarefa["estado"] in ESTADOS_FINAIS:
+                return tarefa
+            if limite is not None and time.monotonic() > limite:
+                return tarefa
+            time.sleep(intervalo)
+
+    def encerrar(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        _FILAS_ATIVAS.discard(self.dono)
+
+
+def _dono_encerrado(dono: Optional[str]) -> bool:
+    """Se a fila que submeteu a tarefa não existe mais (tarefas sem dono são antigas)."""
+    if not dono:
+        return True
+    maquina, pid, _ = dono.rsplit(":", 2)
+    if maquina != socket.gethostname():
+        # Não há como checar processos de outra máquina: a tarefa fica com ela.
+        return False
+    if int(pid) == os.getpid():
+        return dono not in _FILAS_ATIVAS
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return True
+    except PermissionError:
+        pass
+    return False
+
+# ==== FILA DO PROCESSO ====
+
+_fila_processo: Optional[FilaTarefas] = None
+_trava_fila = threading.Lock()
+
+
+def fila_processo() -> FilaTarefas:
+    """Fila compartilhada por todo o processo (por exemplo, entre sessões do Streamlit)."""
+    global _fila_processo
+    with _trava_fila:
+        if _fila_processo is None:
+            _fila_processo = FilaTarefas()
+        return _fila_processo